@@ -45,8 +45,14 @@ def create_app(config_class=Config):
     # Create database tables and admin user
     with app.app_context():
         db.create_all()
-        from app.utils.init_db import create_admin_user, create_sample_data
+        from app.utils.init_db import ensure_columns, ensure_indexes, create_admin_user, create_sample_data
+        from app.utils.slots import ensure_day_slots
+        from app.utils.search import ensure_search_index
+        ensure_columns()
+        ensure_indexes()
+        ensure_search_index()
         create_admin_user()
         create_sample_data()
+        ensure_day_slots()
     
     return app
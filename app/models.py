@@ -30,7 +30,7 @@ class Patient(db.Model):
     __tablename__ = 'patients'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     full_name = db.Column(db.String(120), nullable=False)
     date_of_birth = db.Column(db.Date)
     gender = db.Column(db.String(10))
@@ -68,7 +68,7 @@ class Doctor(db.Model):
     __tablename__ = 'doctors'
     
     id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
     full_name = db.Column(db.String(120), nullable=False)
     specialization_id = db.Column(db.Integer, db.ForeignKey('specializations.id'), nullable=False)
     qualification = db.Column(db.String(200))
@@ -86,6 +86,10 @@ class Doctor(db.Model):
 class DoctorAvailability(db.Model):
     """Doctor availability schedule"""
     __tablename__ = 'doctor_availability'
+    __table_args__ = (
+        # Doctor schedule lookups and the slot containing a booking time
+        db.Index('ix_availability_doctor_date_start', 'doctor_id', 'date', 'start_time'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False)
@@ -97,9 +101,57 @@ class DoctorAvailability(db.Model):
     def __repr__(self):
         return f'<Availability Doctor:{self.doctor_id} Date:{self.date}>'
 
+class ScheduleTemplate(db.Model):
+    """Weekly availability window a doctor's schedule is extended from (see app.utils.schedule)"""
+    __tablename__ = 'schedule_templates'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False, index=True)
+    weekday = db.Column(db.Integer, nullable=False)  # 0 = Monday ... 6 = Sunday
+    start_time = db.Column(db.Time, nullable=False)
+    end_time = db.Column(db.Time, nullable=False)
+    slot_minutes = db.Column(db.Integer)  # split the window into ranges of this length; null for one range
+    generated_until = db.Column(db.Date)  # last day availability has been generated for
+    
+    def __repr__(self):
+        return f'<ScheduleTemplate Doctor:{self.doctor_id} Weekday:{self.weekday}>'
+
+class DoctorDaySlots(db.Model):
+    """Fixed-size slot bitmaps for one doctor-day (see app.utils.slots)"""
+    __tablename__ = 'doctor_day_slots'
+    __table_args__ = (
+        db.UniqueConstraint('doctor_id', 'date', name='uq_day_slots_doctor_date'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    doctor_id = db.Column(db.Integer, db.ForeignKey('doctors.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False, index=True)
+    open_slots = db.Column(db.LargeBinary, nullable=False)    # bit i set: slot i is within availability
+    booked_slots = db.Column(db.LargeBinary, nullable=False)  # bit i set: slot i holds a booking
+    version = db.Column(db.Integer, nullable=False, default=0)  # optimistic concurrency counter
+    
+    def __repr__(self):
+        return f'<DoctorDaySlots Doctor:{self.doctor_id} Date:{self.date}>'
+
 class Appointment(db.Model):
     """Appointment model"""
     __tablename__ = 'appointments'
+    __table_args__ = (
+        # Doctor dashboard and appointment list filters
+        db.Index('ix_appointments_doctor_date_status', 'doctor_id', 'appointment_date', 'status'),
+        # Patient dashboard, appointment list and treatment history
+        db.Index('ix_appointments_patient_status_date', 'patient_id', 'status', 'appointment_date'),
+        # At most one live booking per doctor slot; enforced by the database so
+        # concurrent bookings cannot both succeed
+        db.Index('uq_appointments_booked_slot', 'doctor_id', 'appointment_date', 'appointment_time',
+                 unique=True,
+                 sqlite_where=db.text("status = 'booked'"),
+                 postgresql_where=db.text("status = 'booked'")),
+        # Admin listing keyset order
+        db.Index('ix_appointments_date_id', 'appointment_date', 'id'),
+        # Incremental exports (changes since a watermark)
+        db.Index('ix_appointments_updated_at', 'updated_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     patient_id = db.Column(db.Integer, db.ForeignKey('patients.id'), nullable=False)
@@ -122,7 +174,7 @@ class Treatment(db.Model):
     __tablename__ = 'treatments'
     
     id = db.Column(db.Integer, primary_key=True)
-    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id'), nullable=False)
+    appointment_id = db.Column(db.Integer, db.ForeignKey('appointments.id'), nullable=False, index=True)
     diagnosis = db.Column(db.Text, nullable=False)
     prescription = db.Column(db.Text)
     notes = db.Column(db.Text)
@@ -131,3 +183,33 @@ class Treatment(db.Model):
     
     def __repr__(self):
         return f'<Treatment for Appointment {self.appointment_id}>'
+
+class ExportWatermark(db.Model):
+    """Point up to which a consumer's incremental exports have emitted changes (see app.utils.watermarks)"""
+    __tablename__ = 'export_watermarks'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    consumer = db.Column(db.String(100), unique=True, nullable=False)  # e.g. treatment_history:42
+    exported_until = db.Column(db.DateTime, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<ExportWatermark {self.consumer} {self.exported_until}>'
+
+class DeliveryLedger(db.Model):
+    """Claim or delivery record of a notification so overlapping runs and reruns skip it (see app.utils.ledger)"""
+    __tablename__ = 'delivery_ledger'
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'period', 'reference_id', name='uq_delivery_ledger_item'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)  # reminder, monthly_report
+    period = db.Column(db.Date, nullable=False)  # reminder day or first day of the report month
+    reference_id = db.Column(db.Integer, nullable=False)  # appointment id or doctor id
+    claimed_by = db.Column(db.String(155))  # task id of the chunk sending it
+    claimed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    delivered_at = db.Column(db.DateTime, index=True)  # null while the send is in flight
+    
+    def __repr__(self):
+        return f'<DeliveryLedger {self.kind}:{self.reference_id} {self.period}>'
@@ -1,9 +1,20 @@
 from flask import Blueprint, request, jsonify
 from flask_login import login_required
+from sqlalchemy.orm import joinedload
 from app import db, bcrypt
 from app.models import User, Doctor, Patient, Appointment, Specialization, Treatment
 from app.utils.decorators import admin_required
-from app.utils.cache import invalidate_pattern
+from app.utils.cache import local_cache
+from app.utils.directory import (
+    invalidate_doctor_directory, invalidate_specializations, invalidate_doctor_availability
+)
+from app.utils.slot_index import invalidate_specialization_index
+from app.utils.schedule import add_bulk_availability
+from app.utils.serializers import appointment_listing, admin_appointment, admin_patient
+from app.utils.pagination import paginate, paginate_ranked, page_response
+from app.utils.streaming import wants_stream, ndjson_response
+from app.utils.columnar import FORMATS
+from app.utils import search
 from datetime import datetime
 
 bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -13,15 +24,20 @@ bp = Blueprint('admin', __name__, url_prefix='/admin')
 @admin_required
 def dashboard():
     """Get admin dashboard statistics"""
-    stats = {
-        'total_doctors': Doctor.query.filter_by(is_available=True).count(),
-        'total_patients': Patient.query.count(),
-        'total_appointments': Appointment.query.count(),
-        'pending_appointments': Appointment.query.filter_by(status='booked').count(),
-        'completed_appointments': Appointment.query.filter_by(status='completed').count(),
-        'cancelled_appointments': Appointment.query.filter_by(status='cancelled').count(),
-        'total_specializations': Specialization.query.count()
-    }
+    # Appointment counts are conditional aggregates over one scan; the other
+    # tables are folded in as scalar subqueries so this is a single statement.
+    row = db.session.query(
+        db.select(db.func.count(Doctor.id)).where(Doctor.is_available == True)
+            .scalar_subquery().label('total_doctors'),
+        db.select(db.func.count(Patient.id)).scalar_subquery().label('total_patients'),
+        db.func.count(Appointment.id).label('total_appointments'),
+        db.func.count(db.case((Appointment.status == 'booked', Appointment.id))).label('pending_appointments'),
+        db.func.count(db.case((Appointment.status == 'completed', Appointment.id))).label('completed_appointments'),
+        db.func.count(db.case((Appointment.status == 'cancelled', Appointment.id))).label('cancelled_appointments'),
+        db.select(db.func.count(Specialization.id)).scalar_subquery().label('total_specializations')
+    ).select_from(Appointment).one()
+    
+    stats = row._asdict()
     return jsonify(stats), 200
 
 @bp.route('/doctors', methods=['GET'])
@@ -29,7 +45,13 @@ def dashboard():
 @admin_required
 def get_doctors():
     """Get all doctors"""
-    doctors = Doctor.query.all()
+    query = Doctor.query.options(joinedload(Doctor.user), joinedload(Doctor.specialization))
+    
+    try:
+        doctors, next_cursor = paginate(query, [Doctor.id])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     doctors_list = []
     
     for doctor in doctors:
@@ -46,7 +68,7 @@ def get_doctors():
             'username': doctor.user.username
         })
     
-    return jsonify(doctors_list), 200
+    return jsonify(page_response(doctors_list, next_cursor)), 200
 
 @bp.route('/doctors', methods=['POST'])
 @login_required
@@ -93,7 +115,9 @@ def add_doctor():
         db.session.commit()
         
         # Invalidate cache
-        invalidate_pattern('doctors:*')
+        invalidate_doctor_directory(doctor.specialization_id)
+        invalidate_specializations()
+        invalidate_doctor_availability(doctor.id)
         
         return jsonify({
             'message': 'Doctor added successfully',
@@ -111,6 +135,7 @@ def update_doctor(doctor_id):
     """Update doctor details"""
     doctor = Doctor.query.get_or_404(doctor_id)
     data = request.get_json()
+    previous_specialization_id = doctor.specialization_id
     
     try:
         if 'full_name' in data:
@@ -129,7 +154,10 @@ def update_doctor(doctor_id):
         db.session.commit()
         
         # Invalidate cache
-        invalidate_pattern('doctors:*')
+        invalidate_doctor_directory(previous_specialization_id, doctor.specialization_id)
+        invalidate_specialization_index(previous_specialization_id, doctor.specialization_id)
+        if doctor.specialization_id != previous_specialization_id:
+            invalidate_specializations()
         
         return jsonify({'message': 'Doctor updated successfully'}), 200
     
@@ -151,7 +179,8 @@ def delete_doctor(doctor_id):
         db.session.commit()
         
         # Invalidate cache
-        invalidate_pattern('doctors:*')
+        invalidate_doctor_directory(doctor.specialization_id)
+        invalidate_specialization_index(doctor.specialization_id)
         
         return jsonify({'message': 'Doctor deactivated successfully'}), 200
     
@@ -159,27 +188,39 @@ def delete_doctor(doctor_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/doctors/<int:doctor_id>/availability/bulk', methods=['POST'])
+@login_required
+@admin_required
+def add_doctor_availability(doctor_id):
+    """Add availability for a recurring weekly schedule on behalf of a doctor"""
+    doctor = Doctor.query.get_or_404(doctor_id)
+    
+    try:
+        body, status = add_bulk_availability(doctor.id, request.get_json() or {})
+        return jsonify(body), status
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @bp.route('/patients', methods=['GET'])
 @login_required
 @admin_required
 def get_patients():
     """Get all patients"""
-    patients = Patient.query.all()
-    patients_list = []
+    query = Patient.query.options(joinedload(Patient.user))
     
-    for patient in patients:
-        patients_list.append({
-            'id': patient.id,
-            'user_id': patient.user_id,
-            'full_name': patient.full_name,
-            'email': patient.user.email,
-            'contact_number': patient.contact_number,
-            'date_of_birth': patient.date_of_birth.isoformat() if patient.date_of_birth else None,
-            'gender': patient.gender,
-            'is_active': patient.user.is_active
-        })
+    if wants_stream(request):
+        return ndjson_response(query.order_by(Patient.id), admin_patient)
+    
+    try:
+        patients, next_cursor = paginate(query, [Patient.id])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    patients_list = [admin_patient(patient) for patient in patients]
     
-    return jsonify(patients_list), 200
+    return jsonify(page_response(patients_list, next_cursor)), 200
 
 @bp.route('/patients/<int:patient_id>', methods=['DELETE'])
 @login_required
@@ -204,39 +245,80 @@ def delete_patient(patient_id):
 @admin_required
 def get_all_appointments():
     """Get all appointments"""
-    appointments = Appointment.query.order_by(Appointment.appointment_date.desc()).all()
-    appointments_list = []
-    
-    for apt in appointments:
-        appointments_list.append({
-            'id': apt.id,
-            'patient_name': apt.patient.full_name,
-            'doctor_name': apt.doctor.full_name,
-            'specialization': apt.doctor.specialization.name,
-            'appointment_date': apt.appointment_date.isoformat(),
-            'appointment_time': apt.appointment_time.isoformat(),
-            'status': apt.status,
-            'reason': apt.reason
-        })
+    if wants_stream(request):
+        return ndjson_response(
+            appointment_listing().order_by(Appointment.appointment_date.desc(), Appointment.id.desc()),
+            admin_appointment
+        )
+    
+    try:
+        appointments, next_cursor = paginate(
+            appointment_listing(),
+            [Appointment.appointment_date, Appointment.id],
+            descending=True
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    appointments_list = [admin_appointment(apt) for apt in appointments]
     
-    return jsonify(appointments_list), 200
+    return jsonify(page_response(appointments_list, next_cursor)), 200
+
+@bp.route('/export/appointments', methods=['POST'])
+@login_required
+@admin_required
+def export_appointments():
+    """Trigger async columnar export of appointments and treatments"""
+    from app.tasks import export_appointments_columnar
+    data = request.get_json(silent=True) or {}
+    
+    try:
+        start_date = datetime.strptime(data['start_date'], '%Y-%m-%d').date() if data.get('start_date') else None
+        end_date = datetime.strptime(data['end_date'], '%Y-%m-%d').date() if data.get('end_date') else None
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Dates must be in YYYY-MM-DD format'}), 400
+    
+    if start_date and end_date and end_date < start_date:
+        return jsonify({'error': 'end_date must not be before start_date'}), 400
+    
+    file_format = data.get('format')
+    if file_format is not None and file_format not in FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(FORMATS)}"}), 400
+    
+    # Incremental exports keep a watermark per named consumer
+    consumer = None
+    if data.get('incremental'):
+        name = data.get('consumer') or 'default'
+        if not isinstance(name, str) or len(name) > 80:
+            return jsonify({'error': 'consumer must be a name of at most 80 characters'}), 400
+        consumer = f'appointments:{name}'
+    
+    task = export_appointments_columnar.delay(
+        start_date.isoformat() if start_date else None,
+        end_date.isoformat() if end_date else None,
+        file_format,
+        consumer
+    )
+    
+    return jsonify({
+        'message': 'Export started. Download it once the status shows it is complete.',
+        'task_id': task.id
+    }), 202
 
 @bp.route('/search/doctors', methods=['GET'])
 @login_required
 @admin_required
 def search_doctors():
-    """Search doctors by name or specialization"""
-    query = request.args.get('q', '').strip()
+    """Search doctors by name or specialization, best match first"""
+    found = search.search_doctors(request.args.get('q', '').strip())
     
-    if not query:
+    if found is None:
         return jsonify({'error': 'Search query required'}), 400
     
-    doctors = Doctor.query.join(Specialization).filter(
-        db.or_(
-            Doctor.full_name.ilike(f'%{query}%'),
-            Specialization.name.ilike(f'%{query}%')
-        )
-    ).all()
+    try:
+        doctors, next_cursor = paginate_ranked(*found)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     results = []
     for doctor in doctors:
@@ -249,24 +331,22 @@ def search_doctors():
             'is_available': doctor.is_available
         })
     
-    return jsonify(results), 200
+    return jsonify(page_response(results, next_cursor)), 200
 
 @bp.route('/search/patients', methods=['GET'])
 @login_required
 @admin_required
 def search_patients():
-    """Search patients by name or contact"""
-    query = request.args.get('q', '').strip()
+    """Search patients by name, contact number or email, best match first"""
+    found = search.search_patients(request.args.get('q', '').strip())
     
-    if not query:
+    if found is None:
         return jsonify({'error': 'Search query required'}), 400
     
-    patients = Patient.query.filter(
-        db.or_(
-            Patient.full_name.ilike(f'%{query}%'),
-            Patient.contact_number.ilike(f'%{query}%')
-        )
-    ).all()
+    try:
+        patients, next_cursor = paginate_ranked(*found)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     results = []
     for patient in patients:
@@ -278,4 +358,11 @@ def search_patients():
             'is_active': patient.user.is_active
         })
     
-    return jsonify(results), 200
+    return jsonify(page_response(results, next_cursor)), 200
+
+@bp.route('/cache/stats', methods=['GET'])
+@login_required
+@admin_required
+def cache_stats():
+    """Get this worker's in-process cache statistics"""
+    return jsonify(local_cache.stats()), 200
@@ -3,7 +3,8 @@ from flask_login import login_required, current_user
 from app import db
 from app.models import Patient, Appointment, Treatment
 from app.tasks import export_treatment_csv
-import os
+from app.utils.artifacts import artifact_path
+from datetime import datetime
 
 bp = Blueprint('api', __name__, url_prefix='/api')
 
@@ -15,12 +16,13 @@ def export_treatments():
         return jsonify({'error': 'Only patients can export their treatment history'}), 403
     
     patient = Patient.query.filter_by(user_id=current_user.id).first_or_404()
+    data = request.get_json(silent=True) or {}
     
     # Trigger async task
-    task = export_treatment_csv.delay(patient.id, current_user.email)
+    task = export_treatment_csv.delay(patient.id, bool(data.get('incremental')))
     
     return jsonify({
-        'message': 'Export started. You will receive an email when ready.',
+        'message': 'Export started. Download it once the status shows it is complete.',
         'task_id': task.id
     }), 202
 
@@ -37,9 +39,14 @@ def export_status(task_id):
             'status': 'Task is waiting to be processed'
         }
     elif task.state == 'PROGRESS':
+        current = task.info.get('current', 0)
+        total = task.info.get('total', 0)
         response = {
             'state': task.state,
-            'status': task.info.get('status', '')
+            'status': task.info.get('status', ''),
+            'current': current,
+            'total': total,
+            'percent': round(100 * current / total) if total else 0
         }
     elif task.state == 'SUCCESS':
         response = {
@@ -55,6 +62,35 @@ def export_status(task_id):
     
     return jsonify(response), 200
 
+@bp.route('/export/<task_id>/download', methods=['GET'])
+@login_required
+def download_export(task_id):
+    """Download the file produced by an export task"""
+    from app.tasks import celery
+    task = celery.AsyncResult(task_id)
+    
+    if task.state != 'SUCCESS' or not isinstance(task.info, dict) or task.info.get('status') != 'success':
+        return jsonify({'error': 'Export is not ready'}), 404
+    
+    patient = Patient.query.filter_by(user_id=current_user.id).first()
+    if current_user.role != 'admin' and (patient is None or patient.id != task.info.get('patient_id')):
+        return jsonify({'error': 'Access denied'}), 403
+    
+    path = artifact_path(task.info.get('filename'))
+    if path is None:
+        return jsonify({'error': 'Export has expired, please export again'}), 410
+    
+    download_name = task.info.get('download_name') or \
+        f"treatment_history_{task.info['patient_id']}_{datetime.now().strftime('%Y%m%d')}.csv.gz"
+    
+    return send_file(
+        path,
+        mimetype=task.info.get('mimetype', 'application/gzip'),
+        as_attachment=True,
+        download_name=download_name,
+        conditional=True
+    )
+
 @bp.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint"""
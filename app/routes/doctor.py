@@ -1,8 +1,18 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
 from app import db
-from app.models import Doctor, Appointment, Treatment, DoctorAvailability
+from app.models import Doctor, Appointment, DoctorAvailability, ScheduleTemplate
 from app.utils.decorators import doctor_required
+from app.utils import booking
+from app.utils.slots import refresh_days
+from app.utils.slot_index import index_days
+from app.utils.schedule import (
+    ScheduleError, add_bulk_availability,
+    parse_template, replace_template, serialize_template, extend_schedules
+)
+from app.utils.directory import invalidate_doctor_availability
+from app.utils.serializers import appointment_listing, doctor_appointment
+from app.utils.pagination import paginate, page_response
 from datetime import datetime, date, time, timedelta
 
 bp = Blueprint('doctor', __name__, url_prefix='/doctor')
@@ -17,26 +27,21 @@ def dashboard():
     today = date.today()
     week_end = today + timedelta(days=7)
     
-    stats = {
-        'upcoming_appointments_today': Appointment.query.filter_by(
-            doctor_id=doctor.id,
-            appointment_date=today,
-            status='booked'
-        ).count(),
-        'upcoming_appointments_week': Appointment.query.filter(
-            Appointment.doctor_id == doctor.id,
-            Appointment.appointment_date.between(today, week_end),
-            Appointment.status == 'booked'
-        ).count(),
-        'total_patients': db.session.query(Appointment.patient_id).filter_by(
-            doctor_id=doctor.id
-        ).distinct().count(),
-        'completed_appointments': Appointment.query.filter_by(
-            doctor_id=doctor.id,
-            status='completed'
-        ).count()
-    }
+    booked = Appointment.status == 'booked'
+    row = db.session.query(
+        db.func.count(db.case(
+            (db.and_(booked, Appointment.appointment_date == today), Appointment.id)
+        )).label('upcoming_appointments_today'),
+        db.func.count(db.case(
+            (db.and_(booked, Appointment.appointment_date.between(today, week_end)), Appointment.id)
+        )).label('upcoming_appointments_week'),
+        db.func.count(db.distinct(Appointment.patient_id)).label('total_patients'),
+        db.func.count(db.case(
+            (Appointment.status == 'completed', Appointment.id)
+        )).label('completed_appointments')
+    ).filter(Appointment.doctor_id == doctor.id).one()
     
+    stats = row._asdict()
     return jsonify(stats), 200
 
 @bp.route('/appointments', methods=['GET'])
@@ -49,40 +54,27 @@ def get_appointments():
     status = request.args.get('status')
     date_filter = request.args.get('date')
     
-    query = Appointment.query.filter_by(doctor_id=doctor.id)
+    query = appointment_listing(Appointment.doctor_id == doctor.id)
     
     if status:
-        query = query.filter_by(status=status)
+        query = query.filter(Appointment.status == status)
     
     if date_filter:
         filter_date = datetime.strptime(date_filter, '%Y-%m-%d').date()
-        query = query.filter_by(appointment_date=filter_date)
+        query = query.filter(Appointment.appointment_date == filter_date)
     
-    appointments = query.order_by(Appointment.appointment_date.desc()).all()
+    try:
+        appointments, next_cursor = paginate(
+            query,
+            [Appointment.appointment_date, Appointment.id],
+            descending=True
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    appointments_list = []
-    for apt in appointments:
-        apt_data = {
-            'id': apt.id,
-            'patient_id': apt.patient_id,
-            'patient_name': apt.patient.full_name,
-            'patient_contact': apt.patient.contact_number,
-            'appointment_date': apt.appointment_date.isoformat(),
-            'appointment_time': apt.appointment_time.isoformat(),
-            'status': apt.status,
-            'reason': apt.reason
-        }
-        
-        if apt.treatment:
-            apt_data['treatment'] = {
-                'diagnosis': apt.treatment.diagnosis,
-                'prescription': apt.treatment.prescription,
-                'notes': apt.treatment.notes
-            }
-        
-        appointments_list.append(apt_data)
+    appointments_list = [doctor_appointment(apt) for apt in appointments]
     
-    return jsonify(appointments_list), 200
+    return jsonify(page_response(appointments_list, next_cursor)), 200
 
 @bp.route('/appointments/<int:appointment_id>/complete', methods=['POST'])
 @login_required
@@ -101,22 +93,19 @@ def complete_appointment(appointment_id):
         return jsonify({'error': 'Diagnosis is required'}), 400
     
     try:
-        # Update appointment status
-        appointment.status = 'completed'
-        
-        # Create treatment record
-        treatment = Treatment(
-            appointment_id=appointment.id,
-            diagnosis=data['diagnosis'],
+        booking.complete_appointment(
+            appointment,
+            data['diagnosis'],
             prescription=data.get('prescription'),
             notes=data.get('notes'),
             next_visit_date=datetime.strptime(data['next_visit_date'], '%Y-%m-%d').date() if data.get('next_visit_date') else None
         )
-        db.session.add(treatment)
-        db.session.commit()
         
         return jsonify({'message': 'Appointment completed successfully'}), 200
     
+    except booking.AppointmentNotBooked as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -133,11 +122,14 @@ def cancel_appointment(appointment_id):
         return jsonify({'error': 'Only booked appointments can be cancelled'}), 400
     
     try:
-        appointment.status = 'cancelled'
-        db.session.commit()
+        booking.cancel_appointment(appointment)
+        invalidate_doctor_availability(doctor.id)
         
         return jsonify({'message': 'Appointment cancelled successfully'}), 200
     
+    except booking.AppointmentNotBooked as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -174,15 +166,15 @@ def get_patient_history(patient_id):
 @login_required
 @doctor_required
 def get_availability():
-    """Get doctor's availability schedule"""
+    """Get doctor's availability schedule up to the scheduling horizon"""
     doctor = Doctor.query.filter_by(user_id=current_user.id).first_or_404()
     
     today = date.today()
-    week_end = today + timedelta(days=7)
+    horizon_end = today + timedelta(days=current_app.config['AVAILABILITY_HORIZON_DAYS'])
     
     availability = DoctorAvailability.query.filter(
         DoctorAvailability.doctor_id == doctor.id,
-        DoctorAvailability.date.between(today, week_end)
+        DoctorAvailability.date.between(today, horizon_end)
     ).order_by(DoctorAvailability.date, DoctorAvailability.start_time).all()
     
     availability_list = []
@@ -219,7 +211,11 @@ def add_availability():
             is_booked=False
         )
         db.session.add(availability)
+        db.session.flush()
+        refresh_days(doctor.id, [availability.date])
         db.session.commit()
+        invalidate_doctor_availability(doctor.id)
+        index_days(doctor.id, [availability.date])
         
         return jsonify({'message': 'Availability added successfully'}), 201
     
@@ -227,6 +223,63 @@ def add_availability():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/availability/bulk', methods=['POST'])
+@login_required
+@doctor_required
+def add_availability_schedule():
+    """Add availability for a recurring weekly schedule"""
+    doctor = Doctor.query.filter_by(user_id=current_user.id).first_or_404()
+    
+    try:
+        body, status = add_bulk_availability(doctor.id, request.get_json() or {})
+        return jsonify(body), status
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/schedule-template', methods=['GET'])
+@login_required
+@doctor_required
+def get_schedule_template():
+    """Get the weekly template the doctor's schedule is extended from"""
+    doctor = Doctor.query.filter_by(user_id=current_user.id).first_or_404()
+    templates = ScheduleTemplate.query.filter_by(doctor_id=doctor.id).order_by(
+        ScheduleTemplate.weekday, ScheduleTemplate.start_time
+    ).all()
+    
+    return jsonify([serialize_template(template) for template in templates]), 200
+
+@bp.route('/schedule-template', methods=['PUT'])
+@login_required
+@doctor_required
+def update_schedule_template():
+    """Replace the weekly template and generate availability up to the horizon"""
+    doctor = Doctor.query.filter_by(user_id=current_user.id).first_or_404()
+    
+    try:
+        windows = parse_template(request.get_json() or {})
+    except ScheduleError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        replace_template(doctor.id, windows)
+        horizon_end = date.today() + timedelta(days=current_app.config['AVAILABILITY_HORIZON_DAYS'])
+        days = extend_schedules(horizon_end, doctor.id).get(doctor.id, set())
+        db.session.commit()
+        if days:
+            invalidate_doctor_availability(doctor.id)
+            index_days(doctor.id, days)
+        
+        return jsonify({
+            'message': 'Schedule template updated successfully',
+            'days_added': len(days)
+        }), 200
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
 @bp.route('/availability/<int:slot_id>', methods=['DELETE'])
 @login_required
 @doctor_required
@@ -240,7 +293,11 @@ def delete_availability(slot_id):
     
     try:
         db.session.delete(slot)
+        db.session.flush()
+        refresh_days(doctor.id, [slot.date])
         db.session.commit()
+        invalidate_doctor_availability(doctor.id)
+        index_days(doctor.id, [slot.date])
         
         return jsonify({'message': 'Availability slot deleted successfully'}), 200
     
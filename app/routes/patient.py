@@ -1,9 +1,15 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_login import login_required, current_user
 from app import db
-from app.models import Patient, Doctor, Appointment, Specialization, DoctorAvailability, Treatment
+from app.models import Patient, Appointment, Treatment
 from app.utils.decorators import patient_required
-from app.utils.cache import cached
+from app.utils import booking
+from app.utils.directory import (
+    specialization_directory, doctor_directory, doctor_open_slots, invalidate_doctor_availability
+)
+from app.utils.slot_index import search_free_slots
+from app.utils.serializers import appointment_listing, patient_appointment, treatment_history_entry
+from app.utils.pagination import paginate, page_response, page_size
 from datetime import datetime, date, timedelta
 
 bp = Blueprint('patient', __name__, url_prefix='/patient')
@@ -17,19 +23,17 @@ def dashboard():
     
     today = date.today()
     
-    stats = {
-        'upcoming_appointments': Appointment.query.filter(
-            Appointment.patient_id == patient.id,
-            Appointment.appointment_date >= today,
-            Appointment.status == 'booked'
-        ).count(),
-        'total_appointments': Appointment.query.filter_by(patient_id=patient.id).count(),
-        'completed_appointments': Appointment.query.filter_by(
-            patient_id=patient.id,
-            status='completed'
-        ).count()
-    }
-    
+    row = db.session.query(
+        db.func.count(db.case(
+            (db.and_(Appointment.status == 'booked', Appointment.appointment_date >= today), Appointment.id)
+        )).label('upcoming_appointments'),
+        db.func.count(Appointment.id).label('total_appointments'),
+        db.func.count(db.case(
+            (Appointment.status == 'completed', Appointment.id)
+        )).label('completed_appointments')
+    ).filter(Appointment.patient_id == patient.id).one()
+    
+    stats = row._asdict()
     return jsonify(stats), 200
 
 @bp.route('/profile', methods=['GET'])
@@ -87,18 +91,7 @@ def update_profile():
 @patient_required
 def get_specializations():
     """Get all specializations"""
-    specializations = Specialization.query.all()
-    
-    spec_list = []
-    for spec in specializations:
-        spec_list.append({
-            'id': spec.id,
-            'name': spec.name,
-            'description': spec.description,
-            'doctors_count': spec.doctors_count
-        })
-    
-    return jsonify(spec_list), 200
+    return jsonify(specialization_directory()), 200
 
 @bp.route('/doctors', methods=['GET'])
 @login_required
@@ -107,53 +100,48 @@ def get_doctors():
     """Get doctors by specialization"""
     specialization_id = request.args.get('specialization_id', type=int)
     
-    query = Doctor.query.filter_by(is_available=True)
-    
-    if specialization_id:
-        query = query.filter_by(specialization_id=specialization_id)
-    
-    doctors = query.all()
-    
-    doctors_list = []
-    for doctor in doctors:
-        doctors_list.append({
-            'id': doctor.id,
-            'full_name': doctor.full_name,
-            'specialization': doctor.specialization.name,
-            'qualification': doctor.qualification,
-            'experience_years': doctor.experience_years,
-            'consultation_fee': doctor.consultation_fee
-        })
-    
-    return jsonify(doctors_list), 200
+    return jsonify(doctor_directory(specialization_id)), 200
 
 @bp.route('/doctors/<int:doctor_id>/availability', methods=['GET'])
 @login_required
 @patient_required
 def get_doctor_availability(doctor_id):
-    """Get doctor's availability for next 7 days"""
-    doctor = Doctor.query.get_or_404(doctor_id)
+    """Get doctor's availability for the next AVAILABILITY_WINDOW_DAYS days"""
+    availability_list = doctor_open_slots(doctor_id, date.today())
     
-    today = date.today()
-    week_end = today + timedelta(days=7)
-    
-    availability = DoctorAvailability.query.filter(
-        DoctorAvailability.doctor_id == doctor_id,
-        DoctorAvailability.date.between(today, week_end),
-        DoctorAvailability.is_booked == False
-    ).order_by(DoctorAvailability.date, DoctorAvailability.start_time).all()
-    
-    availability_list = []
-    for slot in availability:
-        availability_list.append({
-            'id': slot.id,
-            'date': slot.date.isoformat(),
-            'start_time': slot.start_time.isoformat(),
-            'end_time': slot.end_time.isoformat()
-        })
+    if availability_list is None:
+        return jsonify({'error': 'Doctor not found'}), 404
     
     return jsonify(availability_list), 200
 
+@bp.route('/slots', methods=['GET'])
+@login_required
+@patient_required
+def search_slots():
+    """Find the earliest free slots across all doctors of a specialization"""
+    specialization_id = request.args.get('specialization_id', type=int)
+    if not specialization_id:
+        return jsonify({'error': 'specialization_id is required'}), 400
+    
+    try:
+        start_date = datetime.strptime(request.args['start_date'], '%Y-%m-%d').date() if request.args.get('start_date') else date.today()
+        end_date = datetime.strptime(request.args['end_date'], '%Y-%m-%d').date() if request.args.get('end_date') else start_date + timedelta(days=current_app.config['AVAILABILITY_WINDOW_DAYS'])
+    except ValueError:
+        return jsonify({'error': 'Dates must be YYYY-MM-DD'}), 400
+    
+    if end_date < start_date:
+        return jsonify({'error': 'end_date must not be before start_date'}), 400
+    
+    slots = search_free_slots(
+        specialization_id,
+        start_date,
+        end_date,
+        page_size(),
+        request.args.get('max_fee', type=float)
+    )
+    
+    return jsonify(slots), 200
+
 @bp.route('/appointments', methods=['POST'])
 @login_required
 @patient_required
@@ -171,47 +159,23 @@ def book_appointment():
         appointment_date = datetime.strptime(data['appointment_date'], '%Y-%m-%d').date()
         appointment_time = datetime.strptime(data['appointment_time'], '%H:%M').time()
         
-        # Check if slot is already booked
-        existing = Appointment.query.filter_by(
-            doctor_id=data['doctor_id'],
-            appointment_date=appointment_date,
-            appointment_time=appointment_time,
-            status='booked'
-        ).first()
-        
-        if existing:
-            return jsonify({'error': 'This time slot is already booked'}), 400
-        
-        # Create appointment
-        appointment = Appointment(
-            patient_id=patient.id,
-            doctor_id=data['doctor_id'],
-            appointment_date=appointment_date,
-            appointment_time=appointment_time,
-            reason=data.get('reason'),
-            status='booked'
+        appointment = booking.book_appointment(
+            patient.id,
+            data['doctor_id'],
+            appointment_date,
+            appointment_time,
+            data.get('reason')
         )
-        db.session.add(appointment)
-        
-        # Mark availability slot as booked
-        availability = DoctorAvailability.query.filter_by(
-            doctor_id=data['doctor_id'],
-            date=appointment_date
-        ).filter(
-            DoctorAvailability.start_time <= appointment_time,
-            DoctorAvailability.end_time > appointment_time
-        ).first()
-        
-        if availability:
-            availability.is_booked = True
-        
-        db.session.commit()
+        invalidate_doctor_availability(appointment.doctor_id)
         
         return jsonify({
             'message': 'Appointment booked successfully',
             'appointment_id': appointment.id
         }), 201
     
+    except booking.SlotUnavailable as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -225,36 +189,23 @@ def get_appointments():
     
     status = request.args.get('status')
     
-    query = Appointment.query.filter_by(patient_id=patient.id)
+    query = appointment_listing(Appointment.patient_id == patient.id)
     
     if status:
-        query = query.filter_by(status=status)
+        query = query.filter(Appointment.status == status)
     
-    appointments = query.order_by(Appointment.appointment_date.desc()).all()
+    try:
+        appointments, next_cursor = paginate(
+            query,
+            [Appointment.appointment_date, Appointment.id],
+            descending=True
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    appointments_list = []
-    for apt in appointments:
-        apt_data = {
-            'id': apt.id,
-            'doctor_name': apt.doctor.full_name,
-            'specialization': apt.doctor.specialization.name,
-            'appointment_date': apt.appointment_date.isoformat(),
-            'appointment_time': apt.appointment_time.isoformat(),
-            'status': apt.status,
-            'reason': apt.reason
-        }
-        
-        if apt.treatment:
-            apt_data['treatment'] = {
-                'diagnosis': apt.treatment.diagnosis,
-                'prescription': apt.treatment.prescription,
-                'notes': apt.treatment.notes,
-                'next_visit_date': apt.treatment.next_visit_date.isoformat() if apt.treatment.next_visit_date else None
-            }
-        
-        appointments_list.append(apt_data)
+    appointments_list = [patient_appointment(apt) for apt in appointments]
     
-    return jsonify(appointments_list), 200
+    return jsonify(page_response(appointments_list, next_cursor)), 200
 
 @bp.route('/appointments/<int:appointment_id>/cancel', methods=['POST'])
 @login_required
@@ -268,24 +219,14 @@ def cancel_appointment(appointment_id):
         return jsonify({'error': 'Only booked appointments can be cancelled'}), 400
     
     try:
-        appointment.status = 'cancelled'
-        
-        # Free up the availability slot
-        availability = DoctorAvailability.query.filter_by(
-            doctor_id=appointment.doctor_id,
-            date=appointment.appointment_date
-        ).filter(
-            DoctorAvailability.start_time <= appointment.appointment_time,
-            DoctorAvailability.end_time > appointment.appointment_time
-        ).first()
-        
-        if availability:
-            availability.is_booked = False
-        
-        db.session.commit()
+        booking.cancel_appointment(appointment)
+        invalidate_doctor_availability(appointment.doctor_id)
         
         return jsonify({'message': 'Appointment cancelled successfully'}), 200
     
+    except booking.AppointmentNotBooked as e:
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -297,23 +238,12 @@ def get_treatment_history():
     """Get patient's complete treatment history"""
     patient = Patient.query.filter_by(user_id=current_user.id).first_or_404()
     
-    appointments = Appointment.query.filter_by(
-        patient_id=patient.id,
-        status='completed'
+    appointments = appointment_listing(
+        Appointment.patient_id == patient.id,
+        Appointment.status == 'completed',
+        Treatment.id.isnot(None)
     ).order_by(Appointment.appointment_date.desc()).all()
     
-    history = []
-    for apt in appointments:
-        if apt.treatment:
-            history.append({
-                'appointment_id': apt.id,
-                'doctor_name': apt.doctor.full_name,
-                'specialization': apt.doctor.specialization.name,
-                'appointment_date': apt.appointment_date.isoformat(),
-                'diagnosis': apt.treatment.diagnosis,
-                'prescription': apt.treatment.prescription,
-                'notes': apt.treatment.notes,
-                'next_visit_date': apt.treatment.next_visit_date.isoformat() if apt.treatment.next_visit_date else None
-            })
+    history = [treatment_history_entry(apt) for apt in appointments]
     
     return jsonify(history), 200
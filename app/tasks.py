@@ -1,13 +1,30 @@
-from celery import Celery
+from celery import Celery, chord
 from celery.schedules import crontab
 from flask import current_app
 from flask_mail import Message
-from app import mail, db
-from app.models import Appointment, Doctor, Patient, Treatment
+from app import db
+from app.models import Appointment, Doctor, Patient, Treatment, User, Specialization
+from app.utils.schedule import extend_schedules, prune_past_availability
+from app.utils.directory import invalidate_doctor_availability
+from app.utils.slot_index import index_days
+from app.utils.mailer import send_batched, render_email
+from app.utils.serializers import appointment_listing
+from app.utils.artifacts import ArtifactWriter, fingerprint, cached_artifact, remember_artifact, sweep_artifacts, export_dir, store_file
+from app.utils.columnar import FORMATS, PartitionedWriter
+from app.utils.watermarks import export_window, changed_between, advance_watermark
+from app.utils.ledger import (
+    REMINDER, MONTHLY_REPORT, undelivered, claim_deliveries, record_deliveries, release_claims, prune_ledger
+)
+from functools import partial
+from itertools import groupby
+from operator import attrgetter
 from datetime import date, datetime, timedelta
 import csv
 import os
-from io import StringIO
+import shutil
+import tarfile
+import tempfile
+import uuid
 
 # Initialize Celery
 celery = Celery('tasks')
@@ -31,6 +48,14 @@ def init_celery(app):
             'task': 'app.tasks.send_monthly_reports',
             'schedule': crontab(day_of_month=1, hour=9, minute=0),  # 1st of month at 9 AM
         },
+        'extend-availability': {
+            'task': 'app.tasks.extend_availability',
+            'schedule': crontab(hour=0, minute=30),  # 12:30 AM daily
+        },
+        'sweep-export-artifacts': {
+            'task': 'app.tasks.sweep_export_artifacts',
+            'schedule': crontab(minute=15),  # hourly
+        },
     }
     
     class ContextTask(celery.Task):
@@ -41,239 +66,445 @@ def init_celery(app):
     celery.Task = ContextTask
     return celery
 
-@celery.task(name='app.tasks.send_daily_reminders')
-def send_daily_reminders():
-    """Send daily appointment reminders to patients"""
-    today = date.today()
-    
-    # Get all appointments for today
-    appointments = Appointment.query.filter_by(
-        appointment_date=today,
-        status='booked'
-    ).all()
-    
-    sent_count = 0
-    
-    for apt in appointments:
-        try:
-            patient_email = apt.patient.user.email
-            doctor_name = apt.doctor.full_name
-            appointment_time = apt.appointment_time.strftime('%I:%M %p')
-            
-            msg = Message(
-                subject='Appointment Reminder - Hospital Management System',
-                recipients=[patient_email],
-                body=f"""
-Dear {apt.patient.full_name},
+def _reminder_message(row, day):
+    """Build the reminder email for one row of the daily reminder query"""
+    return Message(
+        subject='Appointment Reminder - Hospital Management System',
+        recipients=[row.email],
+        body=f"""
+Dear {row.patient_name},
 
 This is a reminder for your appointment today:
 
-Doctor: {doctor_name}
-Specialization: {apt.doctor.specialization.name}
-Time: {appointment_time}
-Date: {today.strftime('%B %d, %Y')}
+Doctor: {row.doctor_name}
+Specialization: {row.specialization}
+Time: {row.appointment_time.strftime('%I:%M %p')}
+Date: {day.strftime('%B %d, %Y')}
 
 Please arrive 10 minutes early for registration.
 
 Best regards,
 Hospital Management System
-                """
-            )
-            
-            mail.send(msg)
-            sent_count += 1
-            
-        except Exception as e:
-            current_app.logger.error(f"Failed to send reminder to {patient_email}: {str(e)}")
+        """
+    )
+
+def _chunked(ids, size):
+    return [ids[i:i + size] for i in range(0, len(ids), size)]
+
+def _fan_out(task, ids, chunk_size, kind, *args):
+    """Dispatch task over chunks of ids as a chord summarized by summarize_delivery"""
+    if not ids:
+        return {'kind': kind, 'chunks': 0, 'sent': 0, 'failed': 0}
+    
+    chunks = _chunked(ids, chunk_size)
+    result = chord(task.s(chunk, *args) for chunk in chunks)(summarize_delivery.s(kind))
+    return {'kind': kind, 'chunks': len(chunks), 'summary_task_id': result.id}
+
+@celery.task(name='app.tasks.summarize_delivery')
+def summarize_delivery(results, kind):
+    """Chord callback: total the sent/failed counts of every chunk"""
+    summary = {
+        'kind': kind,
+        'sent': sum(result['sent'] for result in results),
+        'failed': sum(result['failed'] for result in results)
+    }
+    current_app.logger.info(f"Delivered {kind}: {summary['sent']} sent, {summary['failed']} failed")
+    return summary
+
+@celery.task(name='app.tasks.send_daily_reminders')
+def send_daily_reminders():
+    """Send daily appointment reminders to patients, fanned out in chunks across workers
+    
+    Appointments already delivered or claimed in the delivery ledger are
+    skipped, so the job can be rerun safely, even while an earlier run's
+    chunks are still queued.
+    """
+    today = date.today()
+    prune_ledger()
     
-    return f"Sent {sent_count} reminders"
+    appointment_ids = [row.id for row in db.session.query(Appointment.id).filter(
+        Appointment.appointment_date == today,
+        Appointment.status == 'booked',
+        undelivered(REMINDER, today, Appointment.id)
+    ).order_by(Appointment.id)]
+    
+    return _fan_out(
+        send_reminder_chunk, appointment_ids, current_app.config['REMINDER_CHUNK_SIZE'],
+        'reminders', today.isoformat()
+    )
+
+@celery.task(name='app.tasks.send_reminder_chunk', bind=True, acks_late=True, reject_on_worker_lost=True)
+def send_reminder_chunk(self, appointment_ids, day):
+    """Send reminders for the appointments of a chunk this task can claim"""
+    day = date.fromisoformat(day)
+    owner = self.request.id or uuid.uuid4().hex
+    claimed = claim_deliveries(REMINDER, day, appointment_ids, owner)
+    
+    # Get the chunk's appointments with everything the email needs
+    appointments = db.session.query(
+        Appointment.id,
+        Appointment.appointment_time,
+        Patient.full_name.label('patient_name'),
+        User.email,
+        Doctor.full_name.label('doctor_name'),
+        Specialization.name.label('specialization')
+    ).join(
+        Patient, Patient.id == Appointment.patient_id
+    ).join(
+        User, User.id == Patient.user_id
+    ).join(
+        Doctor, Doctor.id == Appointment.doctor_id
+    ).join(
+        Specialization, Specialization.id == Doctor.specialization_id
+    ).filter(
+        Appointment.id.in_(claimed),
+        Appointment.status == 'booked'
+    ).order_by(Appointment.id).all() if claimed else []
+    
+    sent, failed = send_batched(
+        ((row.id, _reminder_message(row, day)) for row in appointments),
+        on_batch=partial(record_deliveries, REMINDER, day)
+    )
+    release_claims(REMINDER, day, list(claimed - set(sent)), owner)
+    
+    return {'sent': len(sent), 'failed': len(failed)}
+
+def _monthly_report_stats(doctor_ids, first_day, last_day):
+    """One grouped query: header and status counts per doctor with appointments in the month"""
+    return db.session.query(
+        Doctor.id,
+        Doctor.full_name,
+        Specialization.name.label('specialization'),
+        User.email,
+        db.func.count(Appointment.id).label('total_appointments'),
+        db.func.count(db.case((Appointment.status == 'completed', Appointment.id))).label('completed'),
+        db.func.count(db.case((Appointment.status == 'cancelled', Appointment.id))).label('cancelled')
+    ).join(
+        Appointment, Appointment.doctor_id == Doctor.id
+    ).join(
+        Specialization, Specialization.id == Doctor.specialization_id
+    ).join(
+        User, User.id == Doctor.user_id
+    ).filter(
+        Doctor.id.in_(doctor_ids),
+        Appointment.appointment_date.between(first_day, last_day)
+    ).group_by(
+        Doctor.id, Doctor.full_name, Specialization.name, User.email
+    ).order_by(Doctor.id).all()
+
+def _monthly_report_details(doctor_ids, first_day, last_day):
+    """One joined query: the month's appointment rows for every doctor, grouped by doctor"""
+    rows = db.session.query(
+        Appointment.doctor_id,
+        Appointment.appointment_date,
+        Appointment.status,
+        Patient.full_name.label('patient_name'),
+        Treatment.diagnosis
+    ).join(
+        Patient, Patient.id == Appointment.patient_id
+    ).outerjoin(
+        Treatment, Treatment.appointment_id == Appointment.id
+    ).filter(
+        Appointment.doctor_id.in_(doctor_ids),
+        Appointment.appointment_date.between(first_day, last_day)
+    ).order_by(Appointment.doctor_id, Appointment.appointment_date, Appointment.id).all()
+    
+    return {doctor_id: list(group) for doctor_id, group in groupby(rows, key=attrgetter('doctor_id'))}
+
+def _monthly_report_message(doctor, appointments, first_day_previous_month):
+    """Build a doctor's monthly report email from their stats row and detail rows"""
+    return Message(
+        subject=f'Monthly Activity Report - {first_day_previous_month.strftime("%B %Y")}',
+        recipients=[doctor.email],
+        html=render_email(
+            'email/monthly_report.html',
+            doctor=doctor,
+            appointments=appointments,
+            month=first_day_previous_month
+        )
+    )
 
 @celery.task(name='app.tasks.send_monthly_reports')
 def send_monthly_reports():
-    """Send monthly activity reports to doctors"""
+    """Send monthly activity reports to doctors, fanned out in chunks across workers
+    
+    Doctors whose report is already delivered or claimed in the delivery
+    ledger are skipped.
+    """
     # Get previous month's date range
     today = date.today()
     first_day_current_month = today.replace(day=1)
     last_day_previous_month = first_day_current_month - timedelta(days=1)
     first_day_previous_month = last_day_previous_month.replace(day=1)
     
-    doctors = Doctor.query.filter_by(is_available=True).all()
+    doctor_ids = [row.id for row in db.session.query(Doctor.id).filter(
+        Doctor.is_available == True,
+        db.exists().where(
+            Appointment.doctor_id == Doctor.id,
+            Appointment.appointment_date.between(first_day_previous_month, last_day_previous_month)
+        ),
+        undelivered(MONTHLY_REPORT, first_day_previous_month, Doctor.id)
+    ).order_by(Doctor.id)]
     
-    sent_count = 0
+    return _fan_out(
+        send_report_chunk, doctor_ids, current_app.config['REPORT_CHUNK_SIZE'],
+        'monthly reports', first_day_previous_month.isoformat(), last_day_previous_month.isoformat()
+    )
+
+@celery.task(name='app.tasks.send_report_chunk', bind=True, acks_late=True, reject_on_worker_lost=True)
+def send_report_chunk(self, doctor_ids, first_day, last_day):
+    """Send monthly reports for the doctors of a chunk this task can claim"""
+    first_day = date.fromisoformat(first_day)
+    last_day = date.fromisoformat(last_day)
+    owner = self.request.id or uuid.uuid4().hex
+    claimed = claim_deliveries(MONTHLY_REPORT, first_day, doctor_ids, owner)
     
-    for doctor in doctors:
-        try:
-            # Get appointments for previous month
-            appointments = Appointment.query.filter(
-                Appointment.doctor_id == doctor.id,
-                Appointment.appointment_date.between(first_day_previous_month, last_day_previous_month)
-            ).all()
-            
-            if not appointments:
-                continue
-            
-            # Generate report
-            total_appointments = len(appointments)
-            completed = len([a for a in appointments if a.status == 'completed'])
-            cancelled = len([a for a in appointments if a.status == 'cancelled'])
-            
-            # Create HTML report
-            html_body = f"""
-            <html>
-            <head>
-                <style>
-                    body {{ font-family: Arial, sans-serif; }}
-                    .header {{ background-color: #4CAF50; color: white; padding: 20px; }}
-                    .content {{ padding: 20px; }}
-                    .stats {{ background-color: #f2f2f2; padding: 15px; margin: 10px 0; }}
-                    table {{ border-collapse: collapse; width: 100%; }}
-                    th, td {{ border: 1px solid #ddd; padding: 8px; text-align: left; }}
-                    th {{ background-color: #4CAF50; color: white; }}
-                </style>
-            </head>
-            <body>
-                <div class="header">
-                    <h1>Monthly Activity Report</h1>
-                    <p>{first_day_previous_month.strftime('%B %Y')}</p>
-                </div>
-                <div class="content">
-                    <h2>Dr. {doctor.full_name}</h2>
-                    <p>Specialization: {doctor.specialization.name}</p>
-                    
-                    <div class="stats">
-                        <h3>Summary Statistics</h3>
-                        <p><strong>Total Appointments:</strong> {total_appointments}</p>
-                        <p><strong>Completed:</strong> {completed}</p>
-                        <p><strong>Cancelled:</strong> {cancelled}</p>
-                    </div>
-                    
-                    <h3>Appointment Details</h3>
-                    <table>
-                        <tr>
-                            <th>Date</th>
-                            <th>Patient</th>
-                            <th>Status</th>
-                            <th>Diagnosis</th>
-                        </tr>
-            """
-            
-            for apt in appointments:
-                diagnosis = apt.treatment.diagnosis if apt.treatment else 'N/A'
-                html_body += f"""
-                        <tr>
-                            <td>{apt.appointment_date.strftime('%Y-%m-%d')}</td>
-                            <td>{apt.patient.full_name}</td>
-                            <td>{apt.status}</td>
-                            <td>{diagnosis}</td>
-                        </tr>
-                """
-            
-            html_body += """
-                    </table>
-                </div>
-            </body>
-            </html>
-            """
-            
-            msg = Message(
-                subject=f'Monthly Activity Report - {first_day_previous_month.strftime("%B %Y")}',
-                recipients=[doctor.user.email],
-                html=html_body
-            )
-            
-            mail.send(msg)
-            sent_count += 1
-            
-        except Exception as e:
-            current_app.logger.error(f"Failed to send report to {doctor.user.email}: {str(e)}")
+    # Two queries for the whole chunk regardless of doctor or appointment count
+    doctors = _monthly_report_stats(list(claimed), first_day, last_day) if claimed else []
+    details = _monthly_report_details([doctor.id for doctor in doctors], first_day, last_day) if doctors else {}
+    failed = []
+    
+    def messages():
+        for doctor in doctors:
+            try:
+                yield doctor.id, _monthly_report_message(doctor, details.get(doctor.id, []), first_day)
+            except Exception as e:
+                current_app.logger.error(f"Failed to build report for {doctor.email}: {str(e)}")
+                failed.append(doctor.id)
+    
+    sent, send_failed = send_batched(messages(), on_batch=partial(record_deliveries, MONTHLY_REPORT, first_day))
+    release_claims(MONTHLY_REPORT, first_day, list(claimed - set(sent)), owner)
+    
+    return {'sent': len(sent), 'failed': len(failed) + len(send_failed)}
+
+@celery.task(name='app.tasks.extend_availability')
+def extend_availability():
+    """Extend doctor schedules from their templates and prune past unbooked slots"""
+    today = date.today()
+    horizon_end = today + timedelta(days=current_app.config['AVAILABILITY_HORIZON_DAYS'])
+    
+    try:
+        extended = extend_schedules(horizon_end)
+        pruned = prune_past_availability(today)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Failed to extend availability: {str(e)}")
+        raise
+    
+    for doctor_id, days in extended.items():
+        invalidate_doctor_availability(doctor_id)
+        index_days(doctor_id, days)
     
-    return f"Sent {sent_count} monthly reports"
+    return f"Extended {len(extended)} doctor schedules to {horizon_end.isoformat()}, pruned {pruned} past slots"
 
 @celery.task(name='app.tasks.export_treatment_csv', bind=True)
-def export_treatment_csv(self, patient_id, email):
-    """Export patient treatment history as CSV"""
+def export_treatment_csv(self, patient_id, incremental=False):
+    """Export patient treatment history as a downloadable gzip-compressed CSV
+    
+    Rows are streamed from one joined query in EXPORT_BATCH_SIZE batches into
+    the artifact store, reporting rows done out of the total as progress. An
+    unchanged history returns the artifact stored by an earlier export. An
+    incremental export only includes treatments changed since the patient's
+    last incremental export.
+    """
     try:
-        self.update_state(state='PROGRESS', meta={'status': 'Fetching treatment data...'})
+        self.update_state(state='PROGRESS', meta={'status': 'Fetching treatment data...', 'current': 0, 'total': 0})
         
-        patient = Patient.query.get(patient_id)
+        patient = db.session.get(Patient, patient_id)
         if not patient:
             return {'status': 'error', 'message': 'Patient not found'}
         
-        # Get all completed appointments with treatments
-        appointments = Appointment.query.filter_by(
-            patient_id=patient_id,
-            status='completed'
-        ).order_by(Appointment.appointment_date.desc()).all()
+        # Completed appointments with treatments, in one joined query
+        criteria = [
+            Appointment.patient_id == patient_id,
+            Appointment.status == 'completed',
+            Treatment.id.isnot(None)
+        ]
         
-        # Create CSV in memory
-        output = StringIO()
-        writer = csv.writer(output)
+        consumer = f'treatment_history:{patient_id}'
+        since = until = None
+        if incremental:
+            since, until = export_window(consumer)
+            criteria.extend(changed_between(since, until))
         
-        # Write header
-        writer.writerow([
-            'Patient ID',
-            'Patient Name',
-            'Doctor Name',
-            'Specialization',
-            'Appointment Date',
-            'Diagnosis',
-            'Prescription',
-            'Treatment Notes',
-            'Next Visit Date'
-        ])
+        query = appointment_listing(*criteria)
         
-        # Write data
-        for apt in appointments:
-            if apt.treatment:
+        total, last_updated, last_treatment_id = db.session.query(
+            db.func.count(Appointment.id),
+            db.func.max(Appointment.updated_at),
+            db.func.max(Treatment.id)
+        ).join(
+            Treatment, Treatment.appointment_id == Appointment.id
+        ).filter(*criteria).one()
+        
+        # Renaming a doctor or specialization changes the rows without touching
+        # any appointment, so the names the export prints are part of its key
+        names = db.session.query(
+            Doctor.id, Doctor.full_name, Specialization.name
+        ).join(
+            Appointment, Appointment.doctor_id == Doctor.id
+        ).join(
+            Specialization, Specialization.id == Doctor.specialization_id
+        ).join(
+            Treatment, Treatment.appointment_id == Appointment.id
+        ).filter(*criteria).distinct().order_by(Doctor.id).all()
+        
+        key = fingerprint(
+            'treatment_history', patient_id, patient.full_name, total, last_updated, last_treatment_id,
+            [tuple(row) for row in names]
+        )
+        artifact = None if incremental else cached_artifact(key)
+        if artifact is not None:
+            return {
+                'status': 'success',
+                'message': 'Export ready for download',
+                'patient_id': patient_id,
+                'cached': True,
+                **artifact
+            }
+        
+        batch_size = current_app.config['EXPORT_BATCH_SIZE']
+        with ArtifactWriter(f'treatment_history_{patient_id}') as output:
+            writer = csv.writer(output.stream)
+            
+            # Write header
+            writer.writerow([
+                'Patient ID',
+                'Patient Name',
+                'Doctor Name',
+                'Specialization',
+                'Appointment Date',
+                'Diagnosis',
+                'Prescription',
+                'Treatment Notes',
+                'Next Visit Date'
+            ])
+            
+            # Write data
+            written = 0
+            rows = query.order_by(Appointment.appointment_date.desc(), Appointment.id.desc()).yield_per(batch_size)
+            for row in rows:
                 writer.writerow([
-                    patient.id,
-                    patient.full_name,
-                    apt.doctor.full_name,
-                    apt.doctor.specialization.name,
-                    apt.appointment_date.strftime('%Y-%m-%d'),
-                    apt.treatment.diagnosis,
-                    apt.treatment.prescription or 'N/A',
-                    apt.treatment.notes or 'N/A',
-                    apt.treatment.next_visit_date.strftime('%Y-%m-%d') if apt.treatment.next_visit_date else 'N/A'
+                    row.patient_id,
+                    row.patient_name,
+                    row.doctor_name,
+                    row.specialization,
+                    row.appointment_date.strftime('%Y-%m-%d'),
+                    row.diagnosis,
+                    row.prescription or 'N/A',
+                    row.notes or 'N/A',
+                    row.next_visit_date.strftime('%Y-%m-%d') if row.next_visit_date else 'N/A'
                 ])
+                written += 1
+                if written % batch_size == 0:
+                    self.update_state(state='PROGRESS', meta={
+                        'status': 'Writing rows...', 'current': written, 'total': total
+                    })
         
-        csv_content = output.getvalue()
-        output.close()
+        artifact = {'filename': output.filename, 'records': written}
+        if incremental:
+            advance_watermark(consumer, until)
+            artifact.update(since=since.isoformat() if since else None, until=until.isoformat())
+        else:
+            remember_artifact(key, artifact)
         
-        self.update_state(state='PROGRESS', meta={'status': 'Sending email...'})
-        
-        # Send email with CSV attachment
-        msg = Message(
-            subject='Your Treatment History Export',
-            recipients=[email],
-            body=f"""
-Dear {patient.full_name},
-
-Your treatment history export is ready. Please find the CSV file attached.
-
-This file contains all your completed appointments and treatment details.
+        return {
+            'status': 'success',
+            'message': 'Export ready for download',
+            'patient_id': patient_id,
+            'cached': False,
+            **artifact
+        }
+    
+    except Exception as e:
+        return {
+            'status': 'error',
+            'message': str(e)
+        }
 
-Best regards,
-Hospital Management System
-            """
-        )
+@celery.task(name='app.tasks.export_appointments_columnar', bind=True)
+def export_appointments_columnar(self, start_date=None, end_date=None, file_format=None, consumer=None):
+    """Export appointments with treatments, doctors and specializations as columnar files
+    
+    Rows are read from one joined query in EXPORT_BATCH_SIZE batches and
+    written as record batches to one Parquet or Arrow IPC file per month
+    (month=YYYY-MM directories), bundled into a single tar artifact. With a
+    consumer name only appointments changed since that consumer's last
+    export are included.
+    """
+    try:
+        file_format = file_format or current_app.config['EXPORT_COLUMNAR_FORMAT']
+        if file_format not in FORMATS:
+            return {'status': 'error', 'message': f"Unsupported format: {file_format}"}
         
-        msg.attach(
-            f'treatment_history_{patient_id}_{datetime.now().strftime("%Y%m%d")}.csv',
-            'text/csv',
-            csv_content
-        )
+        self.update_state(state='PROGRESS', meta={'status': 'Counting appointments...', 'current': 0, 'total': 0})
         
-        mail.send(msg)
+        criteria = []
+        if start_date:
+            criteria.append(Appointment.appointment_date >= date.fromisoformat(start_date))
+        if end_date:
+            criteria.append(Appointment.appointment_date <= date.fromisoformat(end_date))
         
-        return {
+        since = until = None
+        if consumer:
+            since, until = export_window(consumer)
+            criteria.extend(changed_between(since, until))
+        
+        total = db.session.query(db.func.count(Appointment.id)).filter(*criteria).scalar()
+        
+        batch_size = current_app.config['EXPORT_BATCH_SIZE']
+        query = appointment_listing(*criteria).add_columns(
+            Appointment.created_at, Appointment.updated_at
+        ).order_by(Appointment.appointment_date, Appointment.id).yield_per(batch_size)
+        
+        staging = tempfile.mkdtemp(prefix='.columnar-', dir=export_dir())
+        try:
+            root = os.path.join(staging, 'appointments')
+            written = 0
+            with PartitionedWriter(
+                root, file_format, batch_size=batch_size,
+                compression=current_app.config['EXPORT_PARQUET_COMPRESSION']
+            ) as writer:
+                for row in query:
+                    writer.write(row.appointment_date.strftime('%Y-%m'), row._mapping)
+                    written += 1
+                    if written % batch_size == 0:
+                        self.update_state(state='PROGRESS', meta={
+                            'status': 'Writing rows...', 'current': written, 'total': total
+                        })
+            
+            # Partitions are already compressed, so the bundle is a plain tar
+            bundle = os.path.join(staging, 'appointments.tar')
+            with tarfile.open(bundle, 'w') as tar:
+                tar.add(root, arcname='appointments')
+            filename = store_file(bundle, f'appointments_{file_format}', '.tar')
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+        
+        result = {
             'status': 'success',
-            'message': 'CSV exported and sent via email',
-            'records': len(appointments)
+            'message': 'Export ready for download',
+            'filename': filename,
+            'format': file_format,
+            'partitions': writer.partitions,
+            'records': written,
+            'mimetype': 'application/x-tar',
+            'download_name': f"appointments_{file_format}_{datetime.now().strftime('%Y%m%d')}.tar"
         }
+        if consumer:
+            advance_watermark(consumer, until)
+            result.update(consumer=consumer, since=since.isoformat() if since else None, until=until.isoformat())
+        
+        return result
     
     except Exception as e:
         return {
             'status': 'error',
             'message': str(e)
         }
+
+@celery.task(name='app.tasks.sweep_export_artifacts')
+def sweep_export_artifacts():
+    """Delete export artifacts older than EXPORT_TTL"""
+    return f"Removed {sweep_artifacts()} expired export artifacts"
@@ -0,0 +1,126 @@
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+from flask import current_app
+from app import redis_client
+
+# Local store for generated export files. Artifacts are compressed files
+# (gzip CSV, tar of Parquet/Arrow partitions) named by a hash of their
+# content, so identical exports share one file. A fingerprint of the
+# export's inputs maps to the stored file in Redis so an unchanged export
+# can be handed back without regenerating it. Files older than EXPORT_TTL
+# are removed by the sweep_export_artifacts task.
+
+FINGERPRINT_PREFIX = 'export:artifact:'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def export_dir():
+    directory = current_app.config['EXPORT_DIR']
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+def artifact_path(filename):
+    """Absolute path of a stored artifact, or None if it has expired or the name is not a plain filename"""
+    if not filename or os.path.basename(filename) != filename:
+        return None
+    path = os.path.join(export_dir(), filename)
+    return path if os.path.isfile(path) else None
+
+def fingerprint(*parts):
+    """Stable hash of an export's inputs"""
+    return hashlib.sha256(json.dumps(parts, default=str).encode('utf-8')).hexdigest()
+
+def cached_artifact(key):
+    """Stored artifact metadata for a fingerprint, or None if absent or expired"""
+    try:
+        cached_data = redis_client.get(f"{FINGERPRINT_PREFIX}{key}")
+    except Exception as e:
+        current_app.logger.error(f"Artifact cache read error: {e}")
+        return None
+    
+    if cached_data is None:
+        return None
+    artifact = json.loads(cached_data)
+    return artifact if artifact_path(artifact['filename']) else None
+
+def remember_artifact(key, artifact):
+    """Map a fingerprint to stored artifact metadata for EXPORT_TTL"""
+    try:
+        redis_client.set(f"{FINGERPRINT_PREFIX}{key}", json.dumps(artifact), ex=current_app.config['EXPORT_TTL'])
+    except Exception as e:
+        current_app.logger.error(f"Artifact cache write error: {e}")
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as stored:
+        for chunk in iter(lambda: stored.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def store_file(source_path, prefix, suffix):
+    """Move a finished file into the store as <prefix>_<content hash><suffix>; returns the name
+    
+    If an identical artifact is already stored the source is dropped and the
+    existing file's expiry clock restarts.
+    """
+    filename = f"{prefix}_{_file_digest(source_path)[:32]}{suffix}"
+    path = os.path.join(export_dir(), filename)
+    if os.path.exists(path):
+        os.remove(source_path)
+        os.utime(path)
+    else:
+        os.replace(source_path, path)
+    return filename
+
+class ArtifactWriter:
+    """Context manager writing a gzip-compressed text artifact
+    
+    Text written to .stream is compressed into a temporary file in the
+    export directory; on a clean exit it is stored with store_file and the
+    name is available as .filename.
+    """
+    
+    def __init__(self, prefix, suffix='.csv.gz'):
+        self.prefix = prefix
+        self.suffix = suffix
+        self.filename = None
+    
+    def __enter__(self):
+        self.directory = export_dir()
+        fd, self.temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        self._raw = os.fdopen(fd, 'wb')
+        # No name or timestamp in the gzip header, so equal content compresses to equal bytes
+        self._gzip = gzip.GzipFile(
+            filename='', mode='wb', fileobj=self._raw, mtime=0,
+            compresslevel=current_app.config['EXPORT_COMPRESSION_LEVEL']
+        )
+        self.stream = io.TextIOWrapper(self._gzip, encoding='utf-8', newline='')
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stream.close()
+        self._raw.close()
+        if exc_type is not None:
+            os.remove(self.temp_path)
+            return False
+        
+        self.filename = store_file(self.temp_path, self.prefix, self.suffix)
+        return False
+
+def sweep_artifacts():
+    """Delete artifacts (and abandoned temporary files) older than EXPORT_TTL; returns the count"""
+    cutoff = time.time() - current_app.config['EXPORT_TTL']
+    removed = 0
+    with os.scandir(export_dir()) as entries:
+        for entry in entries:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+    return removed
@@ -0,0 +1,113 @@
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Appointment, DoctorAvailability, Treatment
+from app.utils.slots import SlotUnavailable, claim_slot, release_slot
+from app.utils.slot_index import mark_booked, index_days
+
+BOOKED_SLOT_INDEX = 'uq_appointments_booked_slot'
+
+class AppointmentNotBooked(Exception):
+    """Raised when an appointment is no longer in the booked state"""
+
+def _is_slot_conflict(error):
+    """Whether an IntegrityError is a violation of the booked-slot unique index"""
+    message = str(error.orig)
+    # PostgreSQL names the index; SQLite lists the indexed columns
+    return BOOKED_SLOT_INDEX in message or (
+        'UNIQUE' in message and 'appointments.doctor_id, appointments.appointment_date, appointments.appointment_time' in message
+    )
+
+def _covering_availability(doctor_id, appointment_date, appointment_time):
+    """Availability rows whose range contains the given time"""
+    return db.and_(
+        DoctorAvailability.doctor_id == doctor_id,
+        DoctorAvailability.date == appointment_date,
+        DoctorAvailability.start_time <= appointment_time,
+        DoctorAvailability.end_time > appointment_time
+    )
+
+def book_appointment(patient_id, doctor_id, appointment_date, appointment_time, reason=None):
+    """Claim a doctor slot and create the appointment in one transaction
+    
+    The slot is claimed in the doctor-day bitmap with a compare-and-set,
+    which fails if it is outside availability or already taken. The
+    uq_appointments_booked_slot partial unique index backs this up at the
+    database level. The covering availability range is marked with a single
+    UPDATE in the same transaction. After commit the slot is dropped from
+    the free-slot search index.
+    """
+    claim_slot(doctor_id, appointment_date, appointment_time)
+    
+    appointment = Appointment(
+        patient_id=patient_id,
+        doctor_id=doctor_id,
+        appointment_date=appointment_date,
+        appointment_time=appointment_time,
+        reason=reason,
+        status='booked'
+    )
+    db.session.add(appointment)
+    
+    try:
+        db.session.flush()
+    except IntegrityError as e:
+        db.session.rollback()
+        if _is_slot_conflict(e):
+            raise SlotUnavailable('This time slot is already booked')
+        raise
+    
+    db.session.execute(
+        db.update(DoctorAvailability)
+        .where(_covering_availability(doctor_id, appointment_date, appointment_time))
+        .values(is_booked=True)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    mark_booked(doctor_id, appointment_date, appointment_time)
+    
+    return appointment
+
+def _set_status_if_booked(appointment, status):
+    """Move a booked appointment to status; rolls back and raises AppointmentNotBooked otherwise"""
+    result = db.session.execute(
+        db.update(Appointment)
+        .where(Appointment.id == appointment.id, Appointment.status == 'booked')
+        .values(status=status)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.session.rollback()
+        raise AppointmentNotBooked(f'Only booked appointments can be {status}')
+
+def complete_appointment(appointment, diagnosis, prescription=None, notes=None, next_visit_date=None):
+    """Complete a booked appointment and record its treatment in one transaction
+    
+    Like cancellation, the status change is conditional on the appointment
+    still being booked, so a cancel that commits first wins and the
+    completion fails instead of overwriting it.
+    """
+    _set_status_if_booked(appointment, 'completed')
+    
+    treatment = Treatment(
+        appointment_id=appointment.id,
+        diagnosis=diagnosis,
+        prescription=prescription,
+        notes=notes,
+        next_visit_date=next_visit_date
+    )
+    db.session.add(treatment)
+    db.session.commit()
+    return treatment
+
+def cancel_appointment(appointment):
+    """Cancel a booked appointment and free its slot in one transaction
+    
+    The status change is conditional on the appointment still being booked,
+    so racing cancel/complete requests cannot both apply. The availability
+    range stays marked booked while other slots in it are still taken.
+    """
+    _set_status_if_booked(appointment, 'cancelled')
+    
+    release_slot(appointment.doctor_id, appointment.appointment_date, appointment.appointment_time)
+    db.session.commit()
+    index_days(appointment.doctor_id, [appointment.appointment_date])
@@ -1,7 +1,153 @@
 import json
+import math
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from fnmatch import fnmatchcase
 from functools import wraps
 from flask import current_app
 from app import redis_client
+from app.utils.codecs import encode, decode
+
+TAG_PREFIX = 'cache:tag:'
+SCAN_BATCH_SIZE = 500
+INVALIDATION_CHANNEL = 'cache:invalidate'
+LOCK_PREFIX = 'cache:lock:'
+
+# Delete the lock only if we still own it
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+_release_script = None
+
+_MISSING = object()
+
+class LocalCache:
+    """Bounded in-process LRU with per-entry TTL, sitting in front of Redis"""
+    
+    def __init__(self, maxsize=256, ttl=30):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+    
+    def get(self, key):
+        """Return the live value for key, or _MISSING"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return _MISSING
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return _MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+    
+    def discard(self, keys=(), pattern=None):
+        """Drop the given keys and/or every key matching a glob pattern"""
+        with self._lock:
+            doomed = [k for k in keys if k in self._data]
+            if pattern:
+                doomed.extend(k for k in self._data if fnmatchcase(k, pattern))
+            for key in doomed:
+                self._data.pop(key, None)
+            self.invalidations += len(doomed)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
+
+local_cache = LocalCache()
+_subscriber = {'pid': None, 'thread': None}
+_subscriber_lock = threading.Lock()
+
+def _on_invalidation(message):
+    """Apply an invalidation published by any process to this process's LRU"""
+    try:
+        payload = json.loads(message['data'])
+        local_cache.discard(payload.get('keys', ()), payload.get('pattern'))
+    except (ValueError, TypeError):
+        local_cache.clear()
+
+def _on_subscriber_error(error, pubsub, thread):
+    # We may have missed invalidations; forget everything and resubscribe
+    # on the next local read.
+    thread.stop()
+    local_cache.clear()
+    _subscriber['pid'] = None
+
+def _local_layer():
+    """Return the in-process cache, subscribing this process to invalidations first.
+
+    Forked workers resubscribe on first use. If the subscription cannot be
+    established the local layer is bypassed, since it could not be kept
+    coherent.
+    """
+    if _subscriber['pid'] == os.getpid():
+        return local_cache
+    
+    with _subscriber_lock:
+        if _subscriber['pid'] != os.getpid():
+            local_cache.clear()
+            local_cache.maxsize = current_app.config['CACHE_LOCAL_MAXSIZE']
+            local_cache.ttl = current_app.config['CACHE_LOCAL_TIMEOUT']
+            try:
+                pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(**{INVALIDATION_CHANNEL: _on_invalidation})
+                _subscriber['thread'] = pubsub.run_in_thread(
+                    sleep_time=1, daemon=True, exception_handler=_on_subscriber_error
+                )
+                _subscriber['pid'] = os.getpid()
+            except Exception as e:
+                current_app.logger.error(f"Cache subscription error: {e}")
+                return None
+    
+    return local_cache
+
+def _publish_invalidation(keys=(), pattern=None):
+    """Evict keys from this process's LRU and tell every other process to do the same"""
+    keys = [k.decode('utf-8') if isinstance(k, bytes) else k for k in keys]
+    local_cache.discard(keys, pattern)
+    redis_client.publish(INVALIDATION_CHANNEL, json.dumps({'keys': keys, 'pattern': pattern}))
 
 def cache_key(*args, **kwargs):
     """Generate cache key from arguments"""
@@ -9,32 +155,185 @@ def cache_key(*args, **kwargs):
     key_parts.extend([f"{k}:{v}" for k, v in sorted(kwargs.items())])
     return ":".join(key_parts)
 
-def cached(prefix, timeout=300):
-    """Decorator to cache function results in Redis"""
+def _resolve_timeout(timeout):
+    return current_app.config[timeout] if isinstance(timeout, str) else timeout
+
+def _load(key):
+    """Read an entry as (value, expires_at, delta), or None on a miss"""
+    cached_data = redis_client.get(key)
+    if not cached_data:
+        return None
+    entry = decode(cached_data)
+    if not (isinstance(entry, dict) and entry.keys() == {'v', 'e', 'd'}):
+        return None
+    return entry['v'], entry['e'], entry['d']
+
+def _store(key, value, ttl, stale_ttl, delta, key_tags):
+    """Write an entry that is fresh for ttl seconds and kept stale_ttl longer"""
+    payload = encode(
+        {'v': value, 'e': time.time() + ttl, 'd': delta},
+        current_app.config['CACHE_CODEC'],
+        current_app.config['CACHE_COMPRESS_THRESHOLD']
+    )
+    pipe = redis_client.pipeline()
+    pipe.setex(key, ttl + stale_ttl, payload)
+    for tag in key_tags:
+        pipe.sadd(f"{TAG_PREFIX}{tag}", key)
+        pipe.expire(f"{TAG_PREFIX}{tag}", ttl + stale_ttl)
+    pipe.execute()
+
+def _acquire_lock(key):
+    """Take the short recompute lock for key; returns a release token or None"""
+    token = uuid.uuid4().hex
+    lock_timeout = current_app.config['CACHE_LOCK_TIMEOUT']
+    if redis_client.set(f"{LOCK_PREFIX}{key}", token, nx=True, px=int(lock_timeout * 1000)):
+        return token
+    return None
+
+def _release_lock(key, token):
+    global _release_script
+    if _release_script is None:
+        _release_script = redis_client.register_script(RELEASE_LOCK_SCRIPT)
+    _release_script(keys=[f"{LOCK_PREFIX}{key}"], args=[token])
+
+def _should_refresh_early(expires_at, delta, beta):
+    """Probabilistic early expiration (XFetch): refresh sooner the costlier the value"""
+    if not beta or not delta:
+        return False
+    return time.time() - delta * beta * math.log(random.random() or 1e-12) >= expires_at
+
+def cached(prefix, timeout=300, tags=None, local=False, early_expiration=1.0, stale_ttl=0):
+    """Decorator to cache function results in Redis
+    
+    timeout is either a number of seconds or the name of a config setting
+    (e.g. 'CACHE_DOCTOR_TIMEOUT') resolved at call time.
+    
+    tags is a list of tag names, or a callable taking the function's
+    arguments and returning one. Each stored key is recorded in a Redis set
+    per tag so invalidate_tag() can drop every key of a tag without a
+    keyspace scan. Keys sharing a tag should share a timeout, since the tag
+    set expires along with its most recently written member.
+    
+    local=True adds the per-process LRU in front of Redis for near-static
+    data. Writers' invalidations reach other processes over Redis pub/sub;
+    an entry missed in the window between computing and storing lives at
+    most CACHE_LOCAL_TIMEOUT seconds.
+    
+    Stampede protection: on a miss only the worker holding a short SET NX
+    lock recomputes; the others wait up to CACHE_LOCK_TIMEOUT for its result,
+    taking the lock over if it is released without a value being stored.
+    Entries record how long they took to compute, and early_expiration (the
+    XFetch beta, 0 to disable) makes a reader refresh a little before expiry
+    with a probability that grows with that cost. stale_ttl keeps entries
+    that many seconds past expiry (timeout or config key) and serves them
+    while a single background refresh runs (stale-while-revalidate).
+    """
     def decorator(f):
+        def compute_and_store(key, args, kwargs):
+            started = time.monotonic()
+            result = f(*args, **kwargs)
+            delta = time.monotonic() - started
+            
+            try:
+                ttl = _resolve_timeout(timeout)
+                key_tags = tags(*args, **kwargs) if callable(tags) else (tags or [])
+                _store(key, result, ttl, _resolve_timeout(stale_ttl), delta, key_tags)
+            except Exception as e:
+                current_app.logger.error(f"Cache write error: {e}")
+            
+            return result
+        
+        def refresh_in_background(key, token, args, kwargs):
+            app = current_app._get_current_object()
+            
+            def run():
+                with app.app_context():
+                    try:
+                        compute_and_store(key, args, kwargs)
+                    except Exception as e:
+                        app.logger.error(f"Cache refresh error: {e}")
+                    finally:
+                        try:
+                            _release_lock(key, token)
+                        except Exception as e:
+                            app.logger.error(f"Cache unlock error: {e}")
+            
+            threading.Thread(target=run, daemon=True).start()
+        
+        def compute_locked(key, token, args, kwargs):
+            try:
+                return compute_and_store(key, args, kwargs)
+            finally:
+                try:
+                    _release_lock(key, token)
+                except Exception as e:
+                    current_app.logger.error(f"Cache unlock error: {e}")
+        
         @wraps(f)
         def decorated_function(*args, **kwargs):
             # Generate cache key
             key = f"{prefix}:{cache_key(*args, **kwargs)}"
+            layer = _local_layer() if local else None
+            
+            def remember(value):
+                if layer is not None:
+                    layer.set(key, value)
+                return value
+            
+            # Try the in-process layer, then Redis
+            if layer is not None:
+                value = layer.get(key)
+                if value is not _MISSING:
+                    return value
             
-            # Try to get from cache
             try:
-                cached_data = redis_client.get(key)
-                if cached_data:
-                    return json.loads(cached_data)
+                entry = _load(key)
+                if entry is not None:
+                    value, expires_at, delta = entry
+                    expired = time.time() >= expires_at
+                    if not expired and not _should_refresh_early(expires_at, delta, early_expiration):
+                        return remember(value)
+                    if expired and not stale_ttl:
+                        entry = None
+                token = _acquire_lock(key)
             except Exception as e:
                 current_app.logger.error(f"Cache read error: {e}")
+                return remember(compute_and_store(key, args, kwargs))
             
-            # Execute function
-            result = f(*args, **kwargs)
+            # Due for an early or stale refresh: the lock holder refreshes,
+            # everyone else keeps serving the current value meanwhile.
+            if entry is not None:
+                if token is None:
+                    return entry[0]
+                if stale_ttl:
+                    refresh_in_background(key, token, args, kwargs)
+                    return entry[0]
+                return remember(compute_locked(key, token, args, kwargs))
+            
+            # Miss: the lock holder recomputes, others wait for its result
+            if token is not None:
+                return remember(compute_locked(key, token, args, kwargs))
             
-            # Store in cache
             try:
-                redis_client.setex(key, timeout, json.dumps(result))
+                deadline = time.monotonic() + current_app.config['CACHE_LOCK_TIMEOUT']
+                while time.monotonic() < deadline:
+                    time.sleep(current_app.config['CACHE_LOCK_POLL_INTERVAL'])
+                    entry = _load(key)
+                    if entry is not None:
+                        return remember(entry[0])
+                    # A released lock with no value means the holder failed
+                    # to compute or store it: take over instead of waiting
+                    token = _acquire_lock(key)
+                    if token is not None:
+                        break
             except Exception as e:
-                current_app.logger.error(f"Cache write error: {e}")
+                current_app.logger.error(f"Cache read error: {e}")
             
-            return result
+            if token is not None:
+                return remember(compute_locked(key, token, args, kwargs))
+            
+            # The lock holder timed out or Redis failed: compute directly
+            return remember(compute_and_store(key, args, kwargs))
         return decorated_function
     return decorator
 
@@ -43,14 +342,45 @@ def invalidate_cache(prefix, *args, **kwargs):
     key = f"{prefix}:{cache_key(*args, **kwargs)}"
     try:
         redis_client.delete(key)
+        _publish_invalidation([key])
     except Exception as e:
         current_app.logger.error(f"Cache invalidation error: {e}")
 
+def invalidate_tag(*tags):
+    """Invalidate every cache key recorded under the given tags.
+    
+    Costs O(keys in tag). Only the members read are removed from the tag set,
+    so a key tagged concurrently with the invalidation is not forgotten.
+    """
+    try:
+        for tag in tags:
+            tag_key = f"{TAG_PREFIX}{tag}"
+            keys = redis_client.smembers(tag_key)
+            if keys:
+                pipe = redis_client.pipeline()
+                pipe.delete(*keys)
+                pipe.srem(tag_key, *keys)
+                pipe.execute()
+                _publish_invalidation(keys)
+    except Exception as e:
+        current_app.logger.error(f"Cache tag invalidation error: {e}")
+
 def invalidate_pattern(pattern):
-    """Invalidate all cache keys matching pattern"""
+    """Invalidate all cache keys matching pattern.
+    
+    Walks the keyspace incrementally with SCAN rather than KEYS so Redis is
+    never blocked; still O(keyspace) overall, so reserve it for administrative
+    purges and use invalidate_cache()/invalidate_tag() on write paths.
+    """
     try:
-        keys = redis_client.keys(pattern)
-        if keys:
-            redis_client.delete(*keys)
+        batch = []
+        for key in redis_client.scan_iter(match=pattern, count=SCAN_BATCH_SIZE):
+            batch.append(key)
+            if len(batch) >= SCAN_BATCH_SIZE:
+                redis_client.delete(*batch)
+                batch = []
+        if batch:
+            redis_client.delete(*batch)
+        _publish_invalidation(pattern=pattern)
     except Exception as e:
         current_app.logger.error(f"Cache pattern invalidation error: {e}")
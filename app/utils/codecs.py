@@ -0,0 +1,74 @@
+import json
+import zlib
+
+# Serialized cache payloads are framed with a one-byte codec marker so
+# readers can decode entries written under any CACHE_CODEC setting, which
+# keeps codec changes safe during rolling deploys. Payloads at or above
+# CACHE_COMPRESS_THRESHOLD bytes are zlib-compressed and framed again with
+# COMPRESSED.
+
+COMPRESSED = b'Z'
+
+class JSONCodec:
+    """Standard-library JSON, always available"""
+    name = 'json'
+    marker = b'J'
+    
+    def dumps(self, value):
+        return json.dumps(value, separators=(',', ':')).encode('utf-8')
+    
+    def loads(self, data):
+        return json.loads(data)
+
+class MsgpackCodec:
+    """MessagePack: smaller and faster than JSON for lists of dicts (needs msgpack)"""
+    name = 'msgpack'
+    marker = b'M'
+    
+    def __init__(self):
+        import msgpack
+        self._msgpack = msgpack
+    
+    def dumps(self, value):
+        return self._msgpack.packb(value, use_bin_type=True)
+    
+    def loads(self, data):
+        return self._msgpack.unpackb(data, raw=False)
+
+_codec_classes = {cls.name: cls for cls in (JSONCodec, MsgpackCodec)}
+_codecs = {}
+
+def get_codec(name):
+    """Return the codec instance for name, falling back to JSON if its dependency is missing"""
+    if name not in _codecs:
+        try:
+            _codecs[name] = _codec_classes[name]()
+        except ImportError:
+            _codecs[name] = get_codec(JSONCodec.name)
+    return _codecs[name]
+
+def _by_marker(marker):
+    for name, cls in _codec_classes.items():
+        if cls.marker == marker:
+            return get_codec(name)
+    return None
+
+def encode(value, codec_name='json', compress_threshold=None, compress_level=6):
+    """Serialize value into a framed payload"""
+    codec = get_codec(codec_name)
+    payload = codec.marker + codec.dumps(value)
+    if compress_threshold is not None and len(payload) >= compress_threshold:
+        payload = COMPRESSED + zlib.compress(payload, compress_level)
+    return payload
+
+def decode(payload):
+    """Deserialize a framed payload written by encode()"""
+    marker, body = payload[:1], payload[1:]
+    if marker == COMPRESSED:
+        return decode(zlib.decompress(body))
+    codec = _by_marker(marker)
+    if codec is None:
+        # Unframed JSON written before codecs were introduced; no JSON
+        # document starts with a marker byte
+        return json.loads(payload)
+    return codec.loads(body)
@@ -0,0 +1,115 @@
+import os
+
+# Columnar appointment extracts for analytics. Rows are written in record
+# batches to one file per month under hive-style month=YYYY-MM directories,
+# as Parquet or Arrow IPC (which readers can memory-map directly). pyarrow
+# is imported on first use so the web app and the other tasks still start
+# when it is missing or broken.
+
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+def _arrow():
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+    return pyarrow
+
+def appointment_schema():
+    """Arrow schema of the appointment extract"""
+    pa = _arrow()
+    return pa.schema([
+        ('id', pa.int64()),
+        ('patient_id', pa.int64()),
+        ('doctor_id', pa.int64()),
+        ('appointment_date', pa.date32()),
+        ('appointment_time', pa.time64('us')),
+        ('status', pa.string()),
+        ('reason', pa.string()),
+        ('patient_name', pa.string()),
+        ('doctor_name', pa.string()),
+        ('specialization', pa.string()),
+        ('treatment_id', pa.int64()),
+        ('diagnosis', pa.string()),
+        ('prescription', pa.string()),
+        ('notes', pa.string()),
+        ('next_visit_date', pa.date32()),
+        ('created_at', pa.timestamp('us')),
+        ('updated_at', pa.timestamp('us'))
+    ])
+
+class PartitionedWriter:
+    """Buffer rows into record batches and write one file per month partition
+    
+    Rows must arrive grouped by month (e.g. ordered by date).
+    """
+    
+    def __init__(self, root, file_format='parquet', schema=None, batch_size=1000, compression='snappy'):
+        if file_format not in FORMATS:
+            raise ValueError(f"Unsupported format: {file_format}")
+        self._pa = _arrow()
+        schema = schema or appointment_schema()
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.file_format = file_format
+        self.schema = schema
+        self.batch_size = batch_size
+        self.compression = compression
+        self.partitions = []
+        self._month = None
+        self._writer = None
+        self._sink = None
+        self._columns = {name: [] for name in schema.names}
+        self._buffered = 0
+    
+    def _open(self, month):
+        directory = os.path.join(self.root, f'month={month}')
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'part-0{FORMATS[self.file_format]}')
+        if self.file_format == 'parquet':
+            self._writer = self._pa.parquet.ParquetWriter(path, self.schema, compression=self.compression)
+        else:
+            self._sink = self._pa.OSFile(path, 'wb')
+            self._writer = self._pa.ipc.new_file(self._sink, self.schema)
+        self._month = month
+        self.partitions.append(month)
+    
+    def _flush(self):
+        if not self._buffered:
+            return
+        batch = self._pa.RecordBatch.from_pydict(self._columns, schema=self.schema)
+        if self.file_format == 'parquet':
+            self._writer.write_batch(batch)
+        else:
+            self._writer.write(batch)
+        self._columns = {name: [] for name in self.schema.names}
+        self._buffered = 0
+    
+    def _close_partition(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+    
+    def write(self, month, row):
+        """Append a row (mapping of column name to value) to the month's partition"""
+        if month != self._month:
+            self._close_partition()
+            self._open(month)
+        for name in self.schema.names:
+            self._columns[name].append(row[name])
+        self._buffered += 1
+        if self._buffered >= self.batch_size:
+            self._flush()
+    
+    def close(self):
+        self._close_partition()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,73 @@
+from datetime import timedelta
+from flask import current_app
+from app import db
+from app.models import Doctor, Specialization
+from app.utils.cache import cached, invalidate_cache, invalidate_tag
+from app.utils.slots import doctor_free_slots, upcoming_slots
+
+# Cached read models for the patient-facing doctor directory. Callers must
+# pass arguments positionally so reads and invalidations build the same key.
+
+@cached('specializations', timeout='CACHE_DEPARTMENT_TIMEOUT', local=True,
+        stale_ttl='CACHE_STALE_TIMEOUT')
+def specialization_directory():
+    """All specializations with their doctor counts"""
+    rows = db.session.query(
+        Specialization.id,
+        Specialization.name,
+        Specialization.description,
+        db.func.count(Doctor.id).label('doctors_count')
+    ).outerjoin(
+        Doctor, Doctor.specialization_id == Specialization.id
+    ).group_by(Specialization.id).order_by(Specialization.id).all()
+
+    return [row._asdict() for row in rows]
+
+@cached('doctors:list', timeout='CACHE_DOCTOR_TIMEOUT', local=True,
+        stale_ttl='CACHE_STALE_TIMEOUT')
+def doctor_directory(specialization_id):
+    """Available doctors, optionally filtered by specialization"""
+    query = db.session.query(
+        Doctor.id,
+        Doctor.full_name,
+        Specialization.name.label('specialization'),
+        Doctor.qualification,
+        Doctor.experience_years,
+        Doctor.consultation_fee
+    ).join(
+        Specialization, Specialization.id == Doctor.specialization_id
+    ).filter(Doctor.is_available == True)
+
+    if specialization_id:
+        query = query.filter(Doctor.specialization_id == specialization_id)
+
+    return [row._asdict() for row in query.order_by(Doctor.id).all()]
+
+@cached('doctors:availability', timeout='CACHE_DOCTOR_TIMEOUT',
+        tags=lambda doctor_id, start: [f'availability:{doctor_id}'])
+def _doctor_window_slots(doctor_id, start):
+    """Free slots for AVAILABILITY_WINDOW_DAYS from start, started or not; None for an unknown doctor"""
+    if db.session.get(Doctor, doctor_id) is None:
+        return None
+
+    end = start + timedelta(days=current_app.config['AVAILABILITY_WINDOW_DAYS'])
+    return doctor_free_slots(doctor_id, start, end, upcoming=False)
+
+def doctor_open_slots(doctor_id, start):
+    """Free upcoming slots for AVAILABILITY_WINDOW_DAYS from start, or None for an unknown doctor"""
+    # The window is cached for minutes, so slots that started since are dropped on every read
+    slots = _doctor_window_slots(doctor_id, start)
+    return None if slots is None else upcoming_slots(slots)
+
+def invalidate_specializations():
+    """Drop the cached specialization list"""
+    invalidate_cache('specializations')
+
+def invalidate_doctor_directory(*specialization_ids):
+    """Drop the unfiltered doctor list and the lists for the given specializations"""
+    for specialization_id in {None, *specialization_ids}:
+        invalidate_cache('doctors:list', specialization_id)
+
+def invalidate_doctor_availability(doctor_id):
+    """Drop every cached availability window for a doctor"""
+    invalidate_tag(f'availability:{doctor_id}')
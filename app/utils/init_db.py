@@ -1,6 +1,60 @@
 from datetime import datetime, date, time, timedelta
 from app import db, bcrypt
-from app.models import User, Patient, Doctor, Specialization, DoctorAvailability
+from app.models import User, Patient, Doctor, Specialization, DoctorAvailability, ScheduleTemplate
+
+def ensure_columns():
+    """Add nullable columns declared on the models that an existing table lacks
+    
+    db.create_all() skips tables that already exist, so columns added to a
+    model after its table was created are only picked up here. Columns that
+    are NOT NULL without a server default cannot be added to populated
+    tables and are reported instead.
+    """
+    inspector = db.inspect(db.engine)
+    preparer = db.engine.dialect.identifier_preparer
+    added = []
+    for table in db.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            if not column.nullable and column.server_default is None:
+                print(f"✗ Cannot add NOT NULL column {table.name}.{column.name}; migrate it by hand")
+                continue
+            try:
+                with db.engine.begin() as connection:
+                    connection.exec_driver_sql(
+                        f"ALTER TABLE {preparer.format_table(table)} "
+                        f"ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=db.engine.dialect)}"
+                    )
+                added.append(f'{table.name}.{column.name}')
+            except Exception as e:
+                print(f"✗ Could not add column {table.name}.{column.name}: {e}")
+    
+    if added:
+        print(f"✓ Added missing columns: {', '.join(added)}")
+
+def ensure_indexes():
+    """Create indexes declared on the models that an existing database lacks
+    
+    db.create_all() skips tables that already exist, so indexes added to a
+    model after its table was created are only picked up here.
+    """
+    inspector = db.inspect(db.engine)
+    created = []
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            try:
+                if not inspector.has_index(table.name, index.name):
+                    index.create(bind=db.engine)
+                    created.append(index.name)
+            except Exception as e:
+                print(f"✗ Could not create index {index.name}: {e}")
+    
+    if created:
+        print(f"✓ Created missing indexes: {', '.join(created)}")
 
 def create_admin_user():
     """Create default admin user if not exists"""
@@ -72,6 +126,7 @@ def create_sample_data():
         },
     ]
     
+    doctor_ids = []
     for doc_data in doctors_data:
         # Create user account
         user = User(
@@ -99,30 +154,37 @@ def create_sample_data():
         )
         db.session.add(doctor)
         db.session.flush()
-        
-        # Create availability for next 7 days
-        for i in range(7):
-            availability_date = date.today() + timedelta(days=i)
-            
-            # Morning slot
-            morning_slot = DoctorAvailability(
-                doctor_id=doctor.id,
-                date=availability_date,
-                start_time=time(9, 0),
-                end_time=time(12, 0),
-                is_booked=False
-            )
-            db.session.add(morning_slot)
-            
-            # Evening slot
-            evening_slot = DoctorAvailability(
-                doctor_id=doctor.id,
-                date=availability_date,
-                start_time=time(14, 0),
-                end_time=time(17, 0),
-                is_booked=False
-            )
-            db.session.add(evening_slot)
+        doctor_ids.append(doctor.id)
+    
+    # Create morning and evening availability for next 7 days in one bulk insert
+    sample_windows = [(time(9, 0), time(12, 0)), (time(14, 0), time(17, 0))]
+    availability_rows = [
+        {
+            'doctor_id': doctor_id,
+            'date': date.today() + timedelta(days=i),
+            'start_time': start_time,
+            'end_time': end_time,
+            'is_booked': False
+        }
+        for doctor_id in doctor_ids
+        for i in range(7)
+        for start_time, end_time in sample_windows
+    ]
+    db.session.execute(db.insert(DoctorAvailability), availability_rows)
+    
+    # Same windows every day as the template the schedule is extended from
+    db.session.execute(db.insert(ScheduleTemplate), [
+        {
+            'doctor_id': doctor_id,
+            'weekday': weekday,
+            'start_time': start_time,
+            'end_time': end_time,
+            'generated_until': date.today() + timedelta(days=6)
+        }
+        for doctor_id in doctor_ids
+        for weekday in range(7)
+        for start_time, end_time in sample_windows
+    ])
     
     db.session.commit()
     print("✓ Sample specializations and doctors created successfully")
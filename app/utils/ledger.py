@@ -0,0 +1,125 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import DeliveryLedger
+
+# Delivery ledger for scheduled notifications. A chunk claims its items
+# under the (kind, period, reference_id) unique constraint before sending
+# and sends only the items it holds, so overlapping runs (a coordinator
+# rerun while earlier chunks are still queued, another shard) never send
+# the same item twice. Items are marked delivered as each batch goes out;
+# claims on items that failed are dropped so a rerun retries them. A
+# redelivered chunk keeps its task id and therefore its own claims; claims
+# left by a crashed worker can be taken over after DELIVERY_CLAIM_TIMEOUT.
+# Delivery is at-least-once: a crash can repeat at most the batch in flight.
+
+REMINDER = 'reminder'
+MONTHLY_REPORT = 'monthly_report'
+
+def _claim_cutoff():
+    return datetime.utcnow() - timedelta(seconds=current_app.config['DELIVERY_CLAIM_TIMEOUT'])
+
+def _item(kind, period, reference_ids):
+    return (
+        DeliveryLedger.kind == kind,
+        DeliveryLedger.period == period,
+        DeliveryLedger.reference_id.in_(reference_ids)
+    )
+
+def undelivered(kind, period, reference_column):
+    """Criterion excluding items already delivered or currently claimed"""
+    return ~db.exists().where(
+        DeliveryLedger.kind == kind,
+        DeliveryLedger.period == period,
+        DeliveryLedger.reference_id == reference_column,
+        db.or_(DeliveryLedger.delivered_at.isnot(None), DeliveryLedger.claimed_at >= _claim_cutoff())
+    )
+
+def claim_deliveries(kind, period, reference_ids, owner):
+    """Claim items for sending by owner and commit; returns the ids owner holds
+    
+    Items delivered or claimed by another owner are left out.
+    """
+    if not reference_ids:
+        return set()
+    
+    # Take over claims abandoned by a crashed worker
+    db.session.execute(
+        db.delete(DeliveryLedger)
+        .where(
+            *_item(kind, period, reference_ids),
+            DeliveryLedger.delivered_at.is_(None),
+            DeliveryLedger.claimed_at < _claim_cutoff(),
+            DeliveryLedger.claimed_by != owner
+        )
+        .execution_options(synchronize_session=False)
+    )
+    
+    recorded = {row.reference_id for row in db.session.query(DeliveryLedger.reference_id).filter(
+        *_item(kind, period, reference_ids)
+    )}
+    now = datetime.utcnow()
+    rows = [
+        {'kind': kind, 'period': period, 'reference_id': reference_id, 'claimed_by': owner, 'claimed_at': now}
+        for reference_id in reference_ids if reference_id not in recorded
+    ]
+    
+    if rows:
+        try:
+            db.session.execute(db.insert(DeliveryLedger), rows)
+            db.session.commit()
+        except IntegrityError:
+            # Another chunk claimed some of these in between; fall back to one row at a time
+            db.session.rollback()
+            for row in rows:
+                try:
+                    db.session.execute(db.insert(DeliveryLedger), [row])
+                    db.session.commit()
+                except IntegrityError:
+                    db.session.rollback()
+    else:
+        db.session.commit()
+    
+    return {row.reference_id for row in db.session.query(DeliveryLedger.reference_id).filter(
+        *_item(kind, period, reference_ids),
+        DeliveryLedger.claimed_by == owner,
+        DeliveryLedger.delivered_at.is_(None)
+    )}
+
+def record_deliveries(kind, period, reference_ids):
+    """Mark claimed items delivered and commit"""
+    if not reference_ids:
+        return
+    db.session.execute(
+        db.update(DeliveryLedger)
+        .where(*_item(kind, period, reference_ids))
+        .values(delivered_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+def release_claims(kind, period, reference_ids, owner):
+    """Drop owner's undelivered claims so a later run retries those items; commits"""
+    if not reference_ids:
+        return
+    db.session.execute(
+        db.delete(DeliveryLedger)
+        .where(
+            *_item(kind, period, reference_ids),
+            DeliveryLedger.claimed_by == owner,
+            DeliveryLedger.delivered_at.is_(None)
+        )
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+
+def prune_ledger():
+    """Delete ledger entries older than DELIVERY_LEDGER_RETENTION_DAYS"""
+    cutoff = datetime.utcnow() - timedelta(days=current_app.config['DELIVERY_LEDGER_RETENTION_DAYS'])
+    db.session.execute(
+        db.delete(DeliveryLedger)
+        .where(db.func.coalesce(DeliveryLedger.delivered_at, DeliveryLedger.claimed_at) < cutoff)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
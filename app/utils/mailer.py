@@ -0,0 +1,83 @@
+import smtplib
+import time
+from itertools import islice
+from flask import current_app
+from app import mail
+
+# Reminder-style mail goes out over one SMTP connection (and one TLS
+# handshake) per MAIL_BATCH_SIZE messages instead of one per message.
+# Connection failures retry the unsent rest of the batch on a fresh
+# connection with exponential backoff; a message the server rejects, or
+# one that cannot be built (bad header, no recipients), fails on its own.
+
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError)
+
+def _is_connection_error(error):
+    """Whether a send error concerns the connection rather than the message
+    
+    smtplib errors are OSErrors too, so the server's per-message rejections
+    are excluded explicitly.
+    """
+    return isinstance(error, OSError) and not isinstance(error, MESSAGE_ERRORS)
+
+def _batches(items, size):
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def render_email(template_name, **context):
+    """Render an email template from app/templates
+    
+    Templates are autoescaped and compiled once per process. Rendering costs
+    about the same as the f-string loops they replaced (see
+    benchmarks/report_benchmark.py); the gain is escaping, not speed.
+    """
+    template = current_app.jinja_env.get_template(template_name)
+    return ''.join(template.generate(**context))
+
+def send_batched(messages, on_batch=None):
+    """Send (key, Message) pairs in batches over reused SMTP connections
+    
+    messages may be any iterable, so callers can build them lazily. If given,
+    on_batch is called with the keys sent after each batch. Returns
+    (sent, failed) lists of keys.
+    """
+    config = current_app.config
+    sent, failed = [], []
+    
+    for batch in _batches(messages, config['MAIL_BATCH_SIZE']):
+        position = 0
+        batch_start = len(sent)
+        for attempt in range(config['MAIL_BATCH_RETRIES'] + 1):
+            if attempt:
+                time.sleep(config['MAIL_RETRY_DELAY'] * 2 ** (attempt - 1))
+            try:
+                with mail.connect() as connection:
+                    while position < len(batch):
+                        key, message = batch[position]
+                        try:
+                            connection.send(message)
+                            sent.append(key)
+                        except Exception as e:
+                            if _is_connection_error(e):
+                                raise
+                            current_app.logger.error(f"Failed to send message {key}: {str(e)}")
+                            failed.append(key)
+                        position += 1
+                break
+            except Exception as e:
+                if position == len(batch):
+                    break  # everything went out; only closing the connection failed
+                current_app.logger.warning(f"SMTP batch error (attempt {attempt + 1}): {str(e)}")
+        
+        for key, _ in batch[position:]:
+            current_app.logger.error(f"Failed to send message {key}: SMTP retries exhausted")
+            failed.append(key)
+        
+        if on_batch is not None and len(sent) > batch_start:
+            on_batch(sent[batch_start:])
+    
+    return sent, failed
@@ -0,0 +1,112 @@
+import base64
+import json
+from datetime import date, datetime, time
+from flask import current_app, request
+from app import db
+
+def page_size():
+    """Resolve requested page size, capped by PAGE_SIZE_MAX"""
+    limit = request.args.get('limit', type=int) or current_app.config['PAGE_SIZE_DEFAULT']
+    return max(1, min(limit, current_app.config['PAGE_SIZE_MAX']))
+
+def _to_json(value):
+    if isinstance(value, (date, time, datetime)):
+        return value.isoformat()
+    return value
+
+def _from_json(column, value):
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if value is not None and python_type in (date, time, datetime):
+        return python_type.fromisoformat(value)
+    return value
+
+def encode_cursor(values):
+    """Encode keyset values as an opaque cursor token"""
+    payload = json.dumps([_to_json(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def _decode_values(token, count):
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(values, list) or len(values) != count:
+            raise ValueError
+        return values
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+def decode_cursor(token, keys):
+    """Decode a cursor token back into keyset values"""
+    values = _decode_values(token, len(keys))
+    try:
+        return [_from_json(key, value) for key, value in zip(keys, values)]
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+
+def _after(keys, values, descending):
+    """Row-value comparison (k1, k2, ...) > (v1, v2, ...) expanded for portability"""
+    key, value = keys[0], values[0]
+    past = key < value if descending else key > value
+    if len(keys) == 1:
+        return past
+    return db.or_(past, db.and_(key == value, _after(keys[1:], values[1:], descending)))
+
+def paginate(query, keys, descending=False):
+    """Fetch one keyset page of query ordered by keys.
+    
+    The last key must be unique (normally the primary key). Rows must expose
+    each key by its attribute name. Returns (rows, next_cursor); next_cursor
+    is None on the last page. Raises ValueError for a malformed cursor.
+    """
+    limit = page_size()
+    cursor = request.args.get('cursor')
+    
+    if cursor:
+        query = query.filter(_after(keys, decode_cursor(cursor, keys), descending))
+    
+    ordering = [key.desc() if descending else key.asc() for key in keys]
+    rows = query.order_by(*ordering).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor([getattr(rows[-1], key.key) for key in keys])
+    
+    return rows, next_cursor
+
+def paginate_ranked(query, keys):
+    """Fetch one keyset page of an entity query ordered by computed keys.
+    
+    keys are numeric expressions, lowest first, ending with a unique key
+    (e.g. a relevance score, then the primary key). Unlike paginate they
+    need not be attributes of the entity: they are selected alongside it
+    and the cursor carries the last row's values. Returns (entities,
+    next_cursor) like paginate. Raises ValueError for a malformed cursor.
+    """
+    limit = page_size()
+    cursor = request.args.get('cursor')
+    
+    if cursor:
+        values = _decode_values(cursor, len(keys))
+        if not all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in values):
+            raise ValueError('Invalid cursor')
+        query = query.filter(_after(keys, values, False))
+    
+    rows = query.add_columns(*keys).order_by(*keys).limit(limit + 1).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(list(rows[-1][1:]))
+    
+    return [row[0] for row in rows], next_cursor
+
+def page_response(items, next_cursor):
+    """Build the JSON body for a paginated listing"""
+    return {
+        'items': items,
+        'next_cursor': next_cursor
+    }
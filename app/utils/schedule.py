@@ -0,0 +1,334 @@
+from datetime import date, datetime, timedelta
+from app import db
+from app.models import Doctor, DoctorAvailability, DoctorDaySlots, ScheduleTemplate
+from app.utils.slots import refresh_days, slot_minutes as grid_minutes
+from app.utils.directory import invalidate_doctor_availability
+from app.utils.slot_index import index_days
+
+# Recurring availability: a weekday pattern over a date range expands into
+# availability ranges that are conflict-checked against the doctor's existing
+# ranges with one query and written with a single executemany INSERT.
+# Schedule templates store a doctor's weekly windows; the extend_availability
+# beat task rolls them forward to a fixed horizon, remembering per window how
+# far it has generated so ranges a doctor removes are not recreated.
+
+MAX_SCHEDULE_DAYS = 366
+
+class ScheduleError(ValueError):
+    """Raised for a malformed recurring schedule"""
+
+def _parse_date(value, field):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').date()
+    except (TypeError, ValueError):
+        raise ScheduleError(f'{field} must be YYYY-MM-DD')
+
+def _parse_time(value, field):
+    try:
+        return datetime.strptime(value, '%H:%M').time()
+    except (TypeError, ValueError):
+        raise ScheduleError(f'{field} must be HH:MM')
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def _object(value, field):
+    if not isinstance(value, dict):
+        raise ScheduleError(f'{field} must be an object')
+    return value
+
+def _list(value, field):
+    if not isinstance(value, list):
+        raise ScheduleError(f'{field} must be a list')
+    return value
+
+def _minutes(t):
+    return t.hour * 60 + t.minute
+
+def _check_overlap(windows):
+    windows.sort()
+    for (_, previous_end), (next_start, _) in zip(windows, windows[1:]):
+        if next_start < previous_end:
+            raise ScheduleError('Windows must not overlap')
+
+def _parse_slot_minutes(value):
+    # Ranges off the AVAILABILITY_SLOT_MINUTES grid would lose the bitmap
+    # slots they only partly cover
+    if value is None:
+        return None
+    if not _is_int(value) or value <= 0:
+        raise ScheduleError('slot_minutes must be a positive integer')
+    if value % grid_minutes():
+        raise ScheduleError(f'slot_minutes must be a multiple of {grid_minutes()}')
+    return value
+
+def _check_aligned(start_time, slot_minutes):
+    if slot_minutes is not None and _minutes(start_time) % grid_minutes():
+        raise ScheduleError(f'Windows split into slots must start on {grid_minutes()}-minute boundaries')
+
+def parse_schedule(data):
+    """Validate a recurring schedule request body into expand_schedule arguments"""
+    _object(data, 'Request body')
+    for field in ('start_date', 'end_date', 'weekdays', 'windows'):
+        if field not in data:
+            raise ScheduleError(f'{field} is required')
+    
+    start_date = _parse_date(data['start_date'], 'start_date')
+    end_date = _parse_date(data['end_date'], 'end_date')
+    if end_date < start_date:
+        raise ScheduleError('end_date must not be before start_date')
+    if (end_date - start_date).days >= MAX_SCHEDULE_DAYS:
+        raise ScheduleError(f'A schedule may span at most {MAX_SCHEDULE_DAYS} days')
+    
+    weekdays = data['weekdays']
+    if not isinstance(weekdays, list) or not weekdays or not all(_is_int(d) and 0 <= d <= 6 for d in weekdays):
+        raise ScheduleError('weekdays must be a list of 0 (Monday) to 6 (Sunday)')
+    
+    slot_minutes = _parse_slot_minutes(data.get('slot_minutes'))
+    
+    windows = []
+    for window in _list(data['windows'], 'windows'):
+        window = _object(window, 'Each window')
+        start_time = _parse_time(window.get('start_time'), 'start_time')
+        end_time = _parse_time(window.get('end_time'), 'end_time')
+        if end_time <= start_time:
+            raise ScheduleError('Each window must end after it starts')
+        _check_aligned(start_time, slot_minutes)
+        windows.append((start_time, end_time))
+    if not windows:
+        raise ScheduleError('windows must not be empty')
+    
+    _check_overlap(windows)
+    
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'weekdays': set(weekdays),
+        'windows': windows,
+        'slot_minutes': slot_minutes,
+        'exclude_dates': {_parse_date(d, 'exclude_dates') for d in _list(data.get('exclude_dates', []), 'exclude_dates')}
+    }
+
+def expand_schedule(start_date, end_date, weekdays, windows, slot_minutes=None, exclude_dates=()):
+    """(date, start_time, end_time) ranges for every matching day
+    
+    Each window becomes one range, or consecutive slot_minutes ranges when
+    slot_minutes is given (a trailing partial slot is dropped).
+    """
+    ranges = []
+    day = start_date
+    while day <= end_date:
+        if day.weekday() in weekdays and day not in exclude_dates:
+            for start_time, end_time in windows:
+                if slot_minutes is None:
+                    ranges.append((day, start_time, end_time))
+                    continue
+                start = datetime.combine(day, start_time)
+                end = datetime.combine(day, end_time)
+                step = timedelta(minutes=slot_minutes)
+                while start + step <= end:
+                    ranges.append((day, start.time(), (start + step).time()))
+                    start += step
+        day += timedelta(days=1)
+    return ranges
+
+def find_conflicts(doctor_id, ranges):
+    """Ranges overlapping the doctor's existing availability, from one query"""
+    if not ranges:
+        return []
+    
+    existing = {}
+    days = [day for day, _, _ in ranges]
+    rows = db.session.query(
+        DoctorAvailability.date, DoctorAvailability.start_time, DoctorAvailability.end_time
+    ).filter(
+        DoctorAvailability.doctor_id == doctor_id,
+        DoctorAvailability.date.between(min(days), max(days))
+    )
+    for day, start_time, end_time in rows:
+        existing.setdefault(day, []).append((_minutes(start_time), _minutes(end_time)))
+    
+    return [
+        (day, start_time, end_time) for day, start_time, end_time in ranges
+        if any(
+            _minutes(start_time) < taken_end and taken_start < _minutes(end_time)
+            for taken_start, taken_end in existing.get(day, ())
+        )
+    ]
+
+def add_ranges(doctor_id, ranges, skip_conflicts=False):
+    """Insert availability ranges for a doctor and refresh their day bitmaps
+    
+    Returns (created, conflicts). Unless skip_conflicts is set nothing is
+    written when any range overlaps existing availability. The caller commits.
+    """
+    conflicts = find_conflicts(doctor_id, ranges)
+    if conflicts and not skip_conflicts:
+        return [], conflicts
+    
+    taken = set(conflicts)
+    created = [r for r in ranges if r not in taken]
+    if created:
+        db.session.execute(db.insert(DoctorAvailability), [{
+            'doctor_id': doctor_id,
+            'date': day,
+            'start_time': start_time,
+            'end_time': end_time,
+            'is_booked': False
+        } for day, start_time, end_time in created])
+        refresh_days(doctor_id, {day for day, _, _ in created})
+    
+    return created, conflicts
+
+def add_recurring_availability(doctor_id, schedule, skip_conflicts=False):
+    """Insert a parsed schedule's ranges for a doctor (see add_ranges)"""
+    return add_ranges(doctor_id, expand_schedule(**schedule), skip_conflicts)
+
+def add_bulk_availability(doctor_id, data):
+    """Apply a bulk availability request body for a doctor; returns (response body, status)
+    
+    Shared by the doctor and admin bulk endpoints. Commits the new ranges,
+    then drops the doctor's cached availability and re-indexes their days.
+    """
+    try:
+        schedule = parse_schedule(data)
+    except ScheduleError as e:
+        return {'error': str(e)}, 400
+    
+    skip_conflicts = bool(data.get('skip_conflicts'))
+    created, conflicts = add_recurring_availability(doctor_id, schedule, skip_conflicts)
+    if conflicts and not skip_conflicts:
+        db.session.rollback()
+        return {
+            'error': 'Schedule overlaps existing availability',
+            'conflicts': [serialize_range(r) for r in conflicts]
+        }, 400
+    
+    db.session.commit()
+    days = {day for day, _, _ in created}
+    if days:
+        invalidate_doctor_availability(doctor_id)
+        index_days(doctor_id, days)
+    
+    return {
+        'message': 'Availability added successfully',
+        'created': len(created),
+        'skipped': len(conflicts)
+    }, 201
+
+def parse_template(data):
+    """Validate a schedule template request body into ScheduleTemplate column values"""
+    _object(data, 'Request body')
+    if 'windows' not in data:
+        raise ScheduleError('windows is required')
+    
+    windows = []
+    by_weekday = {}
+    for window in _list(data['windows'], 'windows'):
+        window = _object(window, 'Each window')
+        weekday = window.get('weekday')
+        if not _is_int(weekday) or not 0 <= weekday <= 6:
+            raise ScheduleError('weekday must be 0 (Monday) to 6 (Sunday)')
+        start_time = _parse_time(window.get('start_time'), 'start_time')
+        end_time = _parse_time(window.get('end_time'), 'end_time')
+        if end_time <= start_time:
+            raise ScheduleError('Each window must end after it starts')
+        slot_minutes = _parse_slot_minutes(window.get('slot_minutes'))
+        _check_aligned(start_time, slot_minutes)
+        windows.append({
+            'weekday': weekday,
+            'start_time': start_time,
+            'end_time': end_time,
+            'slot_minutes': slot_minutes
+        })
+        by_weekday.setdefault(weekday, []).append((start_time, end_time))
+    
+    for weekday_windows in by_weekday.values():
+        _check_overlap(weekday_windows)
+    return windows
+
+def replace_template(doctor_id, windows):
+    """Replace a doctor's schedule template; the caller commits"""
+    db.session.execute(db.delete(ScheduleTemplate).where(ScheduleTemplate.doctor_id == doctor_id))
+    if windows:
+        db.session.execute(db.insert(ScheduleTemplate), [
+            {'doctor_id': doctor_id, **window} for window in windows
+        ])
+
+def serialize_template(template):
+    return {
+        'weekday': template.weekday,
+        'start_time': template.start_time.isoformat(),
+        'end_time': template.end_time.isoformat(),
+        'slot_minutes': template.slot_minutes,
+        'generated_until': template.generated_until.isoformat() if template.generated_until else None
+    }
+
+def extend_schedules(horizon_end, doctor_id=None):
+    """Generate availability from schedule templates up to horizon_end
+    
+    Each template window continues from the day after its generated_until
+    (or today); ranges overlapping existing availability are skipped.
+    Returns the days added per doctor. The caller commits.
+    """
+    today = date.today()
+    templates = ScheduleTemplate.query.join(
+        Doctor, Doctor.id == ScheduleTemplate.doctor_id
+    ).filter(Doctor.is_available == True)
+    if doctor_id is not None:
+        templates = templates.filter(ScheduleTemplate.doctor_id == doctor_id)
+    templates = templates.all()
+    
+    by_doctor = {}
+    for template in templates:
+        start = today
+        if template.generated_until is not None:
+            start = max(today, template.generated_until + timedelta(days=1))
+        by_doctor.setdefault(template.doctor_id, []).extend(expand_schedule(
+            start, horizon_end, {template.weekday},
+            [(template.start_time, template.end_time)], template.slot_minutes
+        ))
+    
+    extended = {}
+    for template_doctor_id, ranges in by_doctor.items():
+        created, _ = add_ranges(template_doctor_id, sorted(ranges), skip_conflicts=True)
+        if created:
+            extended[template_doctor_id] = {day for day, _, _ in created}
+    
+    if templates:
+        db.session.execute(
+            db.update(ScheduleTemplate)
+            .where(
+                ScheduleTemplate.id.in_([template.id for template in templates]),
+                db.or_(ScheduleTemplate.generated_until == None, ScheduleTemplate.generated_until < horizon_end)
+            )
+            .values(generated_until=horizon_end)
+            .execution_options(synchronize_session=False)
+        )
+    return extended
+
+def prune_past_availability(before):
+    """Bulk-delete unbooked availability ranges and day bitmaps dated before a day
+    
+    Booked ranges are kept with their appointments' history. Returns the
+    number of ranges removed. The caller commits.
+    """
+    result = db.session.execute(
+        db.delete(DoctorAvailability)
+        .where(DoctorAvailability.date < before, DoctorAvailability.is_booked == False)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.execute(
+        db.delete(DoctorDaySlots)
+        .where(DoctorDaySlots.date < before)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+def serialize_range(availability_range):
+    day, start_time, end_time = availability_range
+    return {
+        'date': day.isoformat(),
+        'start_time': start_time.isoformat(),
+        'end_time': end_time.isoformat()
+    }
@@ -0,0 +1,230 @@
+import re
+from flask import current_app
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import contains_eager
+from app import db
+from app.models import Doctor, Patient, Specialization, User
+
+# Admin search over patients (name, contact number, email) and doctors
+# (name, specialization). Every backend has the same semantics: each word
+# of the query must occur as a substring of some field. On SQLite the
+# fields are mirrored into FTS5 tables with the trigram tokenizer, keyed by
+# the source row id and kept in sync by triggers, so every write path (ORM,
+# bulk inserts, raw SQL) updates the index; matches are ranked by bm25.
+# Trigram matching needs at least three characters, so shorter words are
+# checked with ILIKE on the matched rows. On PostgreSQL pg_trgm GIN indexes
+# serve the ILIKE filters, ranked by trigram similarity. Anything else, or
+# a database where neither can be set up, falls back to ILIKE scans.
+#
+# Scoring has to visit every match, so only queries with at most
+# SEARCH_RANK_LIMIT matches are ranked; a query as common as a first name
+# lists its matches in id order, which the index serves a page at a time.
+# Either way results page with a keyset cursor over (rank, id) or (id).
+
+FTS5 = 'fts5'
+TRIGRAM = 'trigram'
+LIKE = 'like'
+
+MIN_TRIGRAM_TERM = 3
+
+_FTS5_TABLES = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS patient_search USING fts5(
+        full_name, contact_number, email, tokenize = 'trigram'
+    )""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS doctor_search USING fts5(
+        full_name, specialization, tokenize = 'trigram'
+    )""",
+]
+
+_PATIENT_ROW = """SELECT p.id, p.full_name, p.contact_number, u.email
+    FROM patients p JOIN users u ON u.id = p.user_id"""
+
+_DOCTOR_ROW = """SELECT d.id, d.full_name, s.name
+    FROM doctors d JOIN specializations s ON s.id = d.specialization_id"""
+
+_FTS5_TRIGGERS = [
+    f"""CREATE TRIGGER IF NOT EXISTS patient_search_insert AFTER INSERT ON patients BEGIN
+        INSERT INTO patient_search(rowid, full_name, contact_number, email)
+        {_PATIENT_ROW} WHERE p.id = NEW.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS patient_search_update
+    AFTER UPDATE OF full_name, contact_number, user_id ON patients BEGIN
+        DELETE FROM patient_search WHERE rowid = OLD.id;
+        INSERT INTO patient_search(rowid, full_name, contact_number, email)
+        {_PATIENT_ROW} WHERE p.id = NEW.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS patient_search_delete AFTER DELETE ON patients BEGIN
+        DELETE FROM patient_search WHERE rowid = OLD.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS patient_search_email AFTER UPDATE OF email ON users BEGIN
+        DELETE FROM patient_search WHERE rowid IN (SELECT id FROM patients WHERE user_id = NEW.id);
+        INSERT INTO patient_search(rowid, full_name, contact_number, email)
+        {_PATIENT_ROW} WHERE p.user_id = NEW.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS doctor_search_insert AFTER INSERT ON doctors BEGIN
+        INSERT INTO doctor_search(rowid, full_name, specialization)
+        {_DOCTOR_ROW} WHERE d.id = NEW.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS doctor_search_update
+    AFTER UPDATE OF full_name, specialization_id ON doctors BEGIN
+        DELETE FROM doctor_search WHERE rowid = OLD.id;
+        INSERT INTO doctor_search(rowid, full_name, specialization)
+        {_DOCTOR_ROW} WHERE d.id = NEW.id;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS doctor_search_delete AFTER DELETE ON doctors BEGIN
+        DELETE FROM doctor_search WHERE rowid = OLD.id;
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS doctor_search_specialization AFTER UPDATE OF name ON specializations BEGIN
+        DELETE FROM doctor_search WHERE rowid IN (SELECT id FROM doctors WHERE specialization_id = NEW.id);
+        INSERT INTO doctor_search(rowid, full_name, specialization)
+        {_DOCTOR_ROW} WHERE d.specialization_id = NEW.id;
+    END""",
+]
+
+_TRIGRAM_INDEXES = [
+    ('ix_patients_full_name_trgm', 'patients', 'full_name'),
+    ('ix_patients_contact_number_trgm', 'patients', 'contact_number'),
+    ('ix_users_email_trgm', 'users', 'email'),
+    ('ix_doctors_full_name_trgm', 'doctors', 'full_name'),
+    ('ix_specializations_name_trgm', 'specializations', 'name'),
+]
+
+# Column sets of the FTS5 tables; a separate MetaData keeps them out of create_all
+_fts_metadata = db.MetaData()
+patient_search = db.Table(
+    'patient_search', _fts_metadata,
+    db.Column('rowid', db.Integer), db.Column('rank', db.Float)
+)
+doctor_search = db.Table(
+    'doctor_search', _fts_metadata,
+    db.Column('rowid', db.Integer), db.Column('rank', db.Float)
+)
+
+def backend():
+    """Search backend set up for this app's database"""
+    return current_app.extensions.get('search_backend', LIKE)
+
+def _create_fts5(connection):
+    existing = dict(connection.exec_driver_sql(
+        "SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name IN ('patient_search', 'doctor_search')"
+    ).all())
+    # Tables built with an earlier tokenizer are dropped and rebuilt
+    stale = [name for name, sql in existing.items() if 'trigram' not in sql]
+    for name in stale:
+        connection.exec_driver_sql(f"DROP TABLE {name}")
+    for statement in _FTS5_TABLES + _FTS5_TRIGGERS:
+        connection.exec_driver_sql(statement)
+    if len(existing) < 2 or stale:
+        connection.exec_driver_sql("DELETE FROM patient_search")
+        connection.exec_driver_sql("DELETE FROM doctor_search")
+        _fill_fts5(connection)
+
+def _fill_fts5(connection):
+    connection.exec_driver_sql(f"INSERT INTO patient_search(rowid, full_name, contact_number, email) {_PATIENT_ROW}")
+    connection.exec_driver_sql(f"INSERT INTO doctor_search(rowid, full_name, specialization) {_DOCTOR_ROW}")
+
+def _create_trigram(connection):
+    connection.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    for name, table, column in _TRIGRAM_INDEXES:
+        connection.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({column} gin_trgm_ops)")
+
+def ensure_search_index():
+    """Set up the search index for the database, backfilling it on first use"""
+    dialect = db.engine.dialect.name
+    setup = {'sqlite': (FTS5, _create_fts5), 'postgresql': (TRIGRAM, _create_trigram)}.get(dialect)
+    selected = LIKE
+    
+    if setup is not None:
+        try:
+            with db.engine.begin() as connection:
+                setup[1](connection)
+            selected = setup[0]
+        except DBAPIError as e:
+            print(f"✗ Search index unavailable, falling back to ILIKE: {e.orig}")
+    
+    current_app.extensions['search_backend'] = selected
+
+def rebuild_search_index():
+    """Repopulate the FTS5 search tables from the source tables"""
+    if backend() != FTS5:
+        return
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql("DELETE FROM patient_search")
+        connection.exec_driver_sql("DELETE FROM doctor_search")
+        _fill_fts5(connection)
+
+def _terms(text):
+    return re.findall(r'\w+', text)
+
+def _contains(column, term):
+    """Case-insensitive substring match (served by a trigram index on PostgreSQL)"""
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return column.ilike(f'%{escaped}%', escape='\\')
+
+def _all_terms(terms, columns):
+    """Every term occurs in at least one of columns"""
+    return db.and_(*(db.or_(*(_contains(column, term) for column in columns)) for term in terms))
+
+def _fts_match(table, terms):
+    """FTS5 criterion: every term occurs as a substring"""
+    expression = ' '.join(f'"{term}"' for term in terms)
+    return db.text(f'{table.name} MATCH :terms').bindparams(terms=expression)
+
+def _too_many_to_rank(select):
+    """Whether select returns more than SEARCH_RANK_LIMIT rows, reading at most one more"""
+    limit = current_app.config['SEARCH_RANK_LIMIT']
+    return len(db.session.execute(select.limit(limit + 1)).all()) > limit
+
+def _ranked(query, text, terms, table, key, columns):
+    """Filter query to rows matching every term; returns (query, order keys)
+    
+    The keys (lowest first) rank the best match first, or are just key
+    when there are too many matches to rank.
+    """
+    long_terms = [term for term in terms if len(term) >= MIN_TRIGRAM_TERM]
+    
+    if backend() == FTS5 and long_terms:
+        match = _fts_match(table, long_terms)
+        short_terms = [term for term in terms if len(term) < MIN_TRIGRAM_TERM]
+        if short_terms:
+            query = query.filter(_all_terms(short_terms, columns))
+        
+        if _too_many_to_rank(db.select(table.c.rowid).where(match)):
+            # Walk the index in rowid (= key) order so a page stops after limit matches
+            matches = db.select(table.c.rowid.label('id')).where(match).subquery()
+            return query.join(matches, matches.c.id == key), [matches.c.id]
+        
+        matches = db.select(table.c.rowid.label('id'), table.c.rank).where(match).subquery()
+        return query.join(matches, matches.c.id == key), [matches.c.rank, key]
+    
+    query = query.filter(_all_terms(terms, columns))
+    if backend() == TRIGRAM and not _too_many_to_rank(query.with_entities(key)):
+        similarity = db.func.greatest(
+            *(db.func.similarity(db.func.coalesce(column, ''), text) for column in columns)
+        )
+        return query, [-similarity, key]
+    return query, [key]
+
+def search_patients(text):
+    """(query, order keys) for patients (with user eager-loaded) matching text; None if text has no terms"""
+    terms = _terms(text)
+    if not terms:
+        return None
+    query = Patient.query.join(User, User.id == Patient.user_id).options(contains_eager(Patient.user))
+    return _ranked(
+        query, text, terms, patient_search, Patient.id,
+        [Patient.full_name, Patient.contact_number, User.email]
+    )
+
+def search_doctors(text):
+    """(query, order keys) for doctors (with specialization eager-loaded) matching text; None if text has no terms"""
+    terms = _terms(text)
+    if not terms:
+        return None
+    query = Doctor.query.join(Specialization, Specialization.id == Doctor.specialization_id).options(
+        contains_eager(Doctor.specialization)
+    )
+    return _ranked(
+        query, text, terms, doctor_search, Doctor.id,
+        [Doctor.full_name, Specialization.name]
+    )
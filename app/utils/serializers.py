@@ -0,0 +1,117 @@
+from app import db
+from app.models import Appointment, Patient, Doctor, Specialization, Treatment
+
+def appointment_listing(*criteria):
+    """Build a flat appointment listing query.
+
+    Patient, doctor, specialization and treatment columns are projected in a
+    single joined SELECT so serializing a listing never triggers lazy loads.
+    """
+    return db.session.query(
+        Appointment.id,
+        Appointment.patient_id,
+        Appointment.doctor_id,
+        Appointment.appointment_date,
+        Appointment.appointment_time,
+        Appointment.status,
+        Appointment.reason,
+        Patient.full_name.label('patient_name'),
+        Patient.contact_number.label('patient_contact'),
+        Doctor.full_name.label('doctor_name'),
+        Specialization.name.label('specialization'),
+        Treatment.id.label('treatment_id'),
+        Treatment.diagnosis,
+        Treatment.prescription,
+        Treatment.notes,
+        Treatment.next_visit_date
+    ).join(
+        Patient, Patient.id == Appointment.patient_id
+    ).join(
+        Doctor, Doctor.id == Appointment.doctor_id
+    ).join(
+        Specialization, Specialization.id == Doctor.specialization_id
+    ).outerjoin(
+        Treatment, Treatment.appointment_id == Appointment.id
+    ).filter(*criteria)
+
+def admin_patient(patient):
+    """Serialize a patient (with user eager-loaded) for the admin patients view"""
+    return {
+        'id': patient.id,
+        'user_id': patient.user_id,
+        'full_name': patient.full_name,
+        'email': patient.user.email,
+        'contact_number': patient.contact_number,
+        'date_of_birth': patient.date_of_birth.isoformat() if patient.date_of_birth else None,
+        'gender': patient.gender,
+        'is_active': patient.user.is_active
+    }
+
+def _treatment(row, include_next_visit=True):
+    """Serialize the treatment columns of a listing row"""
+    treatment = {
+        'diagnosis': row.diagnosis,
+        'prescription': row.prescription,
+        'notes': row.notes
+    }
+    if include_next_visit:
+        treatment['next_visit_date'] = row.next_visit_date.isoformat() if row.next_visit_date else None
+    return treatment
+
+def admin_appointment(row):
+    """Serialize a listing row for the admin appointments view"""
+    return {
+        'id': row.id,
+        'patient_name': row.patient_name,
+        'doctor_name': row.doctor_name,
+        'specialization': row.specialization,
+        'appointment_date': row.appointment_date.isoformat(),
+        'appointment_time': row.appointment_time.isoformat(),
+        'status': row.status,
+        'reason': row.reason
+    }
+
+def doctor_appointment(row):
+    """Serialize a listing row for the doctor appointments view"""
+    apt_data = {
+        'id': row.id,
+        'patient_id': row.patient_id,
+        'patient_name': row.patient_name,
+        'patient_contact': row.patient_contact,
+        'appointment_date': row.appointment_date.isoformat(),
+        'appointment_time': row.appointment_time.isoformat(),
+        'status': row.status,
+        'reason': row.reason
+    }
+
+    if row.treatment_id is not None:
+        apt_data['treatment'] = _treatment(row, include_next_visit=False)
+
+    return apt_data
+
+def patient_appointment(row):
+    """Serialize a listing row for the patient appointments view"""
+    apt_data = {
+        'id': row.id,
+        'doctor_name': row.doctor_name,
+        'specialization': row.specialization,
+        'appointment_date': row.appointment_date.isoformat(),
+        'appointment_time': row.appointment_time.isoformat(),
+        'status': row.status,
+        'reason': row.reason
+    }
+
+    if row.treatment_id is not None:
+        apt_data['treatment'] = _treatment(row)
+
+    return apt_data
+
+def treatment_history_entry(row):
+    """Serialize a listing row for the patient treatment history view"""
+    return {
+        'appointment_id': row.id,
+        'doctor_name': row.doctor_name,
+        'specialization': row.specialization,
+        'appointment_date': row.appointment_date.isoformat(),
+        **_treatment(row)
+    }
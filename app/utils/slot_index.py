@@ -0,0 +1,206 @@
+import uuid
+from datetime import datetime, timedelta
+from flask import current_app
+from redis import WatchError
+from app import db, redis_client
+from app.models import Doctor, DoctorDaySlots
+from app.utils.directory import doctor_directory
+from app.utils.slots import (
+    MINUTES_PER_DAY, DayBitmap, slot_minutes, slot_index, first_free_slots, _serialize_slot
+)
+
+# Precomputed free-slot index: one Redis sorted set per specialization whose
+# members are "doctor_id:date:slot" scored by the slot's start in minutes, so
+# the earliest free slots across every doctor of a specialization are a single
+# ZRANGEBYSCORE. Bookings remove one member, cancellations and availability
+# edits re-index the affected doctor-days, and admin changes to a doctor mark
+# the specialization for a full rebuild. A built marker with a TTL forces a
+# periodic rebuild so the index heals from any missed update; the doctor-day
+# bitmaps remain the source of truth when booking.
+#
+# A rebuild fills a staging key and renames it over the live index. Every
+# incremental update bumps the specialization's version key, which the
+# rebuild WATCHes: an update landing while the bitmaps are read aborts the
+# swap and the rebuild reruns, so it never restores a slot booked meanwhile.
+
+INDEX_PREFIX = 'slots:free:'
+BUILT_PREFIX = 'slots:built:'
+VERSION_PREFIX = 'slots:version:'
+REBUILD_BATCH_SIZE = 1000
+REBUILD_RETRIES = 3
+
+def _score(day, index, minutes):
+    return day.toordinal() * MINUTES_PER_DAY + index * minutes
+
+def _member(doctor_id, day, index):
+    return f"{doctor_id}:{day.isoformat()}:{index}"
+
+def _parse(member):
+    doctor_id, day, index = member.decode('utf-8').split(':')
+    return int(doctor_id), datetime.strptime(day, '%Y-%m-%d').date(), int(index)
+
+def _now_score():
+    now = datetime.now()
+    return now.date().toordinal() * MINUTES_PER_DAY + now.hour * 60 + now.minute
+
+def _day_members(row, minutes):
+    """Score/member mapping of a doctor-day's free slots"""
+    return {
+        _member(row.doctor_id, row.date, index): _score(row.date, index, minutes)
+        for index in DayBitmap.from_row(row).free_indexes()
+    }
+
+def mark_booked(doctor_id, day, start_time):
+    """Drop a just-booked slot from the index"""
+    try:
+        doctor = db.session.get(Doctor, doctor_id)
+        index = slot_index(start_time, slot_minutes())
+        if doctor is not None and index is not None:
+            pipe = redis_client.pipeline()
+            pipe.zrem(f"{INDEX_PREFIX}{doctor.specialization_id}", _member(doctor_id, day, index))
+            pipe.incr(f"{VERSION_PREFIX}{doctor.specialization_id}")
+            pipe.execute()
+    except Exception as e:
+        current_app.logger.error(f"Slot index update error: {e}")
+
+def index_days(doctor_id, days):
+    """Re-index a doctor's free slots on the given days from their committed bitmaps"""
+    try:
+        doctor = db.session.get(Doctor, doctor_id)
+        if doctor is None:
+            return
+        minutes = slot_minutes()
+        key = f"{INDEX_PREFIX}{doctor.specialization_id}"
+        rows = DoctorDaySlots.query.filter(
+            DoctorDaySlots.doctor_id == doctor_id,
+            DoctorDaySlots.date.in_(set(days))
+        ).all() if doctor.is_available else []
+        
+        pipe = redis_client.pipeline()
+        for day in set(days):
+            pipe.zrem(key, *[_member(doctor_id, day, i) for i in range(MINUTES_PER_DAY // minutes)])
+        for row in rows:
+            members = _day_members(row, minutes)
+            if members:
+                pipe.zadd(key, members)
+        pipe.incr(f"{VERSION_PREFIX}{doctor.specialization_id}")
+        pipe.execute()
+    except Exception as e:
+        current_app.logger.error(f"Slot index update error: {e}")
+
+def invalidate_specialization_index(*specialization_ids):
+    """Force a full rebuild of the given specializations' indexes on next search"""
+    try:
+        redis_client.delete(*[f"{BUILT_PREFIX}{s}" for s in set(specialization_ids)])
+    except Exception as e:
+        current_app.logger.error(f"Slot index invalidation error: {e}")
+
+def _fill(staging, specialization_id):
+    """Write a specialization's free slots into staging; returns whether any were written"""
+    minutes = slot_minutes()
+    rows = db.session.query(DoctorDaySlots).join(
+        Doctor, Doctor.id == DoctorDaySlots.doctor_id
+    ).filter(
+        Doctor.specialization_id == specialization_id,
+        Doctor.is_available == True,
+        DoctorDaySlots.date >= datetime.now().date()
+    ).yield_per(REBUILD_BATCH_SIZE)
+    
+    filled = False
+    pipe = redis_client.pipeline(transaction=False)
+    for count, row in enumerate(rows, 1):
+        members = _day_members(row, minutes)
+        if members:
+            pipe.zadd(staging, members)
+            filled = True
+        if count % REBUILD_BATCH_SIZE == 0:
+            pipe.execute()
+    if filled:
+        # An abandoned staging key expires on its own
+        pipe.expire(staging, current_app.config['SLOT_INDEX_TIMEOUT'])
+    pipe.execute()
+    return filled
+
+def rebuild_index(specialization_id):
+    """Rebuild a specialization's index from its available doctors' upcoming bitmaps
+    
+    Raises WatchError if incremental updates keep landing for
+    REBUILD_RETRIES attempts.
+    """
+    key = f"{INDEX_PREFIX}{specialization_id}"
+    version_key = f"{VERSION_PREFIX}{specialization_id}"
+    
+    for attempt in range(1, REBUILD_RETRIES + 1):
+        staging = f"{key}:staging:{uuid.uuid4().hex}"
+        try:
+            with redis_client.pipeline() as pipe:
+                pipe.watch(version_key)
+                filled = _fill(staging, specialization_id)
+                pipe.multi()
+                if filled:
+                    pipe.rename(staging, key)
+                    pipe.persist(key)
+                else:
+                    pipe.delete(key)
+                pipe.set(f"{BUILT_PREFIX}{specialization_id}", 1, ex=current_app.config['SLOT_INDEX_TIMEOUT'])
+                pipe.execute()
+                return
+        except WatchError:
+            if attempt == REBUILD_RETRIES:
+                raise
+        finally:
+            redis_client.delete(staging)
+
+def _with_doctor(slot, doctor):
+    return {
+        **slot,
+        'doctor_name': doctor['full_name'],
+        'consultation_fee': doctor['consultation_fee']
+    }
+
+def search_free_slots(specialization_id, start_date, end_date, limit, max_fee=None):
+    """Earliest free slots across a specialization's available doctors
+    
+    Served from the sorted-set index; falls back to scanning the doctor-day
+    bitmaps in the database when Redis is unavailable.
+    """
+    minutes = slot_minutes()
+    doctors = {
+        doctor['id']: doctor for doctor in doctor_directory(specialization_id)
+        if max_fee is None or (doctor['consultation_fee'] is not None and doctor['consultation_fee'] <= max_fee)
+    }
+    if not doctors:
+        return []
+    
+    try:
+        key = f"{INDEX_PREFIX}{specialization_id}"
+        if not redis_client.exists(f"{BUILT_PREFIX}{specialization_id}"):
+            rebuild_index(specialization_id)
+        
+        now = _now_score()
+        redis_client.zremrangebyscore(key, '-inf', f'({now}')
+        low = max(now, _score(start_date, 0, minutes))
+        high = f'({_score(end_date + timedelta(days=1), 0, minutes)}'
+        
+        results = []
+        offset = 0
+        batch = max(limit * 2, 50)
+        while len(results) < limit:
+            members = redis_client.zrangebyscore(key, low, high, start=offset, num=batch)
+            if not members:
+                break
+            offset += len(members)
+            for member in members:
+                doctor_id, day, index = _parse(member)
+                if doctor_id in doctors:
+                    results.append(_with_doctor(_serialize_slot(doctor_id, day, index, minutes), doctors[doctor_id]))
+        return results[:limit]
+    
+    except Exception as e:
+        current_app.logger.error(f"Slot index read error: {e}")
+    
+    return [
+        _with_doctor(slot, doctors[slot['doctor_id']])
+        for slot in first_free_slots(specialization_id, start_date, end_date, limit, max_fee)
+        if slot['doctor_id'] in doctors
+    ]
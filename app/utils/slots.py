@@ -0,0 +1,328 @@
+import heapq
+from datetime import datetime, time
+from itertools import islice
+from flask import current_app
+from app import db
+from app.models import Doctor, DoctorAvailability, DoctorDaySlots, Appointment
+
+# Availability is expanded into fixed AVAILABILITY_SLOT_MINUTES slots. Each
+# doctor-day keeps two bitmaps (bit i = slot starting i * slot minutes after
+# midnight): open_slots from the doctor's availability ranges and
+# booked_slots from live appointments. Claims and releases are single bit
+# operations persisted with a compare-and-set on the row's version.
+
+MINUTES_PER_DAY = 24 * 60
+CLAIM_RETRIES = 5
+
+class SlotUnavailable(Exception):
+    """Raised when a slot is outside availability or already booked"""
+
+def slot_minutes():
+    return current_app.config['AVAILABILITY_SLOT_MINUTES']
+
+def slot_index(start_time, minutes):
+    """Slot number starting at start_time, or None if it is not on a slot boundary"""
+    offset = start_time.hour * 60 + start_time.minute
+    if start_time.second or start_time.microsecond or offset % minutes:
+        return None
+    return offset // minutes
+
+def slot_time(index, minutes):
+    """Start time of slot number index"""
+    offset = index * minutes
+    return time(offset // 60, offset % 60)
+
+def slot_end_time(index, minutes):
+    """End time of slot number index (23:59:59 for the last slot of the day)"""
+    offset = (index + 1) * minutes
+    if offset >= MINUTES_PER_DAY:
+        return time(23, 59, 59)
+    return time(offset // 60, offset % 60)
+
+def range_mask(start_time, end_time, minutes):
+    """Bits of every slot lying entirely within [start_time, end_time)"""
+    start = -(-(start_time.hour * 60 + start_time.minute) // minutes)
+    end = (end_time.hour * 60 + end_time.minute) // minutes
+    if end <= start:
+        return 0
+    return ((1 << (end - start)) - 1) << start
+
+def _byte_length(minutes):
+    return -(-(MINUTES_PER_DAY // minutes) // 8)
+
+class DayBitmap:
+    """In-memory open/booked slot bitmaps for one doctor-day"""
+    __slots__ = ('open', 'booked')
+    
+    def __init__(self, open_bits=0, booked_bits=0):
+        self.open = open_bits
+        self.booked = booked_bits
+    
+    @classmethod
+    def from_row(cls, row):
+        return cls(int.from_bytes(row.open_slots, 'little'), int.from_bytes(row.booked_slots, 'little'))
+    
+    @staticmethod
+    def pack(bits, minutes):
+        return bits.to_bytes(_byte_length(minutes), 'little')
+    
+    @property
+    def free(self):
+        return self.open & ~self.booked
+    
+    def is_free(self, index):
+        return bool(self.free >> index & 1)
+    
+    def claim(self, index):
+        """Book slot index if it is open and free; returns whether it was claimed"""
+        if not self.is_free(index):
+            return False
+        self.booked |= 1 << index
+        return True
+    
+    def release(self, index):
+        self.booked &= ~(1 << index)
+    
+    def has_booking(self, mask):
+        return bool(self.booked & mask)
+    
+    def free_indexes(self, first=0):
+        """Yield free slot numbers >= first in ascending order"""
+        bits = self.free >> first << first
+        while bits:
+            low = bits & -bits
+            yield low.bit_length() - 1
+            bits ^= low
+
+def _select_day(doctor_id, day):
+    # Core select so a retry always sees the committed row, not the identity map
+    return db.session.execute(
+        db.select(
+            DoctorDaySlots.id, DoctorDaySlots.open_slots,
+            DoctorDaySlots.booked_slots, DoctorDaySlots.version
+        ).where(DoctorDaySlots.doctor_id == doctor_id, DoctorDaySlots.date == day)
+    ).first()
+
+def _update_booked(doctor_id, day, index, claim):
+    """Set or clear one booked bit with compare-and-set; returns the new bitmap"""
+    minutes = slot_minutes()
+    
+    for _ in range(CLAIM_RETRIES):
+        row = _select_day(doctor_id, day)
+        if row is None:
+            return None
+        
+        bitmap = DayBitmap.from_row(row)
+        if claim:
+            if not bitmap.claim(index):
+                return None
+        else:
+            bitmap.release(index)
+        
+        result = db.session.execute(
+            db.update(DoctorDaySlots)
+            .where(DoctorDaySlots.id == row.id, DoctorDaySlots.version == row.version)
+            .values(booked_slots=DayBitmap.pack(bitmap.booked, minutes), version=row.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 1:
+            return bitmap
+    
+    raise SlotUnavailable('This time slot is busy, please try again')
+
+def claim_slot(doctor_id, day, start_time):
+    """Mark a slot booked within the current transaction; raises SlotUnavailable"""
+    index = slot_index(start_time, slot_minutes())
+    if index is None:
+        raise SlotUnavailable(f'Appointments start on {slot_minutes()}-minute boundaries')
+    
+    bitmap = _update_booked(doctor_id, day, index, claim=True)
+    if bitmap is None:
+        raise SlotUnavailable('This time slot is not available')
+    return bitmap
+
+def release_slot(doctor_id, day, start_time):
+    """Clear a slot's booking within the current transaction"""
+    index = slot_index(start_time, slot_minutes())
+    if index is None:
+        return None
+    
+    bitmap = _update_booked(doctor_id, day, index, claim=False)
+    if bitmap is not None:
+        sync_range_flags(doctor_id, day, bitmap)
+    return bitmap
+
+def sync_range_flags(doctor_id, day, bitmap):
+    """Set DoctorAvailability.is_booked for each range of the day from the booked bitmap"""
+    minutes = slot_minutes()
+    ranges = DoctorAvailability.query.filter_by(doctor_id=doctor_id, date=day).all()
+    for availability in ranges:
+        availability.is_booked = bitmap.has_booking(
+            range_mask(availability.start_time, availability.end_time, minutes)
+        )
+
+def refresh_days(doctor_id, days):
+    """Recompute open bitmaps for a doctor's days from their availability ranges
+    
+    Booked bits are left alone; rows are created for days that have none,
+    seeded from any live appointments on those days.
+    """
+    days = set(days)
+    if not days:
+        return
+    minutes = slot_minutes()
+    
+    open_bits = dict.fromkeys(days, 0)
+    ranges = DoctorAvailability.query.filter(
+        DoctorAvailability.doctor_id == doctor_id,
+        DoctorAvailability.date.in_(days)
+    ).all()
+    for availability in ranges:
+        open_bits[availability.date] |= range_mask(availability.start_time, availability.end_time, minutes)
+    
+    existing = {
+        row.date: row for row in db.session.execute(
+            db.select(DoctorDaySlots.id, DoctorDaySlots.date, DoctorDaySlots.booked_slots)
+            .where(DoctorDaySlots.doctor_id == doctor_id, DoctorDaySlots.date.in_(days))
+        )
+    }
+    
+    missing = [day for day in days if day not in existing]
+    booked_bits = _booked_bits(doctor_id, missing, minutes) if missing else {}
+    
+    for day, row in existing.items():
+        db.session.execute(
+            db.update(DoctorDaySlots)
+            .where(DoctorDaySlots.id == row.id)
+            .values(open_slots=DayBitmap.pack(open_bits[day], minutes), version=DoctorDaySlots.version + 1)
+            .execution_options(synchronize_session=False)
+        )
+    
+    if missing:
+        db.session.execute(db.insert(DoctorDaySlots), [{
+            'doctor_id': doctor_id,
+            'date': day,
+            'open_slots': DayBitmap.pack(open_bits[day], minutes),
+            'booked_slots': DayBitmap.pack(booked_bits.get(day, 0), minutes),
+            'version': 0
+        } for day in missing])
+    
+    booked = {day: int.from_bytes(row.booked_slots, 'little') for day, row in existing.items()}
+    booked.update(booked_bits)
+    for availability in ranges:
+        availability.is_booked = bool(
+            booked.get(availability.date, 0) & range_mask(availability.start_time, availability.end_time, minutes)
+        )
+
+def _booked_bits(doctor_id, days, minutes):
+    """Booked bitmaps per day built from live appointments"""
+    bits = {}
+    appointments = db.session.query(Appointment.appointment_date, Appointment.appointment_time).filter(
+        Appointment.doctor_id == doctor_id,
+        Appointment.appointment_date.in_(days),
+        Appointment.status == 'booked'
+    )
+    for appointment_date, appointment_time in appointments:
+        index = slot_index(appointment_time, minutes)
+        if index is not None:
+            bits[appointment_date] = bits.get(appointment_date, 0) | 1 << index
+    return bits
+
+def rebuild_day_slots():
+    """Rebuild every doctor-day bitmap from availability ranges and live appointments
+    
+    Used to backfill existing databases and after changing
+    AVAILABILITY_SLOT_MINUTES.
+    """
+    db.session.execute(db.delete(DoctorDaySlots))
+    days = db.session.query(DoctorAvailability.doctor_id, DoctorAvailability.date).distinct().all()
+    
+    by_doctor = {}
+    for doctor_id, day in days:
+        by_doctor.setdefault(doctor_id, []).append(day)
+    for doctor_id, doctor_days in by_doctor.items():
+        refresh_days(doctor_id, doctor_days)
+    
+    db.session.commit()
+
+def ensure_day_slots():
+    """Backfill doctor-day bitmaps for databases created before they existed"""
+    if DoctorDaySlots.query.first() is None and DoctorAvailability.query.first() is not None:
+        rebuild_day_slots()
+        print("✓ Built doctor slot bitmaps from existing availability")
+
+def _serialize_slot(doctor_id, day, index, minutes):
+    return {
+        'doctor_id': doctor_id,
+        'date': day.isoformat(),
+        'start_time': slot_time(index, minutes).isoformat(),
+        'end_time': slot_end_time(index, minutes).isoformat()
+    }
+
+def _first_index(day, now, minutes):
+    """First slot number on day that has not started yet"""
+    if day > now.date():
+        return 0
+    if day < now.date():
+        return MINUTES_PER_DAY // minutes
+    return -(-(now.hour * 60 + now.minute) // minutes)
+
+def doctor_free_slots(doctor_id, start_date, end_date, upcoming=True):
+    """Free slots of one doctor between two dates, in time order
+    
+    With upcoming=False slots that have already started are kept, for
+    callers that cache the result and drop them with upcoming_slots() on read.
+    """
+    minutes = slot_minutes()
+    now = datetime.now()
+    rows = db.session.query(DoctorDaySlots).filter(
+        DoctorDaySlots.doctor_id == doctor_id,
+        DoctorDaySlots.date.between(start_date, end_date)
+    ).order_by(DoctorDaySlots.date).all()
+    
+    return [
+        _serialize_slot(row.doctor_id, row.date, index, minutes)
+        for row in rows
+        for index in DayBitmap.from_row(row).free_indexes(_first_index(row.date, now, minutes) if upcoming else 0)
+    ]
+
+def upcoming_slots(slots):
+    """The serialized slots that have not started yet"""
+    now = datetime.now()
+    today, cutoff = now.date().isoformat(), now.time().replace(second=0, microsecond=0).isoformat()
+    return [slot for slot in slots if (slot['date'], slot['start_time']) >= (today, cutoff)]
+
+def _slot_stream(row, first):
+    """Free slots of a doctor-day as sortable (date, slot, doctor_id) tuples"""
+    for index in DayBitmap.from_row(row).free_indexes(first):
+        yield row.date, index, row.doctor_id
+
+def first_free_slots(specialization_id, start_date, end_date, limit, max_fee=None):
+    """Earliest free upcoming slots across the available doctors of a specialization
+    
+    One query loads the candidate doctor-days; their free bits are merged
+    lazily in (date, time, doctor) order so only the first limit slots are
+    materialized. This reads the database directly; app.utils.slot_index
+    serves the same question from Redis.
+    """
+    minutes = slot_minutes()
+    now = datetime.now()
+    rows = db.session.query(DoctorDaySlots).join(
+        Doctor, Doctor.id == DoctorDaySlots.doctor_id
+    ).filter(
+        Doctor.specialization_id == specialization_id,
+        Doctor.is_available == True,
+        DoctorDaySlots.date.between(max(start_date, now.date()), end_date)
+    )
+    
+    if max_fee is not None:
+        rows = rows.filter(Doctor.consultation_fee <= max_fee)
+    
+    rows = rows.all()
+    
+    streams = [_slot_stream(row, _first_index(row.date, now, minutes)) for row in rows]
+    
+    return [
+        _serialize_slot(doctor_id, day, index, minutes)
+        for day, index, doctor_id in islice(heapq.merge(*streams), limit)
+    ]
@@ -0,0 +1,26 @@
+import json
+from itertools import islice
+from flask import Response, current_app, stream_with_context
+
+def wants_stream(request):
+    """Check whether the client opted into NDJSON streaming"""
+    return request.args.get('format') == 'ndjson'
+
+def ndjson_response(query, serialize):
+    """Stream query results as newline-delimited JSON.
+
+    Rows are fetched from a server-side cursor STREAM_BATCH_SIZE at a time and
+    written one batch per chunk, so memory stays bounded by the batch size
+    rather than the result set.
+    """
+    batch_size = current_app.config['STREAM_BATCH_SIZE']
+    rows = iter(query.yield_per(batch_size))
+
+    def generate():
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            yield ''.join(json.dumps(serialize(row)) + '\n' for row in batch)
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
@@ -0,0 +1,49 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Appointment, ExportWatermark
+
+# Watermarks for incremental exports. Each consumer (a patient's treatment
+# history, a named admin sync) records the time up to which changes have
+# been exported; the next incremental run emits only appointments whose
+# updated_at falls after it. Creating a treatment always updates its
+# appointment, so appointment changes cover both. The window starts
+# EXPORT_WATERMARK_OVERLAP seconds early so rows committed late with an
+# earlier timestamp are not lost; consumers should upsert by appointment id.
+
+def export_window(consumer):
+    """(since, until) bounds of changes to export for a consumer; since is None on its first run"""
+    exported_until = db.session.query(ExportWatermark.exported_until).filter_by(consumer=consumer).scalar()
+    until = datetime.utcnow()
+    if exported_until is None:
+        return None, until
+    return exported_until - timedelta(seconds=current_app.config['EXPORT_WATERMARK_OVERLAP']), until
+
+def changed_between(since, until):
+    """Criteria selecting appointments changed within an export window"""
+    criteria = [Appointment.updated_at <= until]
+    if since is not None:
+        criteria.append(Appointment.updated_at > since)
+    return criteria
+
+def advance_watermark(consumer, until):
+    """Move a consumer's watermark forward to until and commit; it never moves back"""
+    result = db.session.execute(
+        db.update(ExportWatermark)
+        .where(ExportWatermark.consumer == consumer, ExportWatermark.exported_until < until)
+        .values(exported_until=until, updated_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0 and not db.session.query(
+        db.exists().where(ExportWatermark.consumer == consumer)
+    ).scalar():
+        try:
+            db.session.execute(db.insert(ExportWatermark), [{
+                'consumer': consumer, 'exported_until': until, 'updated_at': datetime.utcnow()
+            }])
+        except IntegrityError:
+            # Another export created it first; retry as an update
+            db.session.rollback()
+            return advance_watermark(consumer, until)
+    db.session.commit()
@@ -0,0 +1,93 @@
+"""Benchmark cache payload codecs against plain JSON.
+
+Encodes and decodes a listing of --rows appointment-shaped dicts with each
+codec, with and without zlib compression, and reports the payload size,
+encode and decode time, and the peak memory allocated while decoding.
+
+    python benchmarks/codec_benchmark.py --rows 2000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from app.utils.codecs import JSONCodec, MsgpackCodec, encode, decode, get_codec
+
+STATUSES = ['booked', 'completed', 'cancelled']
+DOCTORS = [('Dr. Rajesh Sharma', 'Cardiology'), ('Dr. Priya Patel', 'Neurology'), ('Dr. Amit Kumar', 'Orthopedics')]
+
+def listing(count):
+    """count dicts shaped like serializers.patient_appointment output"""
+    random.seed(1)
+    rows = []
+    for i in range(count):
+        doctor, specialization = random.choice(DOCTORS)
+        row = {
+            'id': i + 1,
+            'doctor_name': doctor,
+            'specialization': specialization,
+            'appointment_date': (date(2024, 1, 1) + timedelta(days=i % 365)).isoformat(),
+            'appointment_time': f'{9 + i % 8:02d}:{(i % 4) * 15:02d}:00',
+            'status': random.choice(STATUSES),
+            'reason': 'Routine check-up' if i % 3 else None
+        }
+        if row['status'] == 'completed':
+            row['treatment'] = {
+                'diagnosis': f'Diagnosis {i % 50}',
+                'prescription': 'Paracetamol 500mg twice daily',
+                'notes': None,
+                'next_visit_date': None
+            }
+        rows.append(row)
+    return rows
+
+def measure(value, codec_name, compress_threshold, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        payload = encode(value, codec_name, compress_threshold)
+    encode_ms = (time.perf_counter() - started) / repeat * 1000
+    
+    started = time.perf_counter()
+    for _ in range(repeat):
+        decode(payload)
+    decode_ms = (time.perf_counter() - started) / repeat * 1000
+    
+    tracemalloc.start()
+    decode(payload)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    
+    return len(payload), encode_ms, decode_ms, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--compress-threshold', type=int, default=1024)
+    args = parser.parse_args()
+    
+    value = {'v': listing(args.rows), 'e': time.time(), 'd': 0.01}  # cache entry as stored by cache._store
+    
+    if get_codec(MsgpackCodec.name).name != MsgpackCodec.name:
+        print('msgpack is not installed; its rows fall back to JSON')
+    
+    started = time.perf_counter()
+    for _ in range(args.repeat):
+        baseline = json.dumps(value).encode('utf-8')
+    print(f"plain json.dumps: {len(baseline) / 1024:.0f} KB, {(time.perf_counter() - started) / args.repeat * 1000:.1f} ms")
+    
+    print(f"{'codec':<16}{'size KB':>9}{'encode ms':>11}{'decode ms':>11}{'decode peak KB':>16}")
+    for codec_name in (JSONCodec.name, MsgpackCodec.name):
+        for compress_threshold in (None, args.compress_threshold):
+            label = codec_name + (' + zlib' if compress_threshold is not None else '')
+            size, encode_ms, decode_ms, peak = measure(value, codec_name, compress_threshold, args.repeat)
+            print(f"{label:<16}{size / 1024:>9.0f}{encode_ms:>11.1f}{decode_ms:>11.1f}{peak / 1024:>16.0f}")
+
+if __name__ == '__main__':
+    main()
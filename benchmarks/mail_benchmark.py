@@ -0,0 +1,74 @@
+"""Benchmark batched reminder sending against one connection per message.
+
+Sends --messages reminders through send_batched over a stand-in SMTP
+connection that sleeps --handshake-ms per connection (TCP, TLS, EHLO,
+AUTH) and --send-ms per message, once with MAIL_BATCH_SIZE 1 and once
+with --batch-size, and reports messages per second.
+
+    python benchmarks/mail_benchmark.py --messages 500 --handshake-ms 50
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from flask import Flask
+from flask_mail import Message
+from config import Config
+from app import mail
+from app.utils.mailer import send_batched
+
+class StandInConnection:
+    def __init__(self, stats, handshake, send):
+        self.stats = stats
+        self.handshake = handshake
+        self.send_delay = send
+    
+    def __enter__(self):
+        self.stats['connections'] += 1
+        time.sleep(self.handshake)
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+    
+    def send(self, message):
+        time.sleep(self.send_delay)
+
+def run(app, count, batch_size, handshake, send):
+    stats = {'connections': 0}
+    mail.connect = lambda: StandInConnection(stats, handshake, send)
+    app.config['MAIL_BATCH_SIZE'] = batch_size
+    messages = (
+        (i, Message(subject='Appointment Reminder', sender='noreply@hospital.test', recipients=[f'p{i}@example.com']))
+        for i in range(count)
+    )
+    
+    started = time.perf_counter()
+    sent, _ = send_batched(messages)
+    elapsed = time.perf_counter() - started
+    return len(sent) / elapsed, stats['connections']
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--batch-size', type=int, default=Config.MAIL_BATCH_SIZE)
+    parser.add_argument('--handshake-ms', type=float, default=50)
+    parser.add_argument('--send-ms', type=float, default=1)
+    args = parser.parse_args()
+    
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    mail.init_app(app)
+    handshake, send = args.handshake_ms / 1000, args.send_ms / 1000
+    
+    with app.app_context():
+        print(f"{'batch size':<12}{'connections':>12}{'msg/s':>10}")
+        for batch_size in (1, args.batch_size):
+            rate, connections = run(app, args.messages, batch_size, handshake, send)
+            print(f"{batch_size:<12}{connections:>12}{rate:>10.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Benchmark rendering a monthly report email with many appointment rows.
+
+Renders one doctor's report with --rows appointments through the
+email/monthly_report.html template and through the f-string += loop it
+replaced (as it was, and with names and diagnoses escaped so the output
+is as safe as the template's), and reports the best of --repeat runs.
+
+    python benchmarks/report_benchmark.py --rows 5000
+"""
+import argparse
+import os
+import sys
+import time
+from collections import namedtuple
+from datetime import date, timedelta
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+from flask import Flask
+from markupsafe import escape
+from app.utils.mailer import render_email
+
+DoctorRow = namedtuple('DoctorRow', 'full_name specialization total_appointments completed cancelled')
+AppointmentRow = namedtuple('AppointmentRow', 'appointment_date status patient_name diagnosis')
+
+def rows(count):
+    start = date(2024, 1, 1)
+    return [
+        AppointmentRow(
+            start + timedelta(days=i % 31),
+            ('booked', 'completed', 'cancelled')[i % 3],
+            f"Patient <{i}> O'Brien",
+            f'Diagnosis {i} & follow-up' if i % 3 == 1 else None
+        )
+        for i in range(count)
+    ]
+
+def string_loop(doctor, appointments, month, escaped):
+    """The report body as built before the template, with optional escaping"""
+    quote = escape if escaped else str
+    html_body = f"""
+    <html>
+    <body>
+        <div class="header">
+            <h1>Monthly Activity Report</h1>
+            <p>{month.strftime('%B %Y')}</p>
+        </div>
+        <div class="content">
+            <h2>Dr. {quote(doctor.full_name)}</h2>
+            <p>Specialization: {quote(doctor.specialization)}</p>
+            <div class="stats">
+                <p><strong>Total Appointments:</strong> {doctor.total_appointments}</p>
+                <p><strong>Completed:</strong> {doctor.completed}</p>
+                <p><strong>Cancelled:</strong> {doctor.cancelled}</p>
+            </div>
+            <table>
+    """
+    for apt in appointments:
+        diagnosis = apt.diagnosis or 'N/A'
+        html_body += f"""
+                <tr>
+                    <td>{apt.appointment_date.strftime('%Y-%m-%d')}</td>
+                    <td>{quote(apt.patient_name)}</td>
+                    <td>{apt.status}</td>
+                    <td>{quote(diagnosis)}</td>
+                </tr>
+        """
+    html_body += """
+            </table>
+        </div>
+    </body>
+    </html>
+    """
+    return html_body
+
+def best_ms(render, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        render()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+    
+    app = Flask(__name__, template_folder=os.path.join(ROOT, 'app', 'templates'))
+    doctor = DoctorRow('Rajesh Sharma', 'Cardiology', args.rows, args.rows // 3, args.rows // 3)
+    appointments = rows(args.rows)
+    month = date(2024, 1, 1)
+    
+    with app.app_context():
+        render_email('email/monthly_report.html', doctor=doctor, appointments=appointments, month=month)  # compile once
+        results = [
+            ('template (autoescaped)', lambda: render_email(
+                'email/monthly_report.html', doctor=doctor, appointments=appointments, month=month
+            )),
+            ('string loop, escaped', lambda: string_loop(doctor, appointments, month, True)),
+            ('string loop, raw', lambda: string_loop(doctor, appointments, month, False)),
+        ]
+        print(f"{args.rows} rows, best of {args.repeat}")
+        for label, render in results:
+            print(f"{label:<26}{best_ms(render, args.repeat):>8.1f} ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Benchmark admin patient search against a large SQLite database.
+
+Builds a throwaway database with --patients synthetic patients (1M by
+default), then times the first result page of several queries, and the
+page after --pages pages (fetched with the keyset cursor), with the FTS5
+trigram index and with the ILIKE fallback.
+    
+    python benchmarks/search_benchmark.py --patients 1000000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from config import Config
+from app import create_app, db
+from app.utils import search
+from app.utils.pagination import paginate_ranked
+
+FIRST_NAMES = ['john', 'maria', 'arjun', 'priya', 'wei', 'fatima', 'liam', 'olga', 'kenji', 'amara', 'diego', 'sofia']
+LAST_NAMES = ['smith', 'garcia', 'sharma', 'patel', 'chen', 'khan', 'brown', 'ivanova', 'tanaka', 'okafor', 'lopez', 'rossi']
+INSERT_CHUNK = 50000
+ID_OFFSET = 1000
+
+def populate(count):
+    """Insert count users and patients; the search triggers index them as they go"""
+    random.seed(1)
+    started = time.perf_counter()
+    with db.engine.begin() as connection:
+        for first in range(0, count, INSERT_CHUNK):
+            ids = range(first, min(first + INSERT_CHUNK, count))
+            connection.exec_driver_sql(
+                "INSERT INTO users (id, username, email, password_hash, role, is_active) VALUES (?, ?, ?, ?, ?, ?)",
+                [(i + ID_OFFSET, f'user{i}', f'{random.choice(FIRST_NAMES)}.{i}@mail.test', 'x', 'patient', 1) for i in ids]
+            )
+            connection.exec_driver_sql(
+                "INSERT INTO patients (id, user_id, full_name, contact_number) VALUES (?, ?, ?, ?)",
+                [(
+                    i + ID_OFFSET, i + ID_OFFSET,
+                    f'{random.choice(FIRST_NAMES).title()} {random.choice(LAST_NAMES).title()} {i}',
+                    f'9{random.randrange(10 ** 9):09d}'
+                ) for i in ids]
+            )
+    return time.perf_counter() - started
+
+def page(app, text, page_size, cursor=None):
+    path = f'/?limit={page_size}' + (f'&cursor={cursor}' if cursor else '')
+    with app.test_request_context(path):
+        return paginate_ranked(*search.search_patients(text))
+
+def time_query(app, text, page_size, repeat, pages):
+    """Average ms for the first page and for the page after pages pages, and the first page's hits"""
+    rows, _ = page(app, text, page_size)  # warm the page cache
+    started = time.perf_counter()
+    for _ in range(repeat):
+        rows, cursor = page(app, text, page_size)
+    first_ms = (time.perf_counter() - started) / repeat * 1000
+    
+    for _ in range(pages - 1):
+        if cursor is None:
+            break
+        _, cursor = page(app, text, page_size, cursor)
+    deep_ms = None
+    if cursor is not None:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            page(app, text, page_size, cursor)
+        deep_ms = (time.perf_counter() - started) / repeat * 1000
+    return first_ms, deep_ms, len(rows)
+
+def format_ms(ms):
+    return f"{ms:.1f}" if ms is not None else '-'
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--patients', type=int, default=1000000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--pages', type=int, default=20)
+    args = parser.parse_args()
+    
+    directory = tempfile.mkdtemp()
+    
+    class BenchmarkConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(directory, 'search.db')
+    
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        if search.backend() != search.FTS5:
+            sys.exit('This SQLite build lacks FTS5 with the trigram tokenizer')
+        
+        print(f"Inserted {args.patients} patients in {populate(args.patients):.1f}s (index triggers active)")
+        
+        queries = ['fatima', 'fatima okaf', 'han', '123456', '9013', 'zzzz']
+        print(f"{'query':<16}{'fts5 ms':>10}{'deep ms':>10}{'hits':>6}{'ilike ms':>11}{'deep ms':>10}{'hits':>6}")
+        for text in queries:
+            app.extensions['search_backend'] = search.FTS5
+            fts_ms, fts_deep_ms, fts_hits = time_query(app, text, args.page_size, args.repeat, args.pages)
+            app.extensions['search_backend'] = search.LIKE
+            like_ms, like_deep_ms, like_hits = time_query(app, text, args.page_size, args.repeat, args.pages)
+            print(
+                f"{text!r:<16}{fts_ms:>10.1f}{format_ms(fts_deep_ms):>10}{fts_hits:>6}"
+                f"{like_ms:>11.1f}{format_ms(like_deep_ms):>10}{like_hits:>6}"
+            )
+
+if __name__ == '__main__':
+    main()
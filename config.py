@@ -21,6 +21,13 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     MAIL_DEFAULT_SENDER = os.environ.get('MAIL_DEFAULT_SENDER')
+    MAIL_BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE') or 100)  # messages sent per SMTP connection
+    MAIL_BATCH_RETRIES = 3  # reconnect attempts for a batch after a connection error
+    MAIL_RETRY_DELAY = 2    # seconds before the first reconnect, doubled on each further attempt
+    REMINDER_CHUNK_SIZE = 500  # appointments per reminder subtask
+    REPORT_CHUNK_SIZE = 25     # doctors per monthly report subtask
+    DELIVERY_LEDGER_RETENTION_DAYS = 90  # days delivered reminders/reports are remembered
+    DELIVERY_CLAIM_TIMEOUT = 3600  # seconds before another chunk may take over an unsent claim
     
     # Session Configuration
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
@@ -29,3 +36,31 @@ class Config:
     CACHE_DEFAULT_TIMEOUT = 300  # 5 minutes
     CACHE_DOCTOR_TIMEOUT = 600   # 10 minutes
     CACHE_DEPARTMENT_TIMEOUT = 3600  # 1 hour
+    CACHE_LOCAL_MAXSIZE = 256    # entries in each process's in-memory layer
+    CACHE_LOCAL_TIMEOUT = 30     # seconds an in-memory entry may be served
+    CACHE_STALE_TIMEOUT = 60     # seconds a stale entry may be served while refreshing
+    CACHE_LOCK_TIMEOUT = 10      # seconds one worker may hold a recompute lock
+    CACHE_LOCK_POLL_INTERVAL = 0.05
+    CACHE_CODEC = os.environ.get('CACHE_CODEC') or 'msgpack'  # msgpack or json
+    CACHE_COMPRESS_THRESHOLD = 1024  # zlib-compress payloads at least this many bytes
+    
+    # Pagination Configuration
+    PAGE_SIZE_DEFAULT = int(os.environ.get('PAGE_SIZE_DEFAULT') or 50)
+    PAGE_SIZE_MAX = int(os.environ.get('PAGE_SIZE_MAX') or 200)
+    STREAM_BATCH_SIZE = 1000  # rows fetched per round-trip for ?format=ndjson
+    SEARCH_RANK_LIMIT = 2000  # admin search matches ranked by relevance; more are listed in id order
+    
+    # Export Configuration
+    EXPORT_BATCH_SIZE = 1000  # rows fetched per round-trip (and per progress update) while exporting
+    EXPORT_DIR = os.environ.get('EXPORT_DIR') or os.path.join(os.path.abspath(os.path.dirname(__file__)), 'exports')
+    EXPORT_TTL = 86400  # seconds an export artifact is kept (24 hours)
+    EXPORT_COMPRESSION_LEVEL = 6
+    EXPORT_COLUMNAR_FORMAT = 'parquet'  # 'parquet' or 'arrow' (Arrow IPC, readable memory-mapped)
+    EXPORT_PARQUET_COMPRESSION = 'zstd'
+    EXPORT_WATERMARK_OVERLAP = 60  # seconds re-read before a watermark to catch late commits
+    
+    # Scheduling Configuration
+    AVAILABILITY_SLOT_MINUTES = 15  # bookable slot length; rebuild day slots after changing
+    AVAILABILITY_WINDOW_DAYS = 7  # days of free slots shown to patients by default
+    AVAILABILITY_HORIZON_DAYS = int(os.environ.get('AVAILABILITY_HORIZON_DAYS') or 28)  # days ahead schedules are generated from templates
+    SLOT_INDEX_TIMEOUT = 3600  # seconds before a specialization's free-slot index is rebuilt
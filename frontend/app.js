@@ -1,6 +1,8 @@
 const { createApp } = Vue;
 
 const API_BASE_URL = 'http://localhost:5000';
+const EXPORT_POLL_INTERVAL_MS = 1000;
+const EXPORT_POLL_ATTEMPTS = 300;  // give up after about five minutes
 
 createApp({
     data() {
@@ -26,8 +28,10 @@ createApp({
             
             dashboardStats: null,
             doctors: [],
+            doctorsCursor: null,
             patients: [],
             appointments: [],
+            appointmentsCursor: null,
             specializations: [],
             treatmentHistory: [],
             selectedDoctors: []
@@ -116,12 +120,14 @@ createApp({
             }
         },
         
-        async loadDoctors() {
+        async loadDoctors(more = false) {
             try {
                 const response = await axios.get(`${API_BASE_URL}/admin/doctors`, {
+                    params: more ? { cursor: this.doctorsCursor } : {},
                     withCredentials: true
                 });
-                this.doctors = response.data;
+                this.doctors = more ? this.doctors.concat(response.data.items) : response.data.items;
+                this.doctorsCursor = response.data.next_cursor;
             } catch (error) {
                 console.error('Load doctors error:', error);
             }
@@ -141,7 +147,7 @@ createApp({
             }
         },
         
-        async loadAppointments() {
+        async loadAppointments(more = false) {
             try {
                 let endpoint = '';
                 if (this.user.role === 'admin') {
@@ -153,9 +159,11 @@ createApp({
                 }
                 
                 const response = await axios.get(`${API_BASE_URL}${endpoint}`, {
+                    params: more ? { cursor: this.appointmentsCursor } : {},
                     withCredentials: true
                 });
-                this.appointments = response.data;
+                this.appointments = more ? this.appointments.concat(response.data.items) : response.data.items;
+                this.appointmentsCursor = response.data.next_cursor;
             } catch (error) {
                 console.error('Load appointments error:', error);
             }
@@ -243,7 +251,28 @@ createApp({
                 const response = await axios.post(`${API_BASE_URL}/api/export/treatments`, {}, {
                     withCredentials: true
                 });
-                alert(response.data.message);
+                const taskId = response.data.task_id;
+                
+                // Poll until the export is ready, then download it
+                for (let attempt = 0; attempt < EXPORT_POLL_ATTEMPTS; attempt++) {
+                    await new Promise(resolve => setTimeout(resolve, EXPORT_POLL_INTERVAL_MS));
+                    const status = await axios.get(`${API_BASE_URL}/api/export/status/${taskId}`, {
+                        withCredentials: true
+                    });
+                    if (status.data.state === 'SUCCESS') {
+                        if (status.data.result.status !== 'success') {
+                            alert(status.data.result.message || 'Export failed');
+                            return;
+                        }
+                        window.location.href = `${API_BASE_URL}/api/export/${taskId}/download`;
+                        return;
+                    }
+                    if (status.data.state === 'FAILURE' || status.data.state === 'REVOKED') {
+                        alert('Export failed');
+                        return;
+                    }
+                }
+                alert('Export is taking too long; please try again later');
             } catch (error) {
                 alert(error.response?.data?.error || 'Export failed');
             }
@@ -0,0 +1,81 @@
+from contextlib import contextmanager
+import fakeredis
+import pytest
+import redis
+from sqlalchemy import event
+from config import Config
+import app as app_package
+from app import create_app, db, bcrypt
+from app.models import User, Patient
+
+# One in-memory Redis for the whole session: the cache, slot index and
+# artifact modules bind app.redis_client when first imported, which for
+# test modules importing app.tasks is at collection, before any app exists
+fake_redis = fakeredis.FakeRedis()
+app_package.redis_client = fake_redis
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """App on a fresh SQLite file (shared by threads) with fakeredis"""
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + str(tmp_path / 'test.db')
+        SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'timeout': 30}}
+        BCRYPT_LOG_ROUNDS = 4
+        MAIL_SUPPRESS_SEND = True
+        MAIL_DEFAULT_SENDER = 'noreply@hospital.test'
+        EXPORT_DIR = str(tmp_path / 'exports')
+    
+    fake_redis.flushall()
+    monkeypatch.setattr(redis, 'from_url', lambda *args, **kwargs: fake_redis)
+    app = create_app(TestConfig)
+    
+    yield app
+    
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+@pytest.fixture
+def login(app):
+    """Return a test client logged in as the given user"""
+    def login(username, password):
+        client = app.test_client()
+        response = client.post('/auth/login', json={'username': username, 'password': password})
+        assert response.status_code == 200, response.get_json()
+        return client
+    return login
+
+@pytest.fixture
+def make_patients(app):
+    """Create patient accounts p0..p<count-1> (password 'pw') and return their patient ids"""
+    def make_patients(count):
+        password_hash = bcrypt.generate_password_hash('pw').decode('utf-8')
+        with app.app_context():
+            patients = []
+            for i in range(count):
+                user = User(username=f'p{i}', email=f'p{i}@example.com', password_hash=password_hash, role='patient')
+                patients.append(Patient(user=user, full_name=f'Patient {i}', contact_number=f'555{i:04d}'))
+            db.session.add_all(patients)
+            db.session.commit()
+            return [patient.id for patient in patients]
+    return make_patients
+
+@pytest.fixture
+def count_queries(app):
+    """Context manager collecting the SQL statements run inside it"""
+    @contextmanager
+    def count_queries():
+        with app.app_context():
+            engine = db.engine
+        statements = []
+        
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+        
+        event.listen(engine, 'before_cursor_execute', record)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, 'before_cursor_execute', record)
+    return count_queries
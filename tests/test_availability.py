@@ -0,0 +1,59 @@
+from datetime import date, timedelta
+import pytest
+from app import db
+from app.models import DoctorAvailability
+from app.utils.directory import doctor_open_slots
+
+START = date.today() + timedelta(days=10)
+
+def schedule(**overrides):
+    return {
+        'start_date': START.isoformat(),
+        'end_date': (START + timedelta(days=6)).isoformat(),
+        'weekdays': list(range(7)),
+        'windows': [{'start_time': '09:00', 'end_time': '10:00'}],
+        **overrides
+    }
+
+ENDPOINTS = [
+    ('dr.patel', 'doctor123', '/doctor/availability/bulk'),
+    ('admin', 'admin123', '/admin/doctors/2/availability/bulk'),
+]
+
+@pytest.mark.parametrize('username, password, url', ENDPOINTS)
+def test_bulk_schedule_adds_ranges_and_refreshes_cached_availability(app, login, username, password, url):
+    client = login(username, password)
+    with app.app_context():
+        doctor_open_slots(2, START)  # cache the window before the schedule exists
+    
+    response = client.post(url, json=schedule())
+    
+    assert response.status_code == 201
+    assert response.get_json() == {'message': 'Availability added successfully', 'created': 7, 'skipped': 0}
+    with app.app_context():
+        assert DoctorAvailability.query.filter(DoctorAvailability.doctor_id == 2, DoctorAvailability.date >= START).count() == 7
+        assert len(doctor_open_slots(2, START)) == 7 * 4
+
+@pytest.mark.parametrize('username, password, url', ENDPOINTS)
+def test_bulk_schedule_conflicts_are_rejected_or_skipped(app, login, username, password, url):
+    client = login(username, password)
+    assert client.post(url, json=schedule(end_date=START.isoformat())).status_code == 201
+    
+    rejected = client.post(url, json=schedule())
+    skipped = client.post(url, json=schedule(skip_conflicts=True))
+    
+    assert rejected.status_code == 400
+    assert rejected.get_json()['conflicts'] == [{'date': START.isoformat(), 'start_time': '09:00:00', 'end_time': '10:00:00'}]
+    assert skipped.status_code == 201
+    assert skipped.get_json()['created'] == 6 and skipped.get_json()['skipped'] == 1
+
+@pytest.mark.parametrize('username, password, url', ENDPOINTS)
+def test_malformed_bulk_schedule_is_rejected(app, login, username, password, url):
+    client = login(username, password)
+    
+    for body in ({}, [], schedule(weekdays=[7]), schedule(windows=[])):
+        response = client.post(url, json=body)
+        assert response.status_code == 400, body
+        assert 'error' in response.get_json()
+    with app.app_context():
+        assert db.session.query(DoctorAvailability).filter(DoctorAvailability.date >= START).count() == 0
@@ -0,0 +1,114 @@
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time, timedelta
+import pytest
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import Appointment, DoctorDaySlots, Treatment
+from app.utils import booking
+from app.utils.slots import SlotUnavailable
+
+CONTENDERS = 200
+
+def test_parallel_bookings_of_one_slot_have_one_winner(app, login, make_patients):
+    make_patients(CONTENDERS)
+    clients = [login(f'p{i}', 'pw') for i in range(CONTENDERS)]
+    day = date.today() + timedelta(days=2)
+    body = {'doctor_id': 2, 'appointment_date': day.isoformat(), 'appointment_time': '10:15'}
+    start = threading.Barrier(CONTENDERS)
+    
+    def book(client):
+        start.wait()
+        return client.post('/patient/appointments', json=body).status_code
+    
+    with ThreadPoolExecutor(max_workers=CONTENDERS) as pool:
+        codes = Counter(pool.map(book, clients))
+    
+    assert codes == {201: 1, 400: CONTENDERS - 1}
+    with app.app_context():
+        booked = Appointment.query.filter_by(doctor_id=2, appointment_date=day, status='booked').count()
+    assert booked == 1
+
+def test_cancelled_slot_can_be_booked_again(app, login, make_patients):
+    make_patients(2)
+    first, second = login('p0', 'pw'), login('p1', 'pw')
+    body = {'doctor_id': 1, 'appointment_date': (date.today() + timedelta(days=1)).isoformat(), 'appointment_time': '09:30'}
+    
+    appointment_id = first.post('/patient/appointments', json=body).get_json()['appointment_id']
+    assert second.post('/patient/appointments', json=body).status_code == 400
+    
+    assert first.post(f'/patient/appointments/{appointment_id}/cancel').status_code == 200
+    assert second.post('/patient/appointments', json=body).status_code == 201
+
+def test_complete_fails_once_a_racing_cancel_has_committed(app, login, make_patients):
+    patient_id, = make_patients(1)
+    body = {'doctor_id': 1, 'appointment_date': (date.today() + timedelta(days=1)).isoformat(), 'appointment_time': '10:00'}
+    appointment_id = login('p0', 'pw').post('/patient/appointments', json=body).get_json()['appointment_id']
+    
+    with app.app_context():
+        stale = db.session.get(Appointment, appointment_id)  # loaded while still booked
+        with app.app_context():
+            booking.cancel_appointment(db.session.get(Appointment, appointment_id))
+        
+        with pytest.raises(booking.AppointmentNotBooked):
+            booking.complete_appointment(stale, 'Flu')
+        
+        assert db.session.get(Appointment, appointment_id).status == 'cancelled'
+        assert Treatment.query.filter_by(appointment_id=appointment_id).count() == 0
+
+def test_parallel_cancel_and_complete_apply_only_one(app, login, make_patients):
+    make_patients(1)
+    patient, doctor = login('p0', 'pw'), login('dr.sharma', 'doctor123')
+    day = (date.today() + timedelta(days=1)).isoformat()
+    appointment_ids = [
+        patient.post('/patient/appointments', json={
+            'doctor_id': 1, 'appointment_date': day, 'appointment_time': f'{hour}:{minute:02d}'
+        }).get_json()['appointment_id']
+        for hour in (9, 10, 11) for minute in (0, 15, 30, 45)
+    ]
+    start = threading.Barrier(2)
+    
+    def race(appointment_id):
+        def cancel():
+            start.wait()
+            return patient.post(f'/patient/appointments/{appointment_id}/cancel').status_code
+        
+        def complete():
+            start.wait()
+            return doctor.post(f'/doctor/appointments/{appointment_id}/complete', json={'diagnosis': 'Flu'}).status_code
+        
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            return sorted(future.result() for future in [pool.submit(cancel), pool.submit(complete)])
+    
+    for appointment_id in appointment_ids:
+        assert race(appointment_id) == [200, 400]
+    
+    with app.app_context():
+        for appointment in Appointment.query.filter(Appointment.id.in_(appointment_ids)):
+            treated = Treatment.query.filter_by(appointment_id=appointment.id).count() == 1
+            assert (appointment.status == 'completed') == treated
+    
+    # Slots of cancelled appointments are free again, completed ones stay taken
+    other = login('p0', 'pw')
+    with app.app_context():
+        outcomes = {a.appointment_time: a.status for a in Appointment.query.filter(Appointment.id.in_(appointment_ids))}
+    for slot, status in outcomes.items():
+        response = other.post('/patient/appointments', json={
+            'doctor_id': 1, 'appointment_date': day, 'appointment_time': slot.strftime('%H:%M')
+        })
+        assert response.status_code == (201 if status == 'cancelled' else 400)
+
+def test_only_slot_conflicts_become_slot_unavailable(app, make_patients):
+    patient_id, = make_patients(1)
+    day = date.today() + timedelta(days=1)
+    with app.app_context():
+        booking.book_appointment(patient_id, 1, day, time(11, 0))
+        
+        # The unique index still catches a conflict the bitmap missed
+        db.session.execute(db.update(DoctorDaySlots).values(booked_slots=db.func.zeroblob(12)))
+        with pytest.raises(SlotUnavailable):
+            booking.book_appointment(patient_id, 1, day, time(11, 0))
+        
+        with pytest.raises(IntegrityError):
+            booking.book_appointment(None, 1, day, time(11, 15))
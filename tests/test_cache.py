@@ -0,0 +1,114 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from app.utils import cache
+from app.utils.cache import INVALIDATION_CHANNEL, LOCK_PREFIX, cached, invalidate_tag, local_cache
+
+class Source:
+    """A computation that counts its calls and returns the current value"""
+    
+    def __init__(self, value=1, delay=0):
+        self.value = value
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+    
+    def __call__(self, *args):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.delay)
+        return self.value
+
+@pytest.fixture
+def context(app):
+    app.config.update(CACHE_LOCK_TIMEOUT=2, CACHE_LOCK_POLL_INTERVAL=0.01)
+    local_cache.clear()
+    with app.app_context():
+        yield app
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
+
+def test_concurrent_misses_recompute_once(context):
+    source = Source(delay=0.2)
+    read = cached('test:stampede', timeout=60)(source)
+    
+    def call(_):
+        with context.app_context():
+            return read()
+    
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(call, range(8)))
+    
+    assert results == [1] * 8
+    assert source.calls == 1
+
+def test_waiter_takes_over_a_lock_left_by_a_dead_holder(context):
+    context.config['CACHE_LOCK_TIMEOUT'] = 0.3
+    source = Source()
+    read = cached('test:takeover', timeout=60)(source)
+    # A worker took the lock and died; the lock expires after CACHE_LOCK_TIMEOUT
+    cache.redis_client.set(f'{LOCK_PREFIX}test:takeover:', 'dead-worker', px=300)
+    
+    started = time.monotonic()
+    assert read() == 1
+    
+    assert source.calls == 1
+    assert time.monotonic() - started >= 0.25
+    assert cache.redis_client.get(f'{LOCK_PREFIX}test:takeover:') is None  # released by the new holder
+
+def test_stale_entry_is_served_while_one_refresh_runs(context):
+    source = Source(value='old')
+    read = cached('test:stale', timeout=60, stale_ttl='CACHE_STALE_TIMEOUT', early_expiration=0)(source)
+    read()
+    # Expire the entry while it is still within CACHE_STALE_TIMEOUT
+    payload = cache._load('test:stale:')
+    cache._store('test:stale:', payload[0], -1, context.config['CACHE_STALE_TIMEOUT'], payload[2], [])
+    source.value, source.delay = 'new', 0.3
+    
+    assert [read() for _ in range(5)] == ['old'] * 5
+    wait_for(lambda: cache._load('test:stale:')[0] == 'new')
+    
+    assert read() == 'new'
+    assert source.calls == 2
+
+def test_expired_entry_without_stale_ttl_is_recomputed(context):
+    source = Source(value='old')
+    read = cached('test:fresh', timeout=60, early_expiration=0)(source)
+    read()
+    cache._store('test:fresh:', 'old', -1, 60, 0, [])
+    source.value = 'new'
+    
+    assert read() == 'new'
+
+def test_tag_purge_drops_only_keys_of_that_tag(context):
+    source = Source()
+    read = cached('test:tagged', timeout=60, tags=lambda owner, day: [f'owner:{owner}'])(source)
+    for owner in (1, 2):
+        for day in ('mon', 'tue'):
+            read(owner, day)
+    source.value = 2
+    
+    invalidate_tag('owner:1')
+    
+    assert [read(1, 'mon'), read(1, 'tue'), read(2, 'mon'), read(2, 'tue')] == [2, 2, 1, 1]
+    assert cache.redis_client.smembers('cache:tag:owner:2') == {b'test:tagged:2:mon', b'test:tagged:2:tue'}
+
+def test_local_layer_drops_entries_invalidated_by_another_process(context):
+    source = Source()
+    read = cached('test:local', timeout=60, local=True)(source)
+    assert read() == 1
+    # Another process rewrites the value and announces it over pub/sub
+    cache.redis_client.delete('test:local:')
+    source.value = 2
+    assert read() == 1  # still served from this process's LRU
+    
+    cache.redis_client.publish(INVALIDATION_CHANNEL, json.dumps({'keys': ['test:local:'], 'pattern': None}))
+    wait_for(lambda: local_cache.get('test:local:') is cache._MISSING)
+    
+    assert read() == 2
@@ -0,0 +1,43 @@
+import json
+import pytest
+from app.utils.codecs import COMPRESSED, JSONCodec, MsgpackCodec, encode, decode
+
+VALUE = {'v': [{'id': 1, 'name': 'Dr. Rajesh Sharma', 'fee': 1000.0, 'notes': None}], 'e': 1700000000.5, 'd': 0.02}
+
+@pytest.mark.parametrize('codec', [JSONCodec, MsgpackCodec])
+def test_payload_is_framed_with_codec_marker_and_round_trips(codec):
+    payload = encode(VALUE, codec.name)
+    
+    assert payload[:1] == codec.marker
+    assert decode(payload) == VALUE
+
+def test_msgpack_frame_holds_a_msgpack_body():
+    import msgpack
+    payload = encode(VALUE, MsgpackCodec.name)
+    
+    assert msgpack.unpackb(payload[1:], raw=False) == VALUE
+    assert len(payload) < len(encode(VALUE, JSONCodec.name))
+
+def test_entries_written_under_another_codec_still_decode():
+    # A rolling deploy reads whatever codec the other release wrote
+    assert decode(encode(VALUE, JSONCodec.name)) == decode(encode(VALUE, MsgpackCodec.name)) == VALUE
+
+@pytest.mark.parametrize('legacy', [VALUE, [1, 2], [{'id': 1}], 'text', 42, None])
+def test_reads_unframed_legacy_json(legacy):
+    assert decode(json.dumps(legacy).encode('utf-8')) == legacy
+
+@pytest.mark.parametrize('codec', [JSONCodec, MsgpackCodec])
+def test_compress_threshold_boundary(codec):
+    size = len(encode(VALUE, codec.name))
+    
+    at_threshold = encode(VALUE, codec.name, compress_threshold=size)
+    below_threshold = encode(VALUE, codec.name, compress_threshold=size + 1)
+    
+    assert at_threshold[:1] == COMPRESSED
+    assert below_threshold[:1] == codec.marker
+    assert decode(at_threshold) == decode(below_threshold) == VALUE
+
+def test_no_threshold_never_compresses():
+    value = {'v': 'x' * 100000}
+    assert encode(value, JSONCodec.name)[:1] == JSONCodec.marker
+    assert decode(encode(value, JSONCodec.name, compress_threshold=1)) == value
@@ -0,0 +1,69 @@
+import os
+import tarfile
+from datetime import date, time
+import pytest
+from app import db
+from app.models import Appointment
+from app.tasks import export_appointments_columnar
+from app.utils.columnar import PartitionedWriter
+
+pa = pytest.importorskip('pyarrow')
+ipc = pytest.importorskip('pyarrow.ipc')
+pq = pytest.importorskip('pyarrow.parquet')
+
+SCHEMA = pa.schema([('id', pa.int64()), ('day', pa.date32())])
+
+def batch_sizes(path):
+    """Rows per record batch (Parquet row group) of a written partition"""
+    if path.endswith('.parquet'):
+        metadata = pq.ParquetFile(path).metadata
+        return [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+    reader = ipc.open_file(path)
+    return [reader.get_batch(i).num_rows for i in range(reader.num_record_batches)]
+
+def read_ids(path):
+    table = pq.read_table(path) if path.endswith('.parquet') else ipc.open_file(path).read_all()
+    return table.column('id').to_pylist()
+
+@pytest.mark.parametrize('file_format, suffix', [('parquet', '.parquet'), ('arrow', '.arrow')])
+def test_month_switch_flushes_and_rolls_over_to_a_new_partition(tmp_path, file_format, suffix):
+    days = [date(2024, 1, d) for d in (3, 9, 14, 20, 31)] + [date(2024, 2, 1)]
+    
+    with PartitionedWriter(str(tmp_path), file_format, schema=SCHEMA, batch_size=2) as writer:
+        for i, day in enumerate(days):
+            writer.write(day.strftime('%Y-%m'), {'id': i, 'day': day})
+    
+    january = str(tmp_path / 'month=2024-01' / f'part-0{suffix}')
+    february = str(tmp_path / 'month=2024-02' / f'part-0{suffix}')
+    assert writer.partitions == ['2024-01', '2024-02']
+    assert batch_sizes(january) == [2, 2, 1]  # the partial batch is flushed when February starts
+    assert batch_sizes(february) == [1]       # and on close
+    assert read_ids(january) == [0, 1, 2, 3, 4]
+    assert read_ids(february) == [5]
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match='Unsupported format'):
+        PartitionedWriter(str(tmp_path), 'csv', schema=SCHEMA)
+
+def test_export_bundles_one_partition_per_month(app, make_patients, tmp_path):
+    app.config['EXPORT_BATCH_SIZE'] = 2
+    patient_id, = make_patients(1)
+    days = [date(2023, 12, 30), date(2024, 1, 2), date(2024, 1, 15), date(2024, 1, 31), date(2024, 3, 1)]
+    with app.app_context():
+        db.session.add_all(
+            Appointment(patient_id=patient_id, doctor_id=1, appointment_date=day, appointment_time=time(9, 0), status='completed')
+            for day in days
+        )
+        db.session.commit()
+        
+        result = export_appointments_columnar.apply(kwargs={'start_date': '2023-12-01', 'end_date': '2024-03-31'}).get()
+    
+    assert result['status'] == 'success', result
+    assert result['partitions'] == ['2023-12', '2024-01', '2024-03']
+    assert result['records'] == 5
+    with tarfile.open(os.path.join(app.config['EXPORT_DIR'], result['filename'])) as tar:
+        tar.extractall(tmp_path / 'bundle', filter='data')
+    january = str(tmp_path / 'bundle' / 'appointments' / 'month=2024-01' / 'part-0.parquet')
+    table = pq.read_table(january)
+    assert table.column('appointment_date').to_pylist() == days[1:4]
+    assert batch_sizes(january) == [2, 1]
@@ -0,0 +1,67 @@
+import csv
+import gzip
+import os
+from datetime import date, time, timedelta
+import pytest
+from app import db
+from app.models import Appointment, Treatment
+from app.tasks import export_treatment_csv
+
+START = date(2024, 1, 1)
+
+@pytest.fixture
+def patient_id(make_patients):
+    patient_id, = make_patients(1)
+    return patient_id
+
+def add_history(app, patient_id, count):
+    """count completed, treated appointments on consecutive days, plus a booked and an untreated one"""
+    with app.app_context():
+        offset = Appointment.query.count()
+        for i in range(offset, offset + count):
+            db.session.add(Appointment(
+                patient_id=patient_id, doctor_id=1 + i % 3, appointment_date=START + timedelta(days=i),
+                appointment_time=time(9, 0), status='completed',
+                treatment=Treatment(diagnosis=f'Diagnosis {i}', prescription='Rest' if i % 2 else None)
+            ))
+        db.session.add_all([
+            Appointment(patient_id=patient_id, doctor_id=1, appointment_date=START - timedelta(days=offset + 1),
+                        appointment_time=time(10, 0), status='completed'),
+            Appointment(patient_id=patient_id, doctor_id=1, appointment_date=date.today() + timedelta(days=offset + 1),
+                        appointment_time=time(10, 0), status='booked'),
+        ])
+        db.session.commit()
+
+def export(app, patient_id):
+    with app.app_context():
+        result = export_treatment_csv.apply(args=[patient_id]).get()
+        with gzip.open(os.path.join(app.config['EXPORT_DIR'], result['filename']), 'rt', newline='') as exported:
+            return result, list(csv.DictReader(exported))
+
+def test_rows_stream_in_batches_with_progress(app, patient_id, monkeypatch):
+    app.config['EXPORT_BATCH_SIZE'] = 10
+    add_history(app, patient_id, 25)
+    states = []
+    monkeypatch.setattr(export_treatment_csv, 'update_state', lambda state, meta: states.append(meta))
+    
+    result, rows = export(app, patient_id)
+    
+    assert result['records'] == 25
+    assert [(m['current'], m['total']) for m in states if m['status'] == 'Writing rows...'] == [(10, 25), (20, 25)]
+    assert [row['Diagnosis'] for row in rows] == [f'Diagnosis {i}' for i in reversed(range(25))]
+    assert rows[0]['Appointment Date'] == (START + timedelta(days=24)).isoformat()
+    assert {row['Prescription'] for row in rows} == {'Rest', 'N/A'}
+    assert [name for name in os.listdir(app.config['EXPORT_DIR']) if name.endswith('.tmp')] == []
+
+def test_statement_count_does_not_grow_with_history(app, patient_id, count_queries):
+    app.config['EXPORT_BATCH_SIZE'] = 10
+    add_history(app, patient_id, 2)
+    with count_queries() as few:
+        export(app, patient_id)
+    
+    add_history(app, patient_id, 40)
+    with count_queries() as many:
+        result, rows = export(app, patient_id)
+    
+    assert len(rows) == 42
+    assert len(many) == len(few)
@@ -0,0 +1,67 @@
+import pytest
+from app.models import Doctor
+
+@pytest.fixture
+def specializations(app):
+    """Specialization id of each sample doctor, by doctor id"""
+    with app.app_context():
+        return {doctor.id: doctor.specialization_id for doctor in Doctor.query}
+
+def doctor_ids(client, specialization_id=None):
+    response = client.get('/patient/doctors', query_string={'specialization_id': specialization_id or ''})
+    assert response.status_code == 200
+    return [doctor['id'] for doctor in response.get_json()]
+
+def doctor_counts(client):
+    return {s['id']: s['doctors_count'] for s in client.get('/patient/specializations').get_json()}
+
+def reads_doctors(statements):
+    return any('doctors' in statement for statement in statements)
+
+def test_repeat_directory_reads_skip_the_database(app, login, make_patients, count_queries, specializations):
+    make_patients(1)
+    patient = login('p0', 'pw')
+    doctor_ids(patient, specializations[1])
+    doctor_counts(patient)
+    
+    with count_queries() as statements:
+        doctor_ids(patient, specializations[1])
+        doctor_counts(patient)
+    
+    assert not reads_doctors(statements)
+
+def test_moving_a_doctor_refreshes_only_the_affected_keys(app, login, make_patients, count_queries, specializations):
+    make_patients(1)
+    patient, admin = login('p0', 'pw'), login('admin', 'admin123')
+    source, target, untouched = specializations[1], specializations[2], specializations[3]
+    before = {s: doctor_ids(patient, s) for s in (None, source, target, untouched)}
+    counts = doctor_counts(patient)
+    
+    assert admin.put('/admin/doctors/1', json={'specialization_id': target, 'full_name': 'Rajesh K. Sharma'}).status_code == 200
+    
+    with count_queries() as statements:
+        assert doctor_ids(patient, untouched) == before[untouched]
+    assert not reads_doctors(statements)
+    assert 1 not in doctor_ids(patient, source)
+    assert doctor_ids(patient, target) == sorted(before[target] + [1])
+    assert doctor_counts(patient) == {**counts, source: counts[source] - 1, target: counts[target] + 1}
+    
+    names = {d['id']: d['full_name'] for d in patient.get('/patient/doctors').get_json()}
+    assert names[1] == 'Rajesh K. Sharma'
+
+def test_deactivated_and_added_doctors_update_the_lists(app, login, make_patients, specializations):
+    make_patients(1)
+    patient, admin = login('p0', 'pw'), login('admin', 'admin123')
+    everyone = doctor_ids(patient)
+    counts = doctor_counts(patient)
+    
+    assert admin.delete('/admin/doctors/2').status_code == 200
+    response = admin.post('/admin/doctors', json={
+        'username': 'dr.new', 'email': 'new@hospital.test', 'password': 'doctor123',
+        'full_name': 'New Doctor', 'specialization_id': specializations[3]
+    })
+    assert response.status_code == 201
+    
+    new_id = response.get_json()['doctor_id']
+    assert doctor_ids(patient) == [i for i in everyone if i != 2] + [new_id]
+    assert doctor_counts(patient)[specializations[3]] == counts[specializations[3]] + 1
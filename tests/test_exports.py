@@ -0,0 +1,59 @@
+import csv
+import gzip
+import os
+from datetime import date, time
+import pytest
+from app import db
+from app.models import Appointment, Doctor, Treatment
+from app.tasks import export_treatment_csv
+
+@pytest.fixture
+def patient_id(app, make_patients):
+    """A patient with one completed, treated appointment with Dr. Sharma"""
+    patient_id, = make_patients(1)
+    with app.app_context():
+        db.session.add(Appointment(
+            patient_id=patient_id, doctor_id=1, appointment_date=date(2024, 1, 10), appointment_time=time(9, 0),
+            status='completed', treatment=Treatment(diagnosis='Flu', prescription='Rest')
+        ))
+        db.session.commit()
+    return patient_id
+
+def export(app, patient_id):
+    with app.app_context():
+        result = export_treatment_csv.apply(args=[patient_id]).get()
+        assert result['status'] == 'success', result
+        path = os.path.join(app.config['EXPORT_DIR'], result['filename'])
+        with gzip.open(path, 'rt', newline='') as exported:
+            rows = list(csv.DictReader(exported))
+        return result['cached'], rows
+
+def test_unchanged_history_reuses_the_stored_artifact(app, patient_id):
+    assert export(app, patient_id)[0] is False
+    cached, rows = export(app, patient_id)
+    
+    assert cached is True
+    assert [row['Diagnosis'] for row in rows] == ['Flu']
+
+def test_renaming_the_doctor_regenerates_the_export(app, patient_id):
+    export(app, patient_id)
+    with app.app_context():
+        db.session.get(Doctor, 1).full_name = 'Rajesh K. Sharma'
+        db.session.commit()
+    
+    cached, rows = export(app, patient_id)
+    
+    assert cached is False
+    assert [row['Doctor Name'] for row in rows] == ['Rajesh K. Sharma']
+
+def test_renaming_the_specialization_regenerates_the_export(app, patient_id):
+    export(app, patient_id)
+    with app.app_context():
+        specialization = db.session.get(Doctor, 1).specialization
+        specialization.name = 'Interventional Cardiology'
+        db.session.commit()
+    
+    cached, rows = export(app, patient_id)
+    
+    assert cached is False
+    assert [row['Specialization'] for row in rows] == ['Interventional Cardiology']
@@ -0,0 +1,92 @@
+from datetime import date, time, timedelta
+from types import SimpleNamespace
+import pytest
+from app import db, mail
+from app.models import Appointment
+from app import tasks
+
+TODAY = date.today()
+LAST_MONTH = TODAY.replace(day=1) - timedelta(days=1)
+
+class ChordRecorder:
+    """Stand-in for celery.chord that records the fan-out and runs it on demand"""
+    
+    def __init__(self):
+        self.header = self.callback = None
+    
+    def __call__(self, header):
+        def dispatch(callback):
+            self.header, self.callback = list(header), callback
+            return SimpleNamespace(id='summary-task')
+        return dispatch
+    
+    @property
+    def chunks(self):
+        return [signature.args[0] for signature in self.header]
+    
+    def run(self):
+        results = [signature.apply().get() for signature in self.header]
+        return self.callback.apply(args=(results,)).get()
+
+@pytest.fixture
+def chord(app, monkeypatch):
+    recorder = ChordRecorder()
+    monkeypatch.setattr(tasks, 'chord', recorder)
+    with app.app_context():
+        yield recorder
+
+def book(patient_ids, day, doctor_ids=(1,), status='booked'):
+    """One appointment per patient on day, spread over doctor_ids; returns their ids"""
+    appointments = [
+        Appointment(
+            patient_id=patient_id, doctor_id=doctor_ids[i % len(doctor_ids)], appointment_date=day,
+            appointment_time=time(*divmod(9 * 60 + 15 * (i // len(doctor_ids)), 60)), status=status
+        )
+        for i, patient_id in enumerate(patient_ids)
+    ]
+    db.session.add_all(appointments)
+    db.session.commit()
+    return [appointment.id for appointment in appointments]
+
+def test_reminders_fan_out_in_chunks_of_todays_booked_appointments(app, chord, make_patients):
+    app.config['REMINDER_CHUNK_SIZE'] = 3
+    patient_ids = make_patients(9)
+    ids = book(patient_ids[:7], TODAY)
+    book(patient_ids[7:8], TODAY, status='cancelled')
+    book(patient_ids[8:], TODAY + timedelta(days=1))
+    
+    dispatched = tasks.send_daily_reminders()
+    
+    assert dispatched == {'kind': 'reminders', 'chunks': 3, 'summary_task_id': 'summary-task'}
+    assert chord.chunks == [ids[0:3], ids[3:6], ids[6:7]]
+    assert all(signature.args[1] == TODAY.isoformat() for signature in chord.header)
+    
+    with mail.record_messages() as outbox:
+        assert chord.run() == {'kind': 'reminders', 'sent': 7, 'failed': 0}
+    assert sorted(m.recipients[0] for m in outbox) == sorted(f'p{i}@example.com' for i in range(7))
+
+def test_rerun_skips_delivered_reminders(app, chord, make_patients):
+    patient_ids = make_patients(5)
+    ids = book(patient_ids[:4], TODAY)
+    tasks.send_daily_reminders()
+    chord.run()
+    ids += book(patient_ids[4:], TODAY, doctor_ids=(2,))
+    
+    assert tasks.send_daily_reminders()['chunks'] == 1
+    assert chord.chunks == [ids[4:]]
+
+def test_nothing_to_send_dispatches_no_chord(app, chord):
+    assert tasks.send_daily_reminders() == {'kind': 'reminders', 'chunks': 0, 'sent': 0, 'failed': 0}
+    assert chord.header is None
+
+def test_monthly_reports_fan_out_per_chunk_of_doctors(app, chord, make_patients):
+    app.config['REPORT_CHUNK_SIZE'] = 2
+    book(make_patients(6), LAST_MONTH, doctor_ids=(1, 2, 3))
+    
+    dispatched = tasks.send_monthly_reports()
+    
+    assert dispatched['chunks'] == 2
+    assert chord.chunks == [[1, 2], [3]]
+    with mail.record_messages() as outbox:
+        assert chord.run() == {'kind': 'monthly reports', 'sent': 3, 'failed': 0}
+    assert len(outbox) == 3
@@ -0,0 +1,80 @@
+from datetime import date, time, timedelta
+import pytest
+from app import db
+from app.models import DoctorAvailability, DoctorDaySlots, ScheduleTemplate
+from app.tasks import extend_availability
+from app.utils.directory import doctor_open_slots
+
+TODAY = date.today()
+EVENING = {'start_time': '18:00', 'end_time': '19:00'}
+
+@pytest.fixture
+def template(app, login):
+    """Dr. Sharma's template: an evening window every day, generated to the 28 day horizon"""
+    response = login('dr.sharma', 'doctor123').put('/doctor/schedule-template', json={
+        'windows': [{'weekday': weekday, **EVENING} for weekday in range(7)]
+    })
+    assert response.status_code == 200
+    assert response.get_json()['days_added'] == 29
+    return response
+
+def evening_days(app, doctor_id=1):
+    with app.app_context():
+        return {a.date for a in DoctorAvailability.query.filter_by(doctor_id=doctor_id, start_time=time(18, 0))}
+
+def run_extend(app, horizon_days):
+    app.config['AVAILABILITY_HORIZON_DAYS'] = horizon_days
+    with app.app_context():
+        return extend_availability.apply().get()
+
+def test_beat_task_extends_templates_to_the_new_horizon(app, template):
+    with app.app_context():
+        doctor_open_slots(1, TODAY + timedelta(days=30))  # cache a window beyond the old horizon
+    
+    run_extend(app, 35)
+    
+    assert evening_days(app) == {TODAY + timedelta(days=i) for i in range(36)}
+    with app.app_context():
+        assert {t.generated_until for t in ScheduleTemplate.query.filter_by(doctor_id=1)} == {TODAY + timedelta(days=35)}
+        assert len(doctor_open_slots(1, TODAY + timedelta(days=30))) == 6 * 4
+
+def test_rerun_at_the_same_horizon_adds_nothing(app, template):
+    run_extend(app, 28)  # catches the sample doctors' templates up too
+    
+    assert run_extend(app, 28).startswith('Extended 0 doctor schedules')
+    assert len(evening_days(app)) == 29
+
+def test_ranges_a_doctor_removed_are_not_recreated(app, template):
+    removed = TODAY + timedelta(days=5)
+    with app.app_context():
+        DoctorAvailability.query.filter_by(doctor_id=1, date=removed, start_time=time(18, 0)).delete()
+        db.session.commit()
+    
+    run_extend(app, 35)
+    
+    days = evening_days(app)
+    assert removed not in days
+    assert TODAY + timedelta(days=35) in days
+
+def test_unavailable_doctors_are_not_extended(app, login, template):
+    assert login('admin', 'admin123').delete('/admin/doctors/1').status_code == 200
+    
+    run_extend(app, 35)
+    
+    assert max(evening_days(app)) == TODAY + timedelta(days=28)
+
+def test_past_unbooked_ranges_and_bitmaps_are_pruned(app):
+    yesterday = TODAY - timedelta(days=1)
+    with app.app_context():
+        db.session.add_all([
+            DoctorAvailability(doctor_id=1, date=yesterday, start_time=time(9, 0), end_time=time(10, 0), is_booked=True),
+            DoctorAvailability(doctor_id=1, date=yesterday, start_time=time(10, 0), end_time=time(11, 0), is_booked=False),
+            DoctorDaySlots(doctor_id=1, date=yesterday, open_slots=b'\0' * 12, booked_slots=b'\0' * 12)
+        ])
+        db.session.commit()
+    
+    assert run_extend(app, 28).endswith('pruned 1 past slots')
+    
+    with app.app_context():
+        assert [a.start_time for a in DoctorAvailability.query.filter_by(date=yesterday)] == [time(9, 0)]
+        assert DoctorDaySlots.query.filter_by(date=yesterday).count() == 0
@@ -0,0 +1,67 @@
+from datetime import date, timedelta
+import pytest
+from sqlalchemy import event
+from app import db
+from app.utils.init_db import ensure_indexes
+
+# (user, request path, table, index its lookup must use)
+HOT_QUERIES = [
+    ('dr.sharma', '/doctor/dashboard', 'doctors', 'ix_doctors_user_id'),
+    ('dr.sharma', '/doctor/dashboard', 'appointments', 'ix_appointments_doctor_date_status'),
+    ('dr.sharma', '/doctor/appointments', 'appointments', 'ix_appointments_doctor_date_status'),
+    ('dr.sharma', '/doctor/appointments', 'treatments', 'ix_treatments_appointment_id'),
+    ('dr.sharma', '/doctor/availability', 'doctor_availability', 'ix_availability_doctor_date_start'),
+    ('p0', '/patient/dashboard', 'patients', 'ix_patients_user_id'),
+    ('p0', '/patient/dashboard', 'appointments', 'ix_appointments_patient_status_date'),
+    ('p0', '/patient/appointments?status=completed', 'appointments', 'ix_appointments_patient_status_date'),
+    ('p0', '/patient/treatment-history', 'appointments', 'ix_appointments_patient_status_date'),
+    ('admin', '/admin/appointments', 'appointments', 'ix_appointments_date_id'),
+]
+
+PASSWORDS = {'admin': 'admin123', 'dr.sharma': 'doctor123', 'p0': 'pw'}
+
+def query_plans(app, send):
+    """EXPLAIN QUERY PLAN lines of every SELECT run by send(), with its original parameters"""
+    with app.app_context():
+        engine = db.engine
+    selects = []
+    
+    def record(conn, cursor, statement, parameters, *args):
+        if statement.lstrip().upper().startswith('SELECT'):
+            selects.append((statement, parameters))
+    
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        send()
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+    
+    with engine.connect() as connection:
+        return [
+            row[-1]
+            for statement, parameters in selects
+            for row in connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)
+        ]
+
+@pytest.mark.parametrize('username, url, table, index', HOT_QUERIES)
+def test_hot_query_uses_index(app, login, make_patients, username, url, table, index):
+    make_patients(1)
+    client = login(username, PASSWORDS[username])
+    booking = {'doctor_id': 1, 'appointment_date': (date.today() + timedelta(days=1)).isoformat(), 'appointment_time': '09:30'}
+    assert login('p0', 'pw').post('/patient/appointments', json=booking).status_code == 201
+    
+    plans = query_plans(app, lambda: client.get(url))
+    
+    lookups = [line for line in plans if f' {table} ' in f' {line} ']
+    assert lookups, plans
+    assert any(f'INDEX {index} ' in f'{line} ' for line in lookups), lookups
+
+def test_ensure_indexes_adds_indexes_missing_from_an_existing_database(app):
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('DROP INDEX ix_appointments_patient_status_date')
+        
+        ensure_indexes()
+        
+        indexes = {index['name'] for index in db.inspect(db.engine).get_indexes('appointments')}
+    assert 'ix_appointments_patient_status_date' in indexes
@@ -0,0 +1,107 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time, timedelta
+import pytest
+from app import db, mail
+from app.models import Appointment, DeliveryLedger
+from app.tasks import send_reminder_chunk
+from app.utils.init_db import ensure_columns
+from app.utils.ledger import REMINDER, claim_deliveries, record_deliveries
+
+DAY = date.today()
+
+@pytest.fixture
+def appointment_ids(app, make_patients):
+    """Six booked appointments today, one per patient"""
+    patient_ids = make_patients(6)
+    with app.app_context():
+        appointments = [
+            Appointment(patient_id=patient_id, doctor_id=1, appointment_date=DAY, appointment_time=time(9 + i), status='booked')
+            for i, patient_id in enumerate(patient_ids)
+        ]
+        db.session.add_all(appointments)
+        db.session.commit()
+        return [appointment.id for appointment in appointments]
+
+def run_chunk(ids, task_id):
+    """Run a reminder chunk as the task with task_id; returns the recipients mailed"""
+    with mail.record_messages() as outbox:
+        send_reminder_chunk.apply(args=[ids, DAY.isoformat()], task_id=task_id).get()
+    return [message.recipients[0] for message in outbox]
+
+def pending_claims():
+    return DeliveryLedger.query.filter(DeliveryLedger.delivered_at.is_(None)).count()
+
+def test_redelivered_chunk_sends_nothing_twice(app, appointment_ids):
+    with app.app_context():
+        # First delivery sent the first batch, then the worker died
+        claim_deliveries(REMINDER, DAY, appointment_ids, 'chunk-1')
+        record_deliveries(REMINDER, DAY, appointment_ids[:2])
+        
+        resent = run_chunk(appointment_ids, 'chunk-1')
+        assert sorted(resent) == sorted(f'p{i}@example.com' for i in range(2, 6))
+        
+        assert run_chunk(appointment_ids, 'chunk-1') == []
+        assert pending_claims() == 0
+
+def test_racing_owners_claim_disjoint_items(app, appointment_ids):
+    owners = [f'chunk-{i}' for i in range(8)]
+    start = threading.Barrier(len(owners))
+    
+    def claim(owner):
+        with app.app_context():
+            start.wait()
+            return claim_deliveries(REMINDER, DAY, appointment_ids, owner)
+    
+    with ThreadPoolExecutor(max_workers=len(owners)) as pool:
+        claims = list(pool.map(claim, owners))
+    
+    assert sum(len(claimed) for claimed in claims) == len(appointment_ids)
+    assert set().union(*claims) == set(appointment_ids)
+
+def test_overlapping_chunks_send_each_reminder_once(app, appointment_ids):
+    start = threading.Barrier(2)
+    
+    def run(task_id):
+        with app.app_context():
+            start.wait()
+            return send_reminder_chunk.apply(args=[appointment_ids, DAY.isoformat()], task_id=task_id).get()
+    
+    with app.app_context(), mail.record_messages() as outbox:
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            results = list(pool.map(run, ['run-1', 'run-2']))
+    
+    assert sum(result['sent'] for result in results) == len(appointment_ids)
+    assert sorted(message.recipients[0] for message in outbox) == sorted(f'p{i}@example.com' for i in range(6))
+
+def test_stale_claim_is_taken_over_after_timeout(app, appointment_ids):
+    with app.app_context():
+        claim_deliveries(REMINDER, DAY, appointment_ids, 'crashed')
+        
+        # A fresh claim held by another chunk is respected
+        assert run_chunk(appointment_ids, 'rerun') == []
+        
+        timeout = app.config['DELIVERY_CLAIM_TIMEOUT']
+        db.session.execute(db.update(DeliveryLedger).values(
+            claimed_at=datetime.utcnow() - timedelta(seconds=timeout + 1)
+        ))
+        db.session.commit()
+        
+        assert len(run_chunk(appointment_ids, 'rerun')) == len(appointment_ids)
+        assert pending_claims() == 0
+
+def test_existing_ledger_table_gains_claim_columns(app):
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('DROP TABLE delivery_ledger')
+            connection.exec_driver_sql(
+                'CREATE TABLE delivery_ledger (id INTEGER PRIMARY KEY, kind VARCHAR(30) NOT NULL, '
+                'period DATE NOT NULL, reference_id INTEGER NOT NULL, delivered_at DATETIME, '
+                'CONSTRAINT uq_delivery_ledger_item UNIQUE (kind, period, reference_id))'
+            )
+        
+        ensure_columns()
+        
+        columns = {column['name'] for column in db.inspect(db.engine).get_columns('delivery_ledger')}
+        assert {'claimed_by', 'claimed_at'} <= columns
+        assert claim_deliveries(REMINDER, DAY, [1, 2], 'chunk-1') == {1, 2}
@@ -0,0 +1,47 @@
+from datetime import date, time, timedelta
+import pytest
+from app import db
+from app.models import Appointment, Treatment
+
+LISTINGS = [
+    ('admin', 'admin123', '/admin/appointments'),
+    ('dr.sharma', 'doctor123', '/doctor/appointments'),
+    ('p0', 'pw', '/patient/appointments'),
+    ('p0', 'pw', '/patient/treatment-history'),
+]
+
+def add_appointments(app, patient_id, count):
+    """Add count appointments of the patient with Dr. Sharma, every other one completed with a treatment"""
+    with app.app_context():
+        start = Appointment.query.count()
+        for i in range(start, start + count):
+            appointment = Appointment(
+                patient_id=patient_id,
+                doctor_id=1,
+                appointment_date=date.today() - timedelta(days=i),
+                appointment_time=time(9, 0),
+                status='completed' if i % 2 else 'booked'
+            )
+            if i % 2:
+                appointment.treatment = Treatment(diagnosis=f'Diagnosis {i}', prescription='Rest')
+            db.session.add(appointment)
+        db.session.commit()
+
+@pytest.mark.parametrize('username, password, url', LISTINGS)
+def test_listing_query_count_does_not_grow_with_rows(app, login, make_patients, count_queries, username, password, url):
+    patient_id, = make_patients(1)
+    client = login(username, password)
+    
+    add_appointments(app, patient_id, 2)
+    with count_queries() as few:
+        response = client.get(url)
+    assert response.status_code == 200
+    
+    add_appointments(app, patient_id, 40)
+    with count_queries() as many:
+        response = client.get(url)
+    assert response.status_code == 200
+    
+    body = response.get_json()
+    assert len(body['items'] if isinstance(body, dict) else body) >= 20
+    assert len(many) == len(few), many
@@ -0,0 +1,67 @@
+import os
+from app.utils import cache
+from app.utils.cache import LocalCache, _MISSING, _local_layer, local_cache
+
+def test_least_recently_used_entry_is_evicted_first():
+    layer = LocalCache(maxsize=2, ttl=60)
+    layer.set('a', 1)
+    layer.set('b', 2)
+    layer.get('a')
+    
+    layer.set('c', 3)
+    
+    assert [layer.get(key) for key in 'abc'] == [1, _MISSING, 3]
+    assert layer.stats()['evictions'] == 1
+
+def test_entries_expire_after_ttl(monkeypatch):
+    layer = LocalCache(maxsize=10, ttl=30)
+    now = [1000.0]
+    monkeypatch.setattr(cache.time, 'monotonic', lambda: now[0])
+    layer.set('a', 1)
+    
+    now[0] += 29
+    assert layer.get('a') == 1
+    now[0] += 1
+    assert layer.get('a') is _MISSING
+    
+    stats = layer.stats()
+    assert (stats['hits'], stats['misses'], stats['expirations'], stats['size']) == (1, 1, 1, 0)
+
+def test_discard_drops_keys_and_glob_matches():
+    layer = LocalCache()
+    for key in ('doctors:list:1', 'doctors:list:2', 'specializations:'):
+        layer.set(key, key)
+    
+    layer.discard(['specializations:', 'absent'], pattern='doctors:list:2*')
+    
+    assert layer.get('doctors:list:1') == 'doctors:list:1'
+    assert layer.get('doctors:list:2') is _MISSING
+    assert layer.get('specializations:') is _MISSING
+    assert layer.stats()['invalidations'] == 2
+
+def test_layer_takes_its_bounds_from_config_and_reports_stats(app, login, monkeypatch):
+    # Restore the process-wide layer's bounds for later tests
+    monkeypatch.setattr(local_cache, 'maxsize', local_cache.maxsize)
+    monkeypatch.setattr(local_cache, 'ttl', local_cache.ttl)
+    app.config.update(CACHE_LOCAL_MAXSIZE=5, CACHE_LOCAL_TIMEOUT=7)
+    cache._subscriber['pid'] = None  # as in a freshly forked worker
+    with app.app_context():
+        assert _local_layer() is local_cache
+    
+    stats = login('admin', 'admin123').get('/admin/cache/stats').get_json()
+    
+    assert (stats['maxsize'], stats['ttl'], stats['size']) == (5, 7, 0)
+
+def test_lost_subscription_clears_the_layer_and_resubscribes(app):
+    with app.app_context():
+        _local_layer()
+        local_cache.set('key', 'value')
+        thread = cache._subscriber['thread']
+        
+        cache._on_subscriber_error(ConnectionError('lost'), None, thread)
+        
+        assert local_cache.get('key') is _MISSING
+        assert cache._subscriber['pid'] is None
+        assert _local_layer() is local_cache
+        assert cache._subscriber['pid'] == os.getpid()
+        assert cache._subscriber['thread'] is not thread
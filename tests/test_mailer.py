@@ -0,0 +1,90 @@
+import smtplib
+import pytest
+from flask_mail import BadHeaderError, Message
+from app import mail
+from app.utils.mailer import send_batched
+
+class FakeConnection:
+    """Stand-in for a flask-mail SMTP connection that fails on cue"""
+    
+    def __init__(self, server):
+        self.server = server
+    
+    def __enter__(self):
+        self.server.connections += 1
+        return self
+    
+    def __exit__(self, *exc_info):
+        return False
+    
+    def send(self, message):
+        key = message.subject
+        self.server.attempts.append(key)
+        errors = self.server.failures.get(key)
+        if errors:
+            raise errors.pop(0)
+        self.server.delivered.append(key)
+
+class FakeServer:
+    def __init__(self):
+        self.connections = 0
+        self.attempts = []
+        self.delivered = []
+        self.failures = {}  # subject -> exceptions raised by its next sends, in order
+    
+    def connect(self):
+        return FakeConnection(self)
+
+@pytest.fixture
+def server(app, monkeypatch):
+    app.config.update(MAIL_BATCH_SIZE=10, MAIL_BATCH_RETRIES=2, MAIL_RETRY_DELAY=0)
+    server = FakeServer()
+    monkeypatch.setattr(mail, 'connect', server.connect)
+    with app.app_context():
+        yield server
+
+def messages(count):
+    return ((i, Message(subject=i, recipients=[f'p{i}@example.com'])) for i in range(count))
+
+def test_one_connection_per_batch(server):
+    batches = []
+    
+    sent, failed = send_batched(messages(25), on_batch=batches.append)
+    
+    assert sent == list(range(25)) and failed == []
+    assert server.connections == 3
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+
+def test_disconnect_retries_only_the_unsent_rest_of_the_batch(server):
+    server.failures[4] = [smtplib.SMTPServerDisconnected('Connection unexpectedly closed')]
+    
+    sent, failed = send_batched(messages(10))
+    
+    assert sent == list(range(10)) and failed == []
+    assert server.connections == 2
+    assert server.attempts == [0, 1, 2, 3, 4] + list(range(4, 10))
+    assert server.delivered == list(range(10))
+
+def test_retries_exhausted_fail_the_rest_of_the_batch_only(server):
+    server.failures[4] = [smtplib.SMTPServerDisconnected('Connection unexpectedly closed')] * 3
+    
+    sent, failed = send_batched(messages(15))
+    
+    assert sent == [0, 1, 2, 3] + list(range(10, 15))
+    assert failed == list(range(4, 10))
+    assert server.connections == 3 + 1  # first try and MAIL_BATCH_RETRIES retries, then the next batch
+
+@pytest.mark.parametrize('error', [
+    smtplib.SMTPRecipientsRefused({'p3@example.com': (550, b'No such user')}),
+    smtplib.SMTPDataError(554, b'Rejected'),
+    BadHeaderError('Bad header'),
+    AssertionError('No recipients have been added'),
+])
+def test_message_errors_fail_that_message_without_aborting_the_batch(server, error):
+    server.failures[3] = [error]
+    
+    sent, failed = send_batched(messages(10))
+    
+    assert failed == [3]
+    assert sent == [i for i in range(10) if i != 3]
+    assert server.connections == 1
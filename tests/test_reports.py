@@ -0,0 +1,22 @@
+from collections import namedtuple
+from datetime import date
+from app.utils.mailer import render_email
+
+DoctorRow = namedtuple('DoctorRow', 'full_name specialization total_appointments completed cancelled')
+AppointmentRow = namedtuple('AppointmentRow', 'appointment_date status patient_name diagnosis')
+
+def test_monthly_report_escapes_names_and_diagnoses(app):
+    doctor = DoctorRow('Rajesh <b>Sharma</b>', 'Cardiology', 2, 1, 0)
+    appointments = [
+        AppointmentRow(date(2024, 1, 5), 'completed', '<script>alert(1)</script>', 'Flu & fever'),
+        AppointmentRow(date(2024, 1, 9), 'booked', "Ann O'Brien", None),
+    ]
+    
+    with app.app_context():
+        html = render_email('email/monthly_report.html', doctor=doctor, appointments=appointments, month=date(2024, 1, 1))
+    
+    assert '<script>' not in html and '&lt;script&gt;alert(1)&lt;/script&gt;' in html
+    assert 'Rajesh &lt;b&gt;Sharma&lt;/b&gt;' in html
+    assert 'Flu &amp; fever' in html
+    assert '<td>2024-01-05</td>' in html and '<td>N/A</td>' in html
+    assert 'January 2024' in html
@@ -0,0 +1,62 @@
+import pytest
+from app import db
+from app.models import Patient, User
+from app.utils import search
+
+@pytest.fixture
+def patients(app):
+    """Patients named 'Fatima <surname>', plus a Khan and an exact 'Fatima'"""
+    with app.app_context():
+        names = [f'Fatima Okafor {i}' for i in range(12)] + ['Imran Khan', 'Fatima']
+        db.session.add_all(
+            Patient(user=User(username=f'u{i}', email=f'u{i}@example.com', password_hash='x', role='patient'), full_name=name)
+            for i, name in enumerate(names)
+        )
+        db.session.commit()
+        return {patient.full_name: patient.id for patient in Patient.query}
+
+def search_pages(client, text, limit=5):
+    """Every page of /admin/search/patients for text, following next_cursor"""
+    pages, cursor = [], None
+    while True:
+        response = client.get('/admin/search/patients', query_string={'q': text, 'limit': limit, 'cursor': cursor or ''})
+        assert response.status_code == 200, response.get_json()
+        body = response.get_json()
+        pages.append([item['full_name'] for item in body['items']])
+        cursor = body['next_cursor']
+        if cursor is None:
+            return pages
+
+@pytest.mark.parametrize('backend', [search.FTS5, search.LIKE])
+def test_words_match_substrings_on_every_backend(app, login, patients, backend):
+    app.extensions['search_backend'] = backend
+    admin = login('admin', 'admin123')
+    
+    assert sum(search_pages(admin, 'han'), []) == ['Imran Khan']
+    assert sum(search_pages(admin, 'okaf 1'), []) == ['Fatima Okafor 1', 'Fatima Okafor 10', 'Fatima Okafor 11']
+
+def test_ranked_results_page_with_a_rank_keyset(app, login, patients):
+    admin = login('admin', 'admin123')
+    
+    pages = search_pages(admin, 'fatima')
+    names = sum(pages, [])
+    
+    assert names[0] == 'Fatima'  # shortest document, best bm25
+    assert sorted(names) == sorted(name for name in patients if 'Fatima' in name)
+    assert [len(page) for page in pages] == [5, 5, 3]
+
+def test_matches_over_rank_limit_are_listed_in_id_order(app, login, patients):
+    app.config['SEARCH_RANK_LIMIT'] = 4
+    admin = login('admin', 'admin123')
+    
+    names = sum(search_pages(admin, 'fatima'), [])
+    
+    assert names == sorted((name for name in patients if 'Fatima' in name), key=patients.get)
+
+@pytest.mark.parametrize('cursor', ['not-a-cursor', 'WyJ4IiwxXQ', 'WzFd'])
+def test_malformed_search_cursor_is_rejected(app, login, patients, cursor):
+    admin = login('admin', 'admin123')
+    
+    response = admin.get('/admin/search/patients', query_string={'q': 'fatima', 'cursor': cursor})
+    
+    assert response.status_code == 400
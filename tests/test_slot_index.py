@@ -0,0 +1,69 @@
+from datetime import date, time, timedelta
+import pytest
+from redis import WatchError
+from app import db
+from app.models import Doctor
+from app.utils import slot_index
+from app.utils.slot_index import INDEX_PREFIX, VERSION_PREFIX, mark_booked, rebuild_index, search_free_slots
+from app.utils.slots import claim_slot, slot_index as slot_number
+
+TOMORROW = date.today() + timedelta(days=1)
+
+@pytest.fixture
+def specialization_id(app):
+    with app.app_context():
+        yield db.session.get(Doctor, 1).specialization_id
+
+def index_members(specialization_id):
+    return {member.decode('utf-8') for member in slot_index.redis_client.zrange(f'{INDEX_PREFIX}{specialization_id}', 0, -1)}
+
+def booked_member(start_time):
+    return f'1:{TOMORROW.isoformat()}:{slot_number(start_time, 15)}'
+
+def test_rebuild_replaces_the_index_and_leaves_no_staging_key(specialization_id):
+    key = f'{INDEX_PREFIX}{specialization_id}'
+    slot_index.redis_client.zadd(key, {'999:2000-01-01:0': 0})
+    
+    rebuild_index(specialization_id)
+    
+    members = index_members(specialization_id)
+    assert '999:2000-01-01:0' not in members
+    assert booked_member(time(9, 0)) in members
+    assert slot_index.redis_client.ttl(key) == -1
+    assert slot_index.redis_client.keys(f'{key}:staging:*') == []
+
+def test_booking_during_rebuild_is_not_undone(specialization_id, monkeypatch):
+    fill = slot_index._fill
+    calls = []
+    
+    def fill_then_book(*args):
+        filled = fill(*args)
+        calls.append(args)
+        if len(calls) == 1:
+            # A booking commits after the bitmaps were read, before the swap
+            claim_slot(1, TOMORROW, time(9, 0))
+            db.session.commit()
+            mark_booked(1, TOMORROW, time(9, 0))
+        return filled
+    monkeypatch.setattr(slot_index, '_fill', fill_then_book)
+    
+    rebuild_index(specialization_id)
+    
+    assert len(calls) == 2
+    members = index_members(specialization_id)
+    assert booked_member(time(9, 0)) not in members
+    assert booked_member(time(9, 15)) in members
+
+def test_search_falls_back_to_the_database_when_rebuilds_keep_losing(specialization_id, monkeypatch):
+    fill = slot_index._fill
+    
+    def fill_during_updates(*args):
+        slot_index.redis_client.incr(f'{VERSION_PREFIX}{specialization_id}')
+        return fill(*args)
+    monkeypatch.setattr(slot_index, '_fill', fill_during_updates)
+    
+    with pytest.raises(WatchError):
+        rebuild_index(specialization_id)
+    
+    slots = search_free_slots(specialization_id, TOMORROW, TOMORROW, 3)
+    assert [(s['date'], s['start_time']) for s in slots][:1] == [(TOMORROW.isoformat(), '09:00:00')]
@@ -0,0 +1,96 @@
+from datetime import date, datetime, time, timedelta
+import pytest
+from app import db
+from app.models import Appointment, DoctorAvailability, DoctorDaySlots
+from app.utils import slots
+from app.utils.directory import doctor_open_slots
+from app.utils.slots import DayBitmap, SlotUnavailable, refresh_days, slot_index
+
+TOMORROW = date.today() + timedelta(days=1)
+
+def day_row(doctor_id, day):
+    return db.session.execute(
+        db.select(DoctorDaySlots).where(DoctorDaySlots.doctor_id == doctor_id, DoctorDaySlots.date == day)
+    ).scalar_one()
+
+def clock(monkeypatch, at):
+    """Make slots.datetime.now() return at"""
+    class FrozenDatetime(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return at
+    monkeypatch.setattr(slots, 'datetime', FrozenDatetime)
+
+def test_cached_availability_drops_slots_that_have_since_started(app, monkeypatch):
+    with app.app_context():
+        clock(monkeypatch, datetime.combine(TOMORROW, time(8, 0)))
+        before = [s for s in doctor_open_slots(1, date.today()) if s['date'] == TOMORROW.isoformat()]
+        clock(monkeypatch, datetime.combine(TOMORROW, time(10, 7)))
+        after = [s for s in doctor_open_slots(1, date.today()) if s['date'] == TOMORROW.isoformat()]
+    
+    assert before[0]['start_time'] == '09:00:00'
+    assert after[0]['start_time'] == '10:15:00'
+    assert after == [s for s in before if s['start_time'] >= '10:15:00']
+
+def concurrent_writer(monkeypatch, runs, index):
+    """Book slot index from 'another transaction' right after each of the next runs day reads"""
+    select_day = slots._select_day
+    
+    def racing_select(*args):
+        row = select_day(*args)
+        if runs:
+            runs.pop()
+            db.session.execute(
+                db.update(DoctorDaySlots).where(DoctorDaySlots.id == row.id).values(
+                    booked_slots=DayBitmap.pack(DayBitmap.from_row(row).booked | 1 << index, 15),
+                    version=DoctorDaySlots.version + 1
+                )
+            )
+        return row
+    monkeypatch.setattr(slots, '_select_day', racing_select)
+
+def test_claim_retries_after_a_concurrent_write(app, monkeypatch):
+    with app.app_context():
+        version = day_row(1, TOMORROW).version
+        concurrent_writer(monkeypatch, [1], slot_index(time(9, 15), 15))
+        
+        slots.claim_slot(1, TOMORROW, time(9, 0))
+        db.session.commit()
+        
+        row = day_row(1, TOMORROW)
+        bitmap = DayBitmap.from_row(row)
+        assert row.version == version + 2
+        assert not bitmap.is_free(slot_index(time(9, 0), 15))
+        assert not bitmap.is_free(slot_index(time(9, 15), 15))
+
+def test_claim_gives_up_after_repeated_concurrent_writes(app, monkeypatch):
+    with app.app_context():
+        concurrent_writer(monkeypatch, [1] * slots.CLAIM_RETRIES, slot_index(time(9, 15), 15))
+        
+        with pytest.raises(SlotUnavailable, match='busy'):
+            slots.claim_slot(1, TOMORROW, time(9, 0))
+
+def test_refresh_days_rebuilds_open_bits_and_keeps_bookings(app, make_patients):
+    patient_id, = make_patients(1)
+    new_day = date.today() + timedelta(days=20)
+    with app.app_context():
+        db.session.add_all([
+            Appointment(patient_id=patient_id, doctor_id=1, appointment_date=day, appointment_time=time(9, 0), status='booked')
+            for day in (TOMORROW, new_day)
+        ])
+        slots.claim_slot(1, TOMORROW, time(9, 0))
+        # Drop tomorrow's afternoon range and open new_day, which has no bitmap row yet
+        DoctorAvailability.query.filter_by(doctor_id=1, date=TOMORROW, start_time=time(14, 0)).delete()
+        db.session.add(DoctorAvailability(doctor_id=1, date=new_day, start_time=time(9, 0), end_time=time(10, 0)))
+        
+        refresh_days(1, [TOMORROW, new_day])
+        db.session.commit()
+        
+        tomorrow = DayBitmap.from_row(day_row(1, TOMORROW))
+        assert [slots.slot_time(i, 15) for i in tomorrow.free_indexes()][:1] == [time(9, 15)]
+        assert not tomorrow.is_free(slot_index(time(14, 0), 15))
+        
+        created = DayBitmap.from_row(day_row(1, new_day))
+        assert created.booked == 1 << slot_index(time(9, 0), 15)
+        assert [slots.slot_time(i, 15) for i in created.free_indexes()] == [time(9, 15), time(9, 30), time(9, 45)]
+        assert DoctorAvailability.query.filter_by(doctor_id=1, date=new_day).one().is_booked
@@ -0,0 +1,79 @@
+from datetime import date, datetime, time, timedelta
+import pytest
+from app import db
+from app.models import Appointment, ExportWatermark, Treatment
+from app.tasks import export_appointments_columnar, export_treatment_csv
+from app.utils.watermarks import advance_watermark
+
+CONSUMER = 'treatment_history:{}'
+AN_HOUR_AGO = datetime.utcnow() - timedelta(hours=1)  # well before any run's overlap window
+
+@pytest.fixture
+def patient_id(app, make_patients):
+    patient_id, = make_patients(1)
+    app.config['EXPORT_WATERMARK_OVERLAP'] = 5
+    return patient_id
+
+def add_treated(patient_id, day, updated_at=AN_HOUR_AGO):
+    appointment = Appointment(
+        patient_id=patient_id, doctor_id=1, appointment_date=day, appointment_time=time(9, 0),
+        status='completed', treatment=Treatment(diagnosis=f'Diagnosis {day}')
+    )
+    db.session.add(appointment)
+    db.session.flush()
+    db.session.execute(db.update(Appointment).where(Appointment.id == appointment.id).values(updated_at=updated_at))
+    db.session.commit()
+    return appointment.id
+
+def incremental(patient_id):
+    result = export_treatment_csv.apply(args=[patient_id, True]).get()
+    assert result['status'] == 'success', result
+    return result
+
+def watermark(consumer):
+    return db.session.query(ExportWatermark.exported_until).filter_by(consumer=consumer).scalar()
+
+def test_incremental_exports_only_changes_since_the_last_run(app, patient_id):
+    with app.app_context():
+        first_id = add_treated(patient_id, date(2024, 1, 1))
+        add_treated(patient_id, date(2024, 1, 2))
+        
+        first = incremental(patient_id)
+        assert (first['records'], first['since']) == (2, None)
+        assert incremental(patient_id)['records'] == 0
+        
+        db.session.get(Appointment, first_id).reason = 'Follow-up'
+        db.session.commit()
+        assert incremental(patient_id)['records'] == 1
+
+def test_overlap_rereads_rows_committed_late_with_an_earlier_timestamp(app, patient_id):
+    with app.app_context():
+        add_treated(patient_id, date(2024, 1, 1))
+        incremental(patient_id)
+        exported_until = watermark(CONSUMER.format(patient_id))
+        
+        # Stamped before the last run's upper bound but committed after it
+        add_treated(patient_id, date(2024, 1, 2), updated_at=exported_until - timedelta(seconds=2))
+        add_treated(patient_id, date(2024, 1, 3), updated_at=exported_until - timedelta(seconds=30))
+        
+        result = incremental(patient_id)
+        assert result['since'] == (exported_until - timedelta(seconds=5)).isoformat()
+        assert result['records'] == 1
+
+def test_watermark_never_moves_back(app):
+    later, earlier = datetime(2024, 6, 1), datetime(2024, 5, 1)
+    with app.app_context():
+        advance_watermark('sync', later)
+        advance_watermark('sync', earlier)
+        assert watermark('sync') == later
+
+def test_columnar_consumer_exports_changes_once(app, patient_id):
+    with app.app_context():
+        add_treated(patient_id, date(2024, 1, 1))
+        
+        first = export_appointments_columnar.apply(kwargs={'consumer': 'warehouse'}).get()
+        second = export_appointments_columnar.apply(kwargs={'consumer': 'warehouse'}).get()
+    
+    assert first['status'] == 'success', first
+    assert first['since'] is None and first['records'] >= 1
+    assert second['records'] == 0